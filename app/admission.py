@@ -0,0 +1,202 @@
+"""Admission control and load shedding for generation requests."""
+
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Optional
+from fastapi import HTTPException
+from app.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+metrics.describe("admission_active", "Generations currently running")
+metrics.describe("admission_queue_depth", "Requests waiting for a generation slot")
+metrics.describe("admission_wait_seconds", "Time spent waiting for a generation slot")
+metrics.describe("admission_shed_total", "Requests rejected by admission control")
+
+
+class LoadShedError(HTTPException):
+    """503 returned when a request cannot be admitted."""
+
+    def __init__(self, reason: str, retry_after: float):
+        self.reason = reason
+        super().__init__(
+            status_code=503,
+            detail=f"Server is at capacity ({reason}). Please retry later.",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+        )
+
+
+@dataclass(eq=False)
+class Ticket:
+    """One request waiting for, or holding, a generation slot."""
+    priority: str = "batch"
+    tenant: str = "default"
+    tokens: int = 0
+    future: Optional[asyncio.Future] = field(default=None, repr=False)
+
+
+class FifoQueue:
+    """Plain first-come-first-served wait queue."""
+
+    def __init__(self):
+        self._items: "deque[Ticket]" = deque()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def push(self, ticket: Ticket) -> None:
+        self._items.append(ticket)
+
+    def remove(self, ticket: Ticket) -> None:
+        try:
+            self._items.remove(ticket)
+        except ValueError:
+            pass
+
+    def pop_runnable(self) -> Optional[Ticket]:
+        """Next ticket allowed to start now, or None."""
+        return self._items.popleft() if self._items else None
+
+    def victim_for(self, ticket: Ticket) -> Optional[Ticket]:
+        """Queued ticket that may be shed to make room for `ticket`, or None."""
+        return None
+
+    def retry_delay(self) -> Optional[float]:
+        """Seconds until a currently blocked ticket may become runnable, or None."""
+        return None
+
+    def on_start(self, ticket: Ticket) -> None:
+        pass
+
+    def on_finish(self, ticket: Ticket) -> None:
+        pass
+
+
+class AdmissionController:
+    """
+    Limits concurrent generations and queues the overflow.
+
+    At most `max_concurrent` requests run at once and at most `max_queue`
+    wait for up to `queue_timeout` seconds. Anything beyond that is shed
+    with 503 + Retry-After. The order in which waiters start is decided by
+    `queue` (FIFO unless a scheduling queue is supplied).
+    """
+
+    def __init__(self, max_concurrent: int, max_queue: int, queue_timeout: float, queue=None):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.queue = queue if queue is not None else FifoQueue()
+        self._active = 0
+        self._retry_handle: Optional[asyncio.TimerHandle] = None
+        # Smoothed generation duration, used to suggest Retry-After
+        self._avg_service_seconds = 30.0
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self.queue)
+
+    def _update_gauges(self) -> None:
+        metrics.set_gauge("admission_active", self._active)
+        metrics.set_gauge("admission_queue_depth", len(self.queue))
+
+    def _retry_after(self) -> float:
+        backlog = len(self.queue) + 1
+        return self._avg_service_seconds * backlog / max(1, self.max_concurrent)
+
+    def _shed(self, reason: str, ticket: Ticket) -> LoadShedError:
+        metrics.inc("admission_shed_total", reason=reason, priority=ticket.priority)
+        logger.warning(
+            "Shedding %s request from %s (%s): active=%d queued=%d",
+            ticket.priority, ticket.tenant, reason, self._active, len(self.queue)
+        )
+        return LoadShedError(reason, self._retry_after())
+
+    def _dispatch(self) -> None:
+        """Start queued tickets while slots are free."""
+        self._retry_handle = None
+        while self._active < self.max_concurrent:
+            ticket = self.queue.pop_runnable()
+            if ticket is None:
+                break
+            if ticket.future.done():
+                continue
+            self._active += 1
+            self.queue.on_start(ticket)
+            ticket.future.set_result(None)
+
+        # Tickets held back by a budget get another chance once it refills
+        delay = self.queue.retry_delay() if len(self.queue) else None
+        if delay is not None and self._retry_handle is None:
+            self._retry_handle = asyncio.get_running_loop().call_later(delay, self._dispatch)
+        self._update_gauges()
+
+    async def acquire(self, ticket: Ticket) -> None:
+        """
+        Wait for a generation slot.
+
+        Raises:
+            LoadShedError: If the queue is full, the queue deadline passes, or
+                the ticket was displaced by a higher priority request
+        """
+        if len(self.queue) >= self.max_queue:
+            victim = self.queue.victim_for(ticket)
+            if victim is None:
+                raise self._shed("queue_full", ticket)
+            self.queue.remove(victim)
+            victim.future.set_exception(self._shed("preempted", victim))
+
+        ticket.future = asyncio.get_running_loop().create_future()
+        self.queue.push(ticket)
+        self._dispatch()
+
+        waiter = ticket.future
+        queued_at = time.monotonic()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            if not (waiter.done() and not waiter.cancelled() and waiter.exception() is None):
+                waiter.cancel()
+                self.queue.remove(ticket)
+                self._update_gauges()
+                raise self._shed("queue_timeout", ticket)
+            # Slot was handed over just as the deadline fired: keep it
+        except BaseException:
+            if waiter.done() and not waiter.cancelled() and waiter.exception() is None:
+                # We own a slot we will never use: pass it on
+                self.release(ticket)
+            elif not waiter.done():
+                waiter.cancel()
+                self.queue.remove(ticket)
+                self._update_gauges()
+            raise
+        finally:
+            metrics.observe("admission_wait_seconds", time.monotonic() - queued_at, priority=ticket.priority)
+
+    def release(self, ticket: Ticket) -> None:
+        """Free a slot and start the next runnable waiter, if any."""
+        self._active -= 1
+        self.queue.on_finish(ticket)
+        self._dispatch()
+
+    @asynccontextmanager
+    async def admit(self, priority: str = "batch", tenant: str = "default", tokens: int = 0):
+        """Hold a generation slot for the duration of the block."""
+        ticket = Ticket(priority=priority, tenant=tenant, tokens=tokens)
+        await self.acquire(ticket)
+        started_at = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - started_at
+            self._avg_service_seconds += 0.2 * (elapsed - self._avg_service_seconds)
+            self.release(ticket)
@@ -0,0 +1,77 @@
+"""Incremental extraction of agent objects from streamed model output."""
+
+import json
+import logging
+import re
+from typing import List
+
+logger = logging.getLogger(__name__)
+
+_TRAILING_COMMA_RE = re.compile(r",\s*([\]}])")
+
+
+class AgentStreamParser:
+    """
+    Yields each top-level JSON object of a streamed array as soon as its
+    closing brace arrives.
+
+    Text is appended to one buffer and scanned from the last offset, keeping
+    string/escape state between chunks, so every character is examined once.
+    Markdown fences and prose around the array are ignored because only
+    brace-delimited objects are extracted.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self._offset = 0
+        self._depth = 0
+        self._start = -1
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, chunk: str) -> List[dict]:
+        """
+        Append `chunk` and return the objects it completed.
+
+        Objects that fail to parse even after removing trailing commas are
+        logged and skipped; the full-text parse at the end of the stream
+        still sees them.
+        """
+        self.text += chunk
+        completed = []
+        text = self.text
+        for i in range(self._offset, len(text)):
+            char = text[i]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                # Strings only matter inside objects; quotes in surrounding prose are ignored
+                self._in_string = self._depth > 0
+            elif char == "{":
+                if self._depth == 0:
+                    self._start = i
+                self._depth += 1
+            elif char == "}" and self._depth > 0:
+                self._depth -= 1
+                if self._depth == 0:
+                    parsed = self._parse(text[self._start:i + 1])
+                    if parsed is not None:
+                        completed.append(parsed)
+        self._offset = len(text)
+        return completed
+
+    @staticmethod
+    def _parse(candidate: str):
+        for attempt in (candidate, _TRAILING_COMMA_RE.sub(r"\1", candidate)):
+            try:
+                value = json.loads(attempt)
+            except json.JSONDecodeError:
+                continue
+            return value if isinstance(value, dict) else None
+        logger.warning("Skipping unparseable streamed object (%d chars)", len(candidate))
+        return None
@@ -0,0 +1,98 @@
+"""Circuit breaker guarding calls to the Claude API."""
+
+import logging
+import math
+import time
+from fastapi import HTTPException
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(HTTPException):
+    """Raised instead of calling upstream while the circuit is open."""
+
+    def __init__(self, retry_after: float):
+        self.retry_after = retry_after
+        super().__init__(
+            status_code=503,
+            detail="Claude API is currently unavailable (circuit open). Please retry later.",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+        )
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    After `failure_threshold` consecutive failures the circuit opens and every
+    call fails fast for `recovery_timeout` seconds. After that a single probe
+    request is let through (half-open); its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, failure_threshold: int, recovery_timeout: float, name: str = "claude"):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.name = name
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    @property
+    def state(self) -> str:
+        """Current state, moving from open to half-open once the recovery timeout elapsed."""
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+            self._state = HALF_OPEN
+            self._probe_in_flight = False
+        return self._state
+
+    def retry_after(self) -> float:
+        """Seconds until the next probe will be allowed."""
+        if self._state != OPEN:
+            return 1.0
+        return max(0.0, self.recovery_timeout - (time.monotonic() - self._opened_at))
+
+    def allow_request(self) -> None:
+        """
+        Reserve permission for one upstream call.
+
+        Raises:
+            CircuitOpenError: If the circuit is open or a half-open probe is already running
+        """
+        state = self.state
+        if state == CLOSED:
+            return
+        if state == HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            logger.info("Circuit '%s' half-open, sending probe request", self.name)
+            return
+        raise CircuitOpenError(self.retry_after())
+
+    def record_success(self) -> None:
+        """Close the circuit after a successful upstream call."""
+        if self._state != CLOSED:
+            logger.info("Circuit '%s' closed after successful probe", self.name)
+        self._state = CLOSED
+        self._failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        """Count a failed upstream call, opening the circuit when the threshold is hit."""
+        self._failures += 1
+        if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+            if self._state != OPEN:
+                logger.warning(
+                    "Circuit '%s' opened after %d consecutive failures",
+                    self.name, self._failures
+                )
+            self._state = OPEN
+            self._opened_at = time.monotonic()
+        self._probe_in_flight = False
+
+    def release(self) -> None:
+        """Give back a probe reservation when the call ended without an outcome (e.g. cancelled)."""
+        self._probe_in_flight = False
@@ -1,30 +1,542 @@
 """Claude API service for generating agent suggestions."""
 
+import hashlib
 import json
 import logging
 import re
-from typing import List
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator, List, Optional, Tuple
 import httpx
 from fastapi import HTTPException
+from pydantic import BaseModel, ValidationError
 from app.models import EmpireDescriptionRequest, AgentSpecificationResponse
+from app.agent_stream import AgentStreamParser
+from app.memory_profile import memory_profiler
+from app.circuit_breaker import CircuitBreaker
+from app.key_pool import KeyPool, UpstreamKey, parse_key_specs
+from app.postprocess import PostProcessor
+from app.token_budget import TokenBudgeter, TokenEstimator
+from app.failure_store import FailureArtifactStore
+from app.config import settings
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Shared breaker: opens after repeated upstream failures so callers fail fast
+claude_circuit = CircuitBreaker(
+    failure_threshold=settings.CIRCUIT_FAILURE_THRESHOLD,
+    recovery_timeout=settings.CIRCUIT_RECOVERY_TIMEOUT
+)
+
+# Shared budgeter: sizes max_tokens/timeout and learns from upstream usage
+token_budgeter = TokenBudgeter(
+    estimator=TokenEstimator(),
+    max_tokens_cap=settings.MAX_TOKENS_CAP,
+    min_max_tokens=settings.MIN_MAX_TOKENS,
+    tokens_per_agent=settings.INITIAL_TOKENS_PER_AGENT,
+    output_tokens_per_second=settings.INITIAL_OUTPUT_TOKENS_PER_SECOND,
+    headroom=settings.TOKEN_HEADROOM,
+    base_timeout=settings.TIMEOUT_BASE,
+    min_timeout=settings.TIMEOUT_MIN,
+    max_timeout=settings.TIMEOUT_MAX,
+    min_agents=settings.MIN_EXPECTED_AGENT_COUNT,
+    max_agents=settings.EXPECTED_AGENT_COUNT,
+    agents_per_entry=settings.INITIAL_AGENTS_PER_ENTRY
+)
+
+
+CLAUDE_API_URL = "https://api.anthropic.com/v1/messages"
+CLAUDE_MODEL = "claude-sonnet-4-20250514"  # Claude 4 Sonnet model
+
+# Shared key pool: least-loaded dispatch, per-key rate-limit state and quarantine
+key_pool = KeyPool(
+    parse_key_specs(settings.CLAUDE_API_KEY, settings.CLAUDE_API_KEYS),
+    auth_quarantine=settings.KEY_AUTH_QUARANTINE_SECONDS,
+    rate_limit_quarantine=settings.KEY_RATE_LIMIT_QUARANTINE_SECONDS
+)
+
+# Statuses after which a request is retried once on each other available key
+_KEY_RETRY_STATUSES = (401, 403, 429)
+
+# One pooled client for all upstream calls, so connections are kept alive between requests
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def upstream_client() -> httpx.AsyncClient:
+    """Shared Claude API client (created on first use, reopened after close)."""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.UPSTREAM_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.UPSTREAM_MAX_CONNECTIONS,
+                keepalive_expiry=settings.UPSTREAM_KEEPALIVE_EXPIRY
+            )
+        )
+    return _http_client
+
+
+async def prewarm_upstream_connections(count: int, timeout: float = 10.0) -> int:
+    """
+    Open up to `count` pooled connections (TCP + TLS) to each Claude API
+    endpoint of the key pool ahead of the first generation, using concurrent
+    HEAD requests that are never billed. Returns the number of connections
+    that completed a request.
+    """
+    client = upstream_client()
+    
+    async def touch(url: str) -> bool:
+        try:
+            await client.head(url, timeout=timeout)
+            return True
+        except httpx.HTTPError as e:
+            logger.warning("Could not pre-open upstream connection to %s: %s", url, e)
+            return False
+    
+    urls = dict.fromkeys(key.url for key in key_pool.keys) or [CLAUDE_API_URL]
+    results = await asyncio.gather(*(touch(url) for url in urls for _ in range(count)))
+    return sum(results)
+
+
+@asynccontextmanager
+async def messages_response(
+    claude_payload: dict,
+    tokens: int,
+    timeout: httpx.Timeout,
+    api_key: Optional[str] = None,
+    stream: bool = False
+) -> AsyncIterator[httpx.Response]:
+    """
+    Send a Messages API request and yield the response.
+    
+    Without an explicit `api_key` the least-loaded key of the pool is used,
+    with `tokens` reserved against it until the block exits; a 401/403/429
+    answer quarantines that key and the request is retried on the next
+    available one. With `stream=True` the body is left unread.
+    """
+    client = upstream_client()
+    tried: List[UpstreamKey] = []
+    while True:
+        key = key_pool.acquire(tokens, exclude=tried) if api_key is None else None
+        request = client.build_request(
+            "POST",
+            key.url if key is not None else CLAUDE_API_URL,
+            json=claude_payload,
+            headers=claude_headers(key.api_key if key is not None else api_key),
+            timeout=timeout
+        )
+        response = None
+        try:
+            response = await client.send(request, stream=stream)
+            if key is not None and response.status_code in _KEY_RETRY_STATUSES:
+                tried.append(key)
+                if key_pool.has_available(exclude=tried):
+                    logger.warning("Key %s answered %d, retrying on another key", key.name, response.status_code)
+                    continue
+            yield response
+            return
+        finally:
+            if response is not None:
+                await response.aclose()
+            if key is not None:
+                key_pool.release(key, tokens, response)
+
+
+async def close_upstream_client() -> None:
+    """Close the shared client (used at shutdown)."""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+# Raw outputs that failed to parse, kept for inspection and replay
+failure_store = FailureArtifactStore(
+    directory=settings.FAILURE_ARTIFACT_DIR,
+    max_count=settings.FAILURE_ARTIFACT_MAX_COUNT,
+    max_bytes=settings.FAILURE_ARTIFACT_MAX_BYTES
+)
+
+
+class AgentParseError(HTTPException):
+    """502 raised when Claude's output cannot be turned into agent specifications."""
+
+    def __init__(self, detail: str):
+        super().__init__(status_code=502, detail=detail)
+
+
+def prompt_version(prompt_template_str: str) -> str:
+    """Short content hash identifying a prompt template."""
+    return hashlib.sha256(prompt_template_str.encode("utf-8")).hexdigest()[:12]
+
+
+_json_decoder = json.JSONDecoder()
+# Whitespace and commas between array elements
+_SEPARATOR_RE = re.compile(r"[\s,]*")
+# Missing comma between objects on separate lines, or a trailing comma before a closing bracket
+_REPAIR_RE = re.compile(r"}\s*\n\s*{|,\s*([\]}])")
+
+
+def _array_bounds(text: str) -> Tuple[int, int]:
+    """
+    Offsets of the JSON array in `text` (first `[` to last `]`, after
+    skipping a markdown fence), without copying the text.
+    """
+    start, end = 0, len(text)
+    while start < end and text[start].isspace():
+        start += 1
+    if text.startswith("```json", start):
+        start += 7
+    elif text.startswith("```", start):
+        start += 3
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    if text.endswith("```", start, end):
+        end -= 3
+    
+    array_start = text.find("[", start, end)
+    array_end = text.rfind("]", start, end)
+    if array_start != -1 and array_end > array_start:
+        logger.info("Extracted JSON from position %d to %d", array_start - start, array_end - start)
+        return array_start, array_end + 1
+    while start < end and text[start].isspace():
+        start += 1
+    return start, end
+
+
+def _decode_elements(text: str, start: int, end: int) -> Tuple[list, bool]:
+    """
+    Decode the elements of the array starting at `text[start]` one by one
+    (tolerating missing and trailing commas between them).
+    
+    Returns:
+        (elements decoded before the first invalid or incomplete one,
+        whether the closing bracket was reached)
+    """
+    elements = []
+    pos = start + 1
+    while True:
+        pos = _SEPARATOR_RE.match(text, pos, end).end()
+        if pos >= end:
+            return elements, False
+        if text[pos] == "]":
+            return elements, True
+        try:
+            element, pos = _json_decoder.raw_decode(text, pos)
+        except json.JSONDecodeError:
+            return elements, False
+        if pos > end:
+            return elements, False
+        elements.append(element)
+
+
+def _log_error_context(text: str, error: json.JSONDecodeError) -> None:
+    """Log the lines around a decode error (2 before, 1 after) without splitting the whole text."""
+    logger.error("Error at line %d, column %d", error.lineno, error.colno)
+    logger.error("Context around error:")
+    line_start = text.rfind("\n", 0, error.pos) + 1
+    first = line_start
+    for _ in range(2):
+        if first == 0:
+            break
+        first = text.rfind("\n", 0, first - 1) + 1
+    last = line_start
+    for _ in range(2):
+        next_break = text.find("\n", last)
+        if next_break == -1:
+            last = len(text)
+            break
+        last = next_break + 1
+    line_number = error.lineno - text.count("\n", first, line_start)
+    pos = first
+    while pos < last and pos < len(text):
+        line_end = text.find("\n", pos, last)
+        line_end = last if line_end == -1 else line_end
+        prefix = ">>> " if line_number == error.lineno else "    "
+        logger.error("%s%d: %s", prefix, line_number, text[pos:min(line_end, pos + 200)])
+        pos = line_end + 1
+        line_number += 1
+
+
+def _repair(text: str, start: int, end: int) -> str:
+    """
+    `text[start:end]` with missing commas between objects added and
+    trailing commas removed, built in one pass (the only copy of the output).
+    """
+    parts = []
+    pos = start
+    for match in _REPAIR_RE.finditer(text, start, end):
+        parts.append(text[pos:match.start()])
+        parts.append("},\n{" if match.group(1) is None else match.group(1))
+        pos = match.end()
+    parts.append(text[pos:end])
+    return "".join(parts)
+
+
+def parse_agent_specs(content_text: str) -> list:
+    """
+    Extract the JSON array of agent specifications from Claude's text output.
+    
+    Works on offsets into `content_text` instead of stripped and sliced
+    copies: markdown fences and surrounding prose are skipped by index and
+    the array is decoded in place. Missing and trailing commas between the
+    objects of a complete array are tolerated by decoding element by element.
+    Mistakes inside an object and truncated output need one repaired copy,
+    which truncated output is decoded from up to its last complete object.
+    
+    Args:
+        content_text: Text of the first content block returned by Claude
+        
+    Returns:
+        Parsed JSON value (expected to be a list of dicts)
+        
+    Raises:
+        AgentParseError: If no repair pass yields valid JSON
+    """
+    start, end = _array_bounds(content_text)
+    
+    # Try to parse the JSON array in place
+    try:
+        value, value_end = _json_decoder.raw_decode(content_text, start)
+        if value_end == end:
+            return value
+        raise json.JSONDecodeError("Extra data", content_text, value_end)
+    except json.JSONDecodeError as e:
+        logger.error("Initial JSON parsing failed: %s", str(e))
+        logger.error("Attempting to fix common JSON issues...")
+        first_error = e
+    _log_error_context(content_text, first_error)
+    
+    # Missing or trailing commas between the objects of a complete array
+    is_array = content_text.startswith("[", start)
+    truncated = (
+        content_text.count("[", start, end) > content_text.count("]", start, end)
+        or content_text.count("{", start, end) > content_text.count("}", start, end)
+    )
+    if is_array:
+        elements, closed = _decode_elements(content_text, start, end)
+        if closed:
+            logger.info("Successfully fixed JSON formatting issues")
+            return elements
+        # Stopped at the first broken object; decoded again from the repaired copy
+        del elements
+    
+    # Trailing commas inside objects need a repaired copy
+    fixed_text = _repair(content_text, start, end)
+    if is_array and truncated:
+        # Element by element, so objects after a repaired one are kept and no full parse is attempted
+        logger.info("Detected likely truncated JSON (bracket mismatch)")
+        elements, _ = _decode_elements(fixed_text, 0, len(fixed_text))
+        if elements:
+            logger.info("Successfully parsed truncated JSON")
+            return elements
+    else:
+        try:
+            agent_specs_data = json.loads(fixed_text)
+            logger.info("Successfully fixed JSON formatting issues")
+            return agent_specs_data
+        except json.JSONDecodeError as e2:
+            logger.error("JSON parsing still failed after fixes: %s", str(e2))
+        if not truncated:
+            raise AgentParseError(
+                f"Failed to parse agent specifications from Claude response: {str(first_error)}. Check logs for details."
+            )
+    
+    raise AgentParseError(
+        "Failed to parse agent specifications. Response appears truncated. Try with a simpler empire description."
+    )
+
+
+def validate_agent_specs(agent_specs_data) -> List[AgentSpecificationResponse]:
+    """
+    Validate parsed JSON as a list of AgentSpecificationResponse objects.
+    
+    Each parsed dict is released from `agent_specs_data` once its model is
+    built, so the parsed and validated copies of the swarm are never both
+    fully alive; the list is consumed in the process.
+    
+    Raises:
+        AgentParseError: If the value is not a list or an item fails validation
+    """
+    # Validate that we have a list
+    if not isinstance(agent_specs_data, list):
+        raise AgentParseError("Claude response did not contain a JSON array of agent specifications")
+    
+    # Validate and convert each item to AgentSpecificationResponse
+    validated_agents = []
+    for idx, agent_data in enumerate(agent_specs_data):
+        try:
+            agent_spec = AgentSpecificationResponse(**agent_data)
+            validated_agents.append(agent_spec)
+        except Exception as e:
+            raise AgentParseError(f"Failed to validate agent specification at index {idx}: {str(e)}")
+        agent_specs_data[idx] = None
+    agent_specs_data.clear()
+    
+    return validated_agents
+
+
+@dataclass
+class ProcessedOutput:
+    """
+    Result of post-processing one model response. Picklable, so that it can
+    be returned from a worker process; the raw output text is only carried
+    back when it failed to parse (for the failure store).
+    """
+    agents: List[AgentSpecificationResponse] = field(default_factory=list)
+    usage: dict = field(default_factory=dict)
+    stop_reason: Optional[str] = None
+    preview: str = ""
+    error: Optional[str] = None
+    content_text: Optional[str] = None
+    envelope_error: Optional[str] = None
+
+
+def process_output_text(content_text: str) -> ProcessedOutput:
+    """Parse and validate the agent specifications in raw model output."""
+    try:
+        with memory_profiler.phase("parse"):
+            agent_specs_data = parse_agent_specs(content_text)
+        with memory_profiler.phase("validate"):
+            agents = validate_agent_specs(agent_specs_data)
+    except AgentParseError as e:
+        return ProcessedOutput(error=e.detail, content_text=content_text)
+    return ProcessedOutput(agents=agents)
+
+
+def process_message_body(body: bytes) -> ProcessedOutput:
+    """
+    Extract the output text from a raw Messages API response body, then
+    parse and validate it. Takes the undecoded bytes so that a worker process
+    receives one buffer instead of a pickled JSON structure.
+    """
+    with memory_profiler.phase("extract"):
+        try:
+            response_json = json.loads(body)
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            return ProcessedOutput(envelope_error=f"Failed to parse Claude API response as JSON: {str(e)}")
+        del body
+        
+        # Claude Messages API returns: {"content": [{"type": "text", "text": "..."}], ...}
+        if not isinstance(response_json, dict) or not response_json.get("content"):
+            return ProcessedOutput(envelope_error="Claude API response missing 'content' field")
+        try:
+            content_text = response_json["content"][0]["text"]
+        except (KeyError, IndexError, TypeError) as e:
+            return ProcessedOutput(
+                envelope_error=f"Failed to extract or parse agent specifications from Claude response: {str(e)}"
+            )
+        usage = response_json.get("usage") or {}
+        stop_reason = response_json.get("stop_reason")
+        # Only the output text is needed from here on; release the decoded envelope
+        del response_json
+    
+    result = process_output_text(content_text)
+    result.usage = usage
+    result.stop_reason = stop_reason
+    result.preview = content_text[:1000] + "..." if len(content_text) > 1000 else content_text
+    return result
+
+
+# Minimal model output used to build the parser and validators ahead of traffic
+WARMUP_OUTPUT = "```json\n" + json.dumps([{
+    "agent_id": "warmup",
+    "agent_name": "Warmup",
+    "agent_purpose_and_tasks": "Exercise the parser",
+    "linked_empire_need_or_component": "none",
+    "suggested_technical_approach": "none",
+    "estimated_complexity_to_build": "Low",
+    "key_data_inputs": ["none"],
+    "key_data_outputs_or_actions": ["none"]
+}]) + "\n```"
+
+
+def warm_postprocess_worker() -> None:
+    """Worker-process initializer: build the parser and validators before the first request."""
+    process_output_text(WARMUP_OUTPUT)
+
+
+# Where extraction, repair and validation run: inline, thread pool or warm worker processes
+post_processor = PostProcessor(
+    backend=settings.POSTPROCESS_BACKEND,
+    workers=settings.POSTPROCESS_WORKERS,
+    initializer=warm_postprocess_worker
+)
+
+
+def build_prompt(empire_data: EmpireDescriptionRequest, prompt_template_str: str) -> str:
+    """Splice the empire description JSON into the prompt template."""
+    return prompt_template_str.replace(
+        "{{empire_description_json}}",
+        empire_data.model_dump_json()
+    )
+
+
+def empire_entry_count(empire_data: BaseModel) -> int:
+    """Number of list entries (needs, goals, challenges, ...) in an empire description."""
+    return sum(len(value) for _, value in empire_data if isinstance(value, list))
+
+
+def expected_agent_count(empire_data: BaseModel, agent_count: Optional[int] = None) -> int:
+    """`agent_count` if the prompt asks for an exact number, else the count predicted from the request's size."""
+    return agent_count or token_budgeter.expected_agents(empire_entry_count(empire_data))
+
+
+def estimate_request_tokens(
+    empire_data: EmpireDescriptionRequest,
+    prompt_template_str: str,
+    agent_count: Optional[int] = None
+) -> int:
+    """Estimated input tokens plus reserved max_tokens for a generation request."""
+    budget = token_budgeter.budget(
+        build_prompt(empire_data, prompt_template_str),
+        expected_agent_count(empire_data, agent_count)
+    )
+    return budget.input_tokens + budget.max_tokens
+
+
+def claude_request(final_prompt: str, max_tokens: int, stream: bool = False) -> dict:
+    """Messages API payload for a single-turn prompt."""
+    payload = {
+        "model": CLAUDE_MODEL,
+        "max_tokens": max_tokens,
+        "messages": [
+            {"role": "user", "content": final_prompt}
+        ]
+    }
+    if stream:
+        payload["stream"] = True
+    return payload
+
+
+def claude_headers(api_key: str) -> dict:
+    return {
+        "x-api-key": api_key,
+        "anthropic-version": "2023-06-01",
+        "Content-Type": "application/json"
+    }
+
 
 async def get_claude_suggestions(
     empire_data: EmpireDescriptionRequest,
-    api_key: str,
-    prompt_template_str: str
+    api_key: Optional[str],
+    prompt_template_str: str,
+    agent_count: Optional[int] = None,
+    request_id: Optional[str] = None
 ) -> List[AgentSpecificationResponse]:
     """
     Get agent suggestions from Claude API based on empire description.
     
     Args:
         empire_data: The empire description request data
-        api_key: Claude API key
+        api_key: Claude API key, or None to dispatch to the least-loaded key of the pool
         prompt_template_str: Prompt template with {{empire_description_json}} placeholder
+        agent_count: Exact number of agents the prompt asks for (default: predicted from the request's size)
+        request_id: Identifier recorded with failure artifacts
         
     Returns:
         List of validated AgentSpecificationResponse objects
@@ -33,39 +545,46 @@ async def get_claude_suggestions(
         HTTPException: For API errors, parsing errors, or validation errors
     """
     try:
-        # Convert empire data to JSON string
-        empire_json_str = empire_data.model_dump_json()
-        
-        # Replace placeholder in prompt template
-        final_prompt = prompt_template_str.replace(
-            "{{empire_description_json}}", 
-            empire_json_str
+        with memory_profiler.phase("prompt"):
+            # Inject empire data JSON into the prompt template
+            final_prompt = build_prompt(empire_data, prompt_template_str)
+            
+            # Size max_tokens and timeout from the prompt and expected agent count
+            budget = token_budgeter.budget(final_prompt, expected_agent_count(empire_data, agent_count))
+        logger.info(
+            "Request budget: ~%d input tokens, max_tokens=%d, read timeout=%.0fs",
+            budget.input_tokens, budget.max_tokens, budget.read_timeout
         )
         
         # Construct Claude API request
-        claude_payload = {
-            "model": "claude-sonnet-4-20250514",  # Claude 4 Sonnet model
-            "max_tokens": 20000,  # 20k tokens for complete responses
-            "messages": [
-                {"role": "user", "content": final_prompt}
-            ]
-        }
+        claude_payload = claude_request(final_prompt, budget.max_tokens)
         
-        claude_api_url = "https://api.anthropic.com/v1/messages"
-        headers = {
-            "x-api-key": api_key,
-            "anthropic-version": "2023-06-01",
-            "Content-Type": "application/json"
-        }
+        # Fail fast while the circuit is open
+        claude_circuit.allow_request()
         
         # Make async request to Claude API
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                claude_api_url,
-                json=claude_payload,
-                headers=headers,
-                timeout=120.0  # 120 second timeout
-            )
+        started_at = time.monotonic()
+        try:
+            with memory_profiler.phase("upstream"):
+                async with messages_response(
+                    claude_payload,
+                    tokens=budget.input_tokens + budget.max_tokens,
+                    timeout=httpx.Timeout(budget.read_timeout, connect=10.0),
+                    api_key=api_key
+                ) as response:
+                    pass
+        except httpx.RequestError:
+            claude_circuit.record_failure()
+            raise
+        except BaseException:
+            claude_circuit.release()
+            raise
+        
+        # Rate limiting and server errors count against the circuit; other responses mean upstream is up
+        if response.status_code == 429 or response.status_code >= 500:
+            claude_circuit.record_failure()
+        else:
+            claude_circuit.record_success()
         
         # Check response status
         if response.status_code != 200:
@@ -74,189 +593,58 @@ async def get_claude_suggestions(
                 detail=f"Error from Claude API: {response.text}"
             )
         
-        # Parse response
-        try:
-            response_json = response.json()
-        except json.JSONDecodeError as e:
-            raise HTTPException(
-                status_code=502,
-                detail=f"Failed to parse Claude API response as JSON: {str(e)}"
-            )
+        # Extraction, repair and validation are CPU-bound: run them on the post-processing backend
+        body = response.content
+        del response
+        result = await post_processor.run(process_message_body, body)
+        del body
+        if result.envelope_error is not None:
+            raise HTTPException(status_code=502, detail=result.envelope_error)
         
-        # Extract content from Claude's response structure
-        # Claude Messages API returns: {"content": [{"type": "text", "text": "..."}], ...}
-        try:
-            if "content" not in response_json or not response_json["content"]:
-                raise HTTPException(
-                    status_code=502,
-                    detail="Claude API response missing 'content' field"
-                )
-            
-            # Get the text content from the first content item
-            content_text = response_json["content"][0]["text"]
-            
-            # Log the raw content from Claude for debugging
-            logger.info("=" * 80)
-            logger.info("RAW CLAUDE RESPONSE:")
-            logger.info(content_text[:1000] + "..." if len(content_text) > 1000 else content_text)
-            logger.info("=" * 80)
-            
-            # Try to clean the response if it's wrapped in markdown or has extra text
-            cleaned_text = content_text.strip()
-            
-            # Remove markdown code blocks if present
-            if cleaned_text.startswith("```json"):
-                cleaned_text = cleaned_text[7:]  # Remove ```json
-            elif cleaned_text.startswith("```"):
-                cleaned_text = cleaned_text[3:]  # Remove ```
-            
-            if cleaned_text.endswith("```"):
-                cleaned_text = cleaned_text[:-3]  # Remove trailing ```
-            
-            cleaned_text = cleaned_text.strip()
-            
-            # Find the JSON array in the text (starts with [ and ends with ])
-            start_idx = cleaned_text.find('[')
-            end_idx = cleaned_text.rfind(']')
-            
-            if start_idx != -1 and end_idx != -1 and end_idx > start_idx:
-                cleaned_text = cleaned_text[start_idx:end_idx + 1]
-                logger.info("Extracted JSON from position %d to %d", start_idx, end_idx)
-            
-            # Try to parse the JSON array
-            try:
-                agent_specs_data = json.loads(cleaned_text)
-            except json.JSONDecodeError as e:
-                logger.error("Initial JSON parsing failed: %s", str(e))
-                logger.error("Attempting to fix common JSON issues...")
-                
-                # Try to fix common JSON formatting issues
-                fixed_text = cleaned_text
-                
-                # Fix missing commas between objects (common LLM error)
-                # Pattern: } followed by whitespace/newlines and then {
-                import re
-                fixed_text = re.sub(r'}\s*\n\s*{', '},\n{', fixed_text)
-                
-                # Fix trailing commas before closing brackets
-                fixed_text = re.sub(r',\s*\]', ']', fixed_text)
-                fixed_text = re.sub(r',\s*\}', '}', fixed_text)
-                
-                # Log the specific error location
-                if hasattr(e, 'lineno') and hasattr(e, 'colno'):
-                    error_line = e.lineno
-                    error_col = e.colno
-                    lines = cleaned_text.split('\n')
-                    if error_line <= len(lines):
-                        logger.error("Error at line %d, column %d", error_line, error_col)
-                        logger.error("Context around error:")
-                        # Show 2 lines before and after
-                        start_line = max(0, error_line - 3)
-                        end_line = min(len(lines), error_line + 2)
-                        for i in range(start_line, end_line):
-                            prefix = ">>> " if i == error_line - 1 else "    "
-                            logger.error("%s%d: %s", prefix, i + 1, lines[i][:200])
-                
-                # Try parsing the fixed text
-                try:
-                    agent_specs_data = json.loads(fixed_text)
-                    logger.info("Successfully fixed JSON formatting issues")
-                except json.JSONDecodeError as e2:
-                    # Try one more fix - handle truncated JSON
-                    logger.error("JSON parsing still failed after fixes: %s", str(e2))
-                    logger.error("Attempting to fix truncated JSON...")
-                    
-                    # Check if it's likely truncated (missing closing brackets)
-                    bracket_count = fixed_text.count('[') - fixed_text.count(']')
-                    brace_count = fixed_text.count('{') - fixed_text.count('}')
-                    
-                    if bracket_count > 0 or brace_count > 0:
-                        logger.info("Detected likely truncated JSON (bracket mismatch)")
-                        # Try to close the JSON properly
-                        truncated_fixed = fixed_text.rstrip()
-                        
-                        # Remove any incomplete entries at the end
-                        # Look for the last complete object
-                        last_complete_obj = truncated_fixed.rfind('},')
-                        if last_complete_obj > 0:
-                            truncated_fixed = truncated_fixed[:last_complete_obj + 1]
-                        
-                        # Close any open braces
-                        while brace_count > 0:
-                            truncated_fixed += '}'
-                            brace_count -= 1
-                        
-                        # Close the array
-                        if bracket_count > 0:
-                            truncated_fixed += ']'
-                        
-                        try:
-                            agent_specs_data = json.loads(truncated_fixed)
-                            logger.info("Successfully parsed truncated JSON")
-                        except json.JSONDecodeError:
-                            # If still failing, save for debugging
-                            import tempfile
-                            import os
-                            with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.json', dir='.') as f:
-                                f.write(cleaned_text)
-                                logger.error("Saved problematic JSON to: %s", f.name)
-                            
-                            raise HTTPException(
-                                status_code=502,
-                                detail=f"Failed to parse agent specifications. Response appears truncated. Try with a simpler empire description."
-                            )
-                    else:
-                        # Save the problematic JSON for debugging
-                        import tempfile
-                        import os
-                        with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.json', dir='.') as f:
-                            f.write(cleaned_text)
-                            logger.error("Saved problematic JSON to: %s", f.name)
-                        
-                        raise HTTPException(
-                            status_code=502,
-                            detail=f"Failed to parse agent specifications from Claude response: {str(e)}. Check logs for details."
-                        )
-            
-        except (KeyError, IndexError, json.JSONDecodeError) as e:
-            raise HTTPException(
-                status_code=502,
-                detail=f"Failed to extract or parse agent specifications from Claude response: {str(e)}"
-            )
+        # Log the raw content from Claude for debugging
+        logger.info("=" * 80)
+        logger.info("RAW CLAUDE RESPONSE:")
+        logger.info(result.preview or (result.content_text or "")[:1000])
+        logger.info("=" * 80)
         
-        # Validate that we have a list
-        if not isinstance(agent_specs_data, list):
-            raise HTTPException(
-                status_code=502,
-                detail="Claude response did not contain a JSON array of agent specifications"
+        # Keep the raw output for replay if parsing or validation failed
+        if result.error is not None:
+            failure_store.submit(
+                result.content_text,
+                request_id=request_id,
+                prompt_version=prompt_version(prompt_template_str),
+                usage=result.usage,
+                error=result.error
             )
+            raise AgentParseError(result.error)
+        usage = result.usage
+        stop_reason = result.stop_reason
+        validated_agents = result.agents
         
-        # Validate and convert each item to AgentSpecificationResponse
-        validated_agents = []
-        for idx, agent_data in enumerate(agent_specs_data):
-            try:
-                agent_spec = AgentSpecificationResponse(**agent_data)
-                validated_agents.append(agent_spec)
-            except Exception as e:
-                raise HTTPException(
-                    status_code=502,
-                    detail=f"Failed to validate agent specification at index {idx}: {str(e)}"
-                )
+        # Feed actual usage back into the estimator and budgeter
+        token_budgeter.observe(
+            final_prompt,
+            usage,
+            agent_count=len(validated_agents),
+            elapsed_seconds=time.monotonic() - started_at,
+            truncated=stop_reason == "max_tokens",
+            entry_count=None if agent_count else empire_entry_count(empire_data)
+        )
         
         return validated_agents
         
+    except httpx.TimeoutException:
+        # Timeout errors (checked first: TimeoutException is a RequestError)
+        raise HTTPException(
+            status_code=504,
+            detail=f"Request to Claude API timed out after {budget.read_timeout:.0f} seconds"
+        )
     except httpx.RequestError as e:
         # Network errors
         raise HTTPException(
             status_code=503,
             detail=f"Network error when calling Claude API: {str(e)}"
         )
-    except httpx.TimeoutException:
-        # Timeout errors
-        raise HTTPException(
-            status_code=504,
-            detail="Request to Claude API timed out after 120 seconds"
-        )
     except HTTPException:
         # Re-raise HTTP exceptions
         raise
@@ -266,3 +654,148 @@ async def get_claude_suggestions(
             status_code=500,
             detail=f"Unexpected error in Claude service: {str(e)}"
         )
+
+
+async def stream_claude_suggestions(
+    empire_data: EmpireDescriptionRequest,
+    api_key: Optional[str],
+    prompt_template_str: str,
+    agent_count: Optional[int] = None,
+    request_id: Optional[str] = None
+) -> AsyncIterator[dict]:
+    """
+    Stream agent suggestions from the Claude API as they are generated.
+    
+    Args:
+        empire_data: The empire description request data
+        api_key: Claude API key, or None to dispatch to the least-loaded key of the pool
+        prompt_template_str: Prompt template with {{empire_description_json}} placeholder
+        agent_count: Exact number of agents the prompt asks for (default: predicted from the request's size)
+        request_id: Identifier recorded with failure artifacts
+        
+    Yields:
+        Event dicts: `usage` (input/output tokens so far), `agent` (index and
+        AgentSpecificationResponse, as soon as each object is complete),
+        `progress` (agents received, agents expected, output characters) and
+        finally `complete` (all validated agents, usage, stop reason)
+        
+    Raises:
+        HTTPException: For API errors, parsing errors, or validation errors
+    """
+    final_prompt = build_prompt(empire_data, prompt_template_str)
+    expected_agents = expected_agent_count(empire_data, agent_count)
+    budget = token_budgeter.budget(final_prompt, expected_agents)
+    claude_payload = claude_request(final_prompt, budget.max_tokens, stream=True)
+    
+    claude_circuit.allow_request()
+    started_at = time.monotonic()
+    parser = AgentStreamParser()
+    streamed: List[AgentSpecificationResponse] = []
+    usage: dict = {}
+    stop_reason = None
+    outcome_recorded = False
+    try:
+        async with messages_response(
+            claude_payload,
+            tokens=budget.input_tokens + budget.max_tokens,
+            timeout=httpx.Timeout(budget.read_timeout, connect=10.0),
+            api_key=api_key,
+            stream=True
+        ) as response:
+            if response.status_code == 429 or response.status_code >= 500:
+                claude_circuit.record_failure()
+            else:
+                claude_circuit.record_success()
+            outcome_recorded = True
+            if response.status_code != 200:
+                body = await response.aread()
+                raise HTTPException(
+                    status_code=response.status_code,
+                    detail=f"Error from Claude API: {body.decode('utf-8', errors='replace')}"
+                )
+            
+            # Server-sent events: only the `data:` lines carry payloads
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                try:
+                    event = json.loads(line[5:])
+                except json.JSONDecodeError:
+                    continue
+                event_type = event.get("type")
+                if event_type == "content_block_delta":
+                    for agent_data in parser.feed(event.get("delta", {}).get("text") or ""):
+                        try:
+                            agent = AgentSpecificationResponse(**agent_data)
+                        except ValidationError as e:
+                            logger.warning("Skipping invalid streamed agent: %s", e)
+                            continue
+                        streamed.append(agent)
+                        yield {"type": "agent", "index": len(streamed) - 1, "agent": agent}
+                        yield {
+                            "type": "progress",
+                            "received": len(streamed),
+                            "expected": expected_agents,
+                            "output_chars": len(parser.text)
+                        }
+                elif event_type in ("message_start", "message_delta"):
+                    usage.update((event.get("message") or {}).get("usage") or event.get("usage") or {})
+                    stop_reason = (event.get("delta") or {}).get("stop_reason") or stop_reason
+                    yield {
+                        "type": "usage",
+                        "input_tokens": usage.get("input_tokens"),
+                        "output_tokens": usage.get("output_tokens")
+                    }
+                elif event_type == "error":
+                    raise HTTPException(
+                        status_code=502,
+                        detail=f"Error from Claude API stream: {event.get('error')}"
+                    )
+    except httpx.TimeoutException:
+        if not outcome_recorded:
+            claude_circuit.record_failure()
+        raise HTTPException(
+            status_code=504,
+            detail=f"Request to Claude API timed out after {budget.read_timeout:.0f} seconds"
+        )
+    except httpx.RequestError as e:
+        if not outcome_recorded:
+            claude_circuit.record_failure()
+        raise HTTPException(
+            status_code=503,
+            detail=f"Network error when calling Claude API: {str(e)}"
+        )
+    except BaseException:
+        # Includes cancellation and the consumer closing the stream early
+        if not outcome_recorded:
+            claude_circuit.release()
+        raise
+    
+    # The full-text parse can repair objects the incremental parser had to skip
+    result = await post_processor.run(process_output_text, parser.text)
+    validated_agents = result.agents
+    if result.error is not None:
+        if not streamed:
+            failure_store.submit(
+                parser.text,
+                request_id=request_id,
+                prompt_version=prompt_version(prompt_template_str),
+                usage=usage,
+                error=result.error
+            )
+            raise AgentParseError(result.error)
+        validated_agents = streamed
+    if len(validated_agents) < len(streamed):
+        validated_agents = streamed
+    for index in range(len(streamed), len(validated_agents)):
+        yield {"type": "agent", "index": index, "agent": validated_agents[index]}
+    
+    token_budgeter.observe(
+        final_prompt,
+        usage,
+        agent_count=len(validated_agents),
+        elapsed_seconds=time.monotonic() - started_at,
+        truncated=stop_reason == "max_tokens",
+        entry_count=None if agent_count else empire_entry_count(empire_data)
+    )
+    yield {"type": "complete", "agents": validated_agents, "usage": usage, "stop_reason": stop_reason}
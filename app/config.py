@@ -1,5 +1,6 @@
 """Configuration management for Agent Swarm MCP Server."""
 
+from typing import Optional
 from pydantic_settings import BaseSettings
 
 
@@ -12,6 +13,122 @@ class Settings(BaseSettings):
     # Optional with defaults
     MASTER_PROMPT_PATH: str = "./prompts/master_prompt.txt"
     
+    # Additional API keys, comma-separated; each entry is `key` or `key@base_url`
+    CLAUDE_API_KEYS: Optional[str] = None
+    KEY_AUTH_QUARANTINE_SECONDS: float = 600.0
+    KEY_RATE_LIMIT_QUARANTINE_SECONDS: float = 30.0
+    SCALE_CONCURRENCY_WITH_KEYS: bool = True
+    
+    # Shared upstream HTTP client
+    UPSTREAM_MAX_CONNECTIONS: int = 20
+    UPSTREAM_KEEPALIVE_EXPIRY: float = 60.0
+    
+    # Circuit breaker around the Claude API
+    CIRCUIT_FAILURE_THRESHOLD: int = 5
+    CIRCUIT_RECOVERY_TIMEOUT: float = 30.0
+    
+    # Request budgeting: max_tokens and read timeout are sized per request, from
+    # the prompt and an agent count predicted from the request's list entries
+    EXPECTED_AGENT_COUNT: int = 25
+    MIN_EXPECTED_AGENT_COUNT: int = 15
+    INITIAL_AGENTS_PER_ENTRY: float = 1.5
+    MAX_TOKENS_CAP: int = 20000
+    MIN_MAX_TOKENS: int = 2048
+    INITIAL_TOKENS_PER_AGENT: float = 550.0
+    INITIAL_OUTPUT_TOKENS_PER_SECOND: float = 150.0
+    TOKEN_HEADROOM: float = 1.25
+    TIMEOUT_BASE: float = 15.0
+    TIMEOUT_MIN: float = 30.0
+    TIMEOUT_MAX: float = 120.0
+    
+    # Admission control for generation requests
+    MAX_CONCURRENT_GENERATIONS: int = 8
+    MAX_QUEUED_GENERATIONS: int = 32
+    QUEUE_TIMEOUT: float = 30.0
+    
+    # Priority classes: concurrency limit and token budget (0 = unlimited) per class
+    INTERACTIVE_MAX_CONCURRENT: int = 8
+    INTERACTIVE_TOKENS_PER_MINUTE: int = 0
+    BATCH_MAX_CONCURRENT: int = 6
+    BATCH_TOKENS_PER_MINUTE: int = 0
+    BACKGROUND_MAX_CONCURRENT: int = 2
+    BACKGROUND_TOKENS_PER_MINUTE: int = 0
+    DEFAULT_PRIORITY: str = "batch"
+    # Required as X-Priority-Key for classes above DEFAULT_PRIORITY; without it they run at DEFAULT_PRIORITY
+    PRIORITY_API_KEY: Optional[str] = None
+    
+    # Keep generating after every client disconnected (result still fills the cache)
+    FINISH_GENERATION_ON_DISCONNECT: bool = False
+    
+    # Failed model outputs kept for replay (gzip, bounded by count and total size)
+    FAILURE_ARTIFACT_DIR: str = "./failed_outputs"
+    FAILURE_ARTIFACT_MAX_COUNT: int = 200
+    FAILURE_ARTIFACT_MAX_BYTES: int = 50_000_000
+    
+    # Generation history (SQLite with FTS5), written in batches off the request path
+    HISTORY_ENABLED: bool = True
+    HISTORY_DB_PATH: str = "./data/history.sqlite3"
+    HISTORY_BATCH_SIZE: int = 50
+    HISTORY_FLUSH_INTERVAL: float = 0.5
+    HISTORY_EXPORT_BATCH_SIZE: int = 10000
+    
+    # Required as X-Admin-Key on /admin and /history endpoints, which are disabled while it is unset
+    ADMIN_API_KEY: Optional[str] = None
+    
+    # Reuse results of near-duplicate payloads (MinHash similarity of their text)
+    SIMILARITY_REUSE_ENABLED: bool = True
+    SIMILARITY_THRESHOLD: float = 0.9
+    SIMILARITY_INDEX_CAPACITY: int = 100_000
+    
+    # Incremental regeneration after empire edits
+    DELTA_PROMPT_PATH: str = "./prompts/delta_prompt.txt"
+    DELTA_LINK_THRESHOLD: float = 0.35
+    DELTA_MAX_FRACTION: float = 0.6
+    DELTA_MIN_DESCRIPTION_SIMILARITY: float = 0.5
+    
+    # Near-duplicate agent detection (cosine similarity of hashed TF-IDF vectors)
+    DEDUP_SIMILARITY_THRESHOLD: float = 0.7
+    DEDUP_MAX_AGENTS: int = 100_000
+    
+    # Response compression (brotli needs the optional brotli package)
+    COMPRESSION_MIN_SIZE: int = 1024
+    GZIP_LEVEL: int = 6
+    BROTLI_QUALITY: int = 5
+    
+    # Input normalization before prompt assembly (token counts are estimates)
+    NORMALIZE_INPUT: bool = True
+    INPUT_MAX_ENTRIES_PER_FIELD: int = 20
+    INPUT_MAX_ENTRY_TOKENS: int = 120
+    INPUT_FIELD_TOKEN_BUDGET: int = 600
+    INPUT_TEXT_TOKEN_BUDGET: int = 800
+    
+    # Startup warmup, reported by /ready
+    WARMUP_ENABLED: bool = True
+    WARMUP_TIMEOUT: float = 20.0
+    WARMUP_UPSTREAM_CONNECTIONS: int = 2
+    WARMUP_FROM_HISTORY: bool = False
+    WARMUP_HISTORY_LIMIT: int = 500
+    
+    # tracemalloc allocation profiling (/admin/memory); adds overhead while tracing
+    MEMORY_PROFILING: bool = False
+    MEMORY_PROFILING_FRAMES: int = 1
+    
+    # Post-processing of model output: "inline", "thread" or "process" (warm worker processes)
+    POSTPROCESS_BACKEND: str = "thread"
+    POSTPROCESS_WORKERS: int = 2
+    # Seconds between event-loop lag samples (0 disables)
+    EVENT_LOOP_LAG_INTERVAL: float = 0.5
+    
+    # Speculative generation from empire builder drafts (opt-in; spends tokens on drafts never submitted)
+    SPECULATION_ENABLED: bool = False
+    SPECULATION_PRIORITY: str = "background"
+    SPECULATION_RESTART_SIMILARITY: float = 0.9
+    SPECULATION_TTL: float = 900.0
+    SPECULATION_MAX_SESSIONS: int = 1000
+    
+    # Last good results kept for stale fallback while the circuit is open
+    STALE_CACHE_MAX_ENTRIES: int = 256
+    
     class Config:
         """Pydantic configuration."""
         env_file = ".env"
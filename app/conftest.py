@@ -0,0 +1,118 @@
+"""pytest setup and shared fixtures for the offline test modules in app/."""
+
+import asyncio
+import json
+import os
+
+# Settings require a key at import time; the offline tests never send it anywhere
+os.environ.setdefault("CLAUDE_API_KEY", "test-key")
+
+import httpx
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Manual scripts that call the real Claude API
+collect_ignore = [
+    "test_agent_generation.py",
+    "test_claude.py",
+    "test_comprehensive.py",
+    "test_exact_input.py",
+    "test_extended_format.py",
+]
+
+
+def sample_agent(index: int, link: str = "ends: durable democratic coalitions") -> dict:
+    return {
+        "agent_id": f"agent-{index}",
+        "agent_name": f"Agent {index} for {link}",
+        "agent_purpose_and_tasks": f"Serves {link}",
+        "linked_empire_need_or_component": link,
+        "suggested_technical_approach": "Python service",
+        "estimated_complexity_to_build": "Low",
+        "key_data_inputs": ["records"],
+        "key_data_outputs_or_actions": ["reports"],
+    }
+
+
+def extended_empire(name: str, **changes) -> dict:
+    """An ExtendedEmpireDescription payload; `name` keeps payloads of different tests apart."""
+    return {
+        "empire_name_and_description": f"{name}. A network of neighbourhood assemblies running open civic tools",
+        "ends": ["Durable democratic coalitions", "Transparent municipal budgets"],
+        "means": ["Open source civic software"],
+        "principles": ["Radical transparency"],
+        "identity": ["Stewards of the commons"],
+        "resentments": ["Backroom deals"],
+        "emotions": ["Quiet determination"],
+        **changes,
+    }
+
+
+class StubUpstream:
+    """
+    In-process Claude Messages API. Every request is answered with `agents`
+    (streamed as SSE when the request asks for it), or with `status` when
+    that is not 200; `delay` seconds pass before the answer or each event.
+    """
+
+    def __init__(self):
+        self.agents = [sample_agent(index) for index in range(3)]
+        self.status = 200
+        self.delay = 0.0
+        self.requests = []
+
+    async def handler(self, request: httpx.Request) -> httpx.Response:
+        payload = json.loads(request.content) if request.content else {}
+        self.requests.append(payload)
+        if self.status != 200:
+            await asyncio.sleep(self.delay)
+            return httpx.Response(self.status, text="upstream error")
+        text = "```json\n" + json.dumps(self.agents, indent=1) + "\n```"
+        if not payload.get("stream"):
+            await asyncio.sleep(self.delay)
+            return httpx.Response(200, json={
+                "content": [{"type": "text", "text": text}],
+                "usage": {"input_tokens": 1000, "output_tokens": 300},
+                "stop_reason": "end_turn",
+            })
+
+        events = [{"type": "message_start", "message": {"usage": {"input_tokens": 1000, "output_tokens": 1}}}]
+        events += [
+            {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": text[i:i + 64]}}
+            for i in range(0, len(text), 64)
+        ]
+        events += [
+            {"type": "message_delta", "delta": {"stop_reason": "end_turn"}, "usage": {"output_tokens": 300}},
+            {"type": "message_stop"},
+        ]
+        delay = self.delay
+
+        async def body():
+            for event in events:
+                await asyncio.sleep(delay)
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n".encode()
+
+        return httpx.Response(200, content=body(), headers={"content-type": "text/event-stream"})
+
+
+@pytest.fixture
+def upstream():
+    """A fresh StubUpstream behind the shared Claude API client."""
+    from app import claude_service
+    stub = StubUpstream()
+    claude_service._http_client = httpx.AsyncClient(transport=httpx.MockTransport(stub.handler))
+    yield stub
+    claude_service._http_client = None
+
+
+@pytest.fixture
+def client(upstream, monkeypatch):
+    """TestClient of the app against the stub upstream, without history or connection warmup."""
+    from fastapi.testclient import TestClient
+    from app import main
+    monkeypatch.chdir(REPO_DIR)
+    monkeypatch.setattr(main.settings, "HISTORY_ENABLED", False)
+    monkeypatch.setattr(main.settings, "WARMUP_UPSTREAM_CONNECTIONS", 0)
+    with TestClient(main.app) as test_client:
+        yield test_client
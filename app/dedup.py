@@ -0,0 +1,232 @@
+"""Vectorized near-duplicate detection and clustering of agents."""
+
+import string
+from itertools import chain
+from typing import List, Sequence, Tuple
+import numpy as np
+from app.models import AgentSpecificationResponse
+
+# Punctuation becomes whitespace so str.split() tokenizes (much faster than a regex)
+_PUNCTUATION = str.maketrans({c: " " for c in string.punctuation})
+_MIX1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX2 = np.uint64(0x94D049BB133111EB)
+# Token buckets for document frequencies and candidate search
+_TOKEN_BITS = 22
+_TOKEN_MASK = (1 << _TOKEN_BITS) - 1
+
+# Inputs up to this size are compared exhaustively with a blocked Gram matrix
+_EXACT_LIMIT = 4096
+_BLOCK_ROWS = 1024
+# Candidate pairs scored per batch (bounds the gathered row copies)
+_SCORE_CHUNK = 65536
+
+
+def agent_text(agent: AgentSpecificationResponse) -> str:
+    """Text an agent is compared by: its name and purpose."""
+    return f"{agent.agent_name} {agent.agent_purpose_and_tasks}"
+
+
+def _mix(hashes: np.ndarray) -> np.ndarray:
+    with np.errstate(over="ignore"):
+        hashes = (hashes ^ (hashes >> np.uint64(30))) * _MIX1
+        hashes = (hashes ^ (hashes >> np.uint64(27))) * _MIX2
+        hashes ^= hashes >> np.uint64(31)
+    return hashes
+
+
+def _token_hashes(texts: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """(document index, 64-bit hash) of every word unigram and bigram of `texts`."""
+    tokenized = [text.lower().translate(_PUNCTUATION).split() for text in texts]
+    lengths = np.fromiter(map(len, tokenized), dtype=np.intp, count=len(texts))
+    words = list(chain.from_iterable(tokenized))
+    unigrams = _mix(np.fromiter(map(hash, words), dtype=np.int64, count=len(words)).view(np.uint64))
+    docs = np.repeat(np.arange(len(texts)), lengths)
+    # Bigram hashes are derived from adjacent unigram hashes of the same document
+    same_doc = docs[1:] == docs[:-1]
+    with np.errstate(over="ignore"):
+        bigrams = _mix(unigrams[:-1] * _MIX1 + unigrams[1:])[same_doc]
+    return np.concatenate([docs, docs[:-1][same_doc]]), np.concatenate([unigrams, bigrams])
+
+
+def _unique(values: np.ndarray) -> np.ndarray:
+    """Sorted unique values (sort-based; np.unique is far slower on large int arrays)."""
+    values = np.sort(values)
+    keep = np.ones(len(values), dtype=bool)
+    np.not_equal(values[1:], values[:-1], out=keep[1:])
+    return values[keep]
+
+
+def hashed_tfidf(texts: Sequence[str], dimensions: int = 256) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    TF-IDF over word unigrams and bigrams, folded into `dimensions` columns
+    with the signed hashing trick.
+
+    IDF is fitted on `texts` itself, so vectors are only comparable within
+    one call. Rows are L2-normalized, making dot products cosine similarities.
+
+    Returns:
+        (vectors, doc_tokens): the float32 matrix, and the sorted unique
+        `doc << _TOKEN_BITS | token` keys of each document's token buckets
+    """
+    vectors = np.zeros((len(texts), dimensions), dtype=np.float32)
+    docs, hashes = _token_hashes(texts)
+    if not len(hashes):
+        return vectors, np.empty(0, dtype=np.int64)
+
+    # Document frequency per token bucket, counting each token once per document
+    tokens = (hashes >> np.uint64(64 - _TOKEN_BITS)).astype(np.int64)
+    doc_tokens = _unique(docs.astype(np.int64) << _TOKEN_BITS | tokens)
+    df = np.bincount(doc_tokens & _TOKEN_MASK, minlength=1 << _TOKEN_BITS)
+    idf = np.log((1 + len(texts)) / (1 + df[tokens])) + 1.0
+
+    columns = (hashes % np.uint64(dimensions)).astype(np.intp)
+    signs = np.where(hashes & np.uint64(1 << 32), 1.0, -1.0)
+    np.add.at(vectors, (docs, columns), (signs * idf).astype(np.float32))
+
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    np.divide(vectors, norms, out=vectors, where=norms > 0)
+    return vectors, doc_tokens
+
+
+def _exact_pairs(vectors: np.ndarray, threshold: float) -> np.ndarray:
+    pairs = []
+    for start in range(0, len(vectors), _BLOCK_ROWS):
+        block = vectors[start:start + _BLOCK_ROWS] @ vectors.T
+        rows, cols = np.nonzero(block >= threshold)
+        rows += start
+        upper = rows < cols
+        pairs.append(np.stack([rows[upper], cols[upper]], axis=1))
+    return np.concatenate(pairs)
+
+
+def _candidate_pairs(count: int, doc_tokens: np.ndarray, prefix: int, window: int) -> np.ndarray:
+    """
+    Pairs of documents sharing one of their `prefix` rarest tokens
+    (prefix filtering: near-duplicates almost always share rare tokens).
+
+    Entries are sorted by token and paired with up to `window` following
+    entries of the same token, which caps the work for frequent tokens.
+    """
+    df = np.bincount(doc_tokens & _TOKEN_MASK, minlength=1 << _TOKEN_BITS)
+    # Tokens seen in a single document cannot pair anything
+    doc_tokens = doc_tokens[df[doc_tokens & _TOKEN_MASK] > 1]
+    docs = doc_tokens >> _TOKEN_BITS
+    tokens = doc_tokens & _TOKEN_MASK
+    # Rank each document's tokens by document frequency (rarest first)
+    order = np.argsort(docs << _TOKEN_BITS | np.minimum(df[tokens], _TOKEN_MASK), kind="stable")
+    starts = np.searchsorted(docs[order], docs[order], side="left")
+    rare = order[np.arange(len(order)) - starts < prefix]
+    by_token = rare[np.argsort(tokens[rare], kind="stable")]
+    sorted_tokens, sorted_docs = tokens[by_token], docs[by_token]
+    candidates = []
+    for offset in range(1, window + 1):
+        same = sorted_tokens[offset:] == sorted_tokens[:-offset]
+        left, right = sorted_docs[:-offset][same], sorted_docs[offset:][same]
+        candidates.append(np.minimum(left, right) * count + np.maximum(left, right))
+    keys = _unique(np.concatenate(candidates))
+    keys = keys[keys // count != keys % count]
+    return np.stack([keys // count, keys % count], axis=1)
+
+
+def _components(count: int, pairs: np.ndarray) -> np.ndarray:
+    """Connected-component label (smallest member index) per node."""
+    labels = np.arange(count)
+    if not len(pairs):
+        return labels
+    left, right = pairs[:, 0], pairs[:, 1]
+    while True:
+        low = np.minimum(labels[left], labels[right])
+        updated = labels.copy()
+        np.minimum.at(updated, left, low)
+        np.minimum.at(updated, right, low)
+        updated = updated[updated]
+        if np.array_equal(updated, labels):
+            return labels
+        labels = updated
+
+
+def cluster_texts(
+    texts: Sequence[str],
+    threshold: float,
+    dimensions: int = 256,
+    prefix: int = 6,
+    window: int = 16
+) -> np.ndarray:
+    """
+    Group near-duplicate texts.
+
+    Small inputs are compared exhaustively with a blocked Gram matrix; larger
+    ones only score candidate pairs that share a rare token.
+    Clusters are the connected components of pairs with cosine similarity of
+    at least `threshold`.
+
+    Args:
+        texts: Texts to cluster
+        threshold: Minimum TF-IDF cosine similarity of two duplicates
+        dimensions: Hashed vector dimensions
+        prefix: Rarest tokens per text used to find candidates
+        window: Texts paired per token occurrence
+
+    Returns:
+        Index of each text's canonical representative: the cluster member
+        closest to the cluster centroid
+    """
+    if not len(texts):
+        return np.empty(0, dtype=np.intp)
+    vectors, doc_tokens = hashed_tfidf(texts, dimensions)
+    if len(texts) <= _EXACT_LIMIT:
+        pairs = _exact_pairs(vectors, threshold)
+    else:
+        pairs = _candidate_pairs(len(texts), doc_tokens, prefix, window)
+        scores = np.concatenate([
+            np.einsum("ij,ij->i", vectors[chunk[:, 0]], vectors[chunk[:, 1]])
+            for chunk in np.array_split(pairs, max(1, len(pairs) // _SCORE_CHUNK))
+        ])
+        pairs = pairs[scores >= threshold]
+    labels = _components(len(texts), pairs)
+
+    centroids = np.zeros_like(vectors)
+    np.add.at(centroids, labels, vectors)
+    # Rounded so that float noise does not break ties between equally central members
+    closeness = np.round(np.einsum("ij,ij->i", vectors, centroids[labels]), 4)
+    # Highest closeness per cluster wins; ties go to the earliest member
+    order = np.lexsort((np.arange(len(texts)), -closeness, labels))
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = labels[order][1:] != labels[order][:-1]
+    representative = np.empty(len(texts), dtype=np.intp)
+    representative[labels[order[first]]] = order[first]
+    return representative[labels]
+
+
+def deduplicate_agents(
+    agents: List[AgentSpecificationResponse],
+    threshold: float
+) -> List[AgentSpecificationResponse]:
+    """Canonical representative of each cluster of near-duplicate agents, in first-seen order."""
+    if len(agents) < 2:
+        return list(agents)
+    representatives = cluster_texts([agent_text(agent) for agent in agents], threshold)
+    kept = []
+    seen = set()
+    for index in representatives.tolist():
+        if index not in seen:
+            seen.add(index)
+            kept.append(agents[index])
+    return kept
+
+
+def group_clusters(representatives: np.ndarray, min_size: int = 2) -> List[List[int]]:
+    """
+    Member indices of each cluster with at least `min_size` members, largest
+    first. The representative is always the first member.
+    """
+    order = np.argsort(representatives, kind="stable")
+    sorted_reps = representatives[order]
+    boundaries = np.flatnonzero(sorted_reps[1:] != sorted_reps[:-1]) + 1
+    clusters = []
+    for members in np.split(order, boundaries):
+        if len(members) >= min_size:
+            rep = int(representatives[members[0]])
+            clusters.append([rep] + [int(m) for m in members if m != rep])
+    clusters.sort(key=len, reverse=True)
+    return clusters
@@ -0,0 +1,252 @@
+"""Field-by-field empire diffs and selection of agents affected by an edit."""
+
+import json
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set
+from app.models import AgentSpecificationResponse, ExtendedEmpireDescription
+
+# List fields of ExtendedEmpireDescription that agents link to
+LIST_FIELDS = ("ends", "means", "principles", "identity", "resentments", "emotions")
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = {
+    "the", "and", "for", "that", "with", "this", "are", "from", "into", "their",
+    "them", "they", "who", "what", "which", "its", "our", "not", "but", "can",
+    "has", "have", "will", "all", "any", "how", "why", "about", "over", "more",
+}
+# Inflection suffixes stripped by `stem`, longest first
+_SUFFIXES = ("ations", "ation", "ments", "ment", "ings", "ing", "ies", "ied", "ers", "er", "ed", "es", "ly", "s", "e")
+
+
+def _key(entry: str) -> str:
+    return " ".join(entry.lower().split())
+
+
+def stem(word: str) -> str:
+    """
+    Crude suffix-stripping stem, so that inflections of a word compare equal
+    ("coalitions" and "coalition", "organizing" and "organize"). Stems keep
+    at least three characters.
+    """
+    for suffix in _SUFFIXES:
+        if suffix == "s" and word.endswith("ss"):
+            continue
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)] + ("y" if suffix in ("ies", "ied") else "")
+    return word
+
+
+def content_words(text: str) -> Set[str]:
+    """Stemmed lowercase words of 3+ characters, without common stopwords."""
+    return {stem(w) for w in _WORD_RE.findall(text.lower()) if len(w) >= 3 and w not in _STOPWORDS}
+
+
+@dataclass
+class EmpireDiff:
+    """Entries removed from and added to each list field, plus description similarity."""
+    removed: Dict[str, List[str]] = field(default_factory=dict)
+    added: Dict[str, List[str]] = field(default_factory=dict)
+    description_similarity: float = 1.0
+
+    @property
+    def removed_count(self) -> int:
+        return sum(len(v) for v in self.removed.values())
+
+    @property
+    def added_count(self) -> int:
+        return sum(len(v) for v in self.added.values())
+
+    @property
+    def is_empty(self) -> bool:
+        return not self.removed_count and not self.added_count and self.description_similarity == 1.0
+
+    def as_dict(self) -> dict:
+        """Changed fields only, for the delta prompt."""
+        changes = {}
+        for name in LIST_FIELDS:
+            removed, added = self.removed.get(name, []), self.added.get(name, [])
+            if removed or added:
+                changes[name] = {"removed": removed, "added": added}
+        return changes
+
+
+def diff_empires(old: ExtendedEmpireDescription, new: ExtendedEmpireDescription) -> EmpireDiff:
+    """
+    Compare two empire descriptions entry by entry.
+
+    Entries are matched ignoring case and whitespace; an edited entry shows up
+    as one removal plus one addition in its field.
+    """
+    diff = EmpireDiff()
+    for name in LIST_FIELDS:
+        old_entries, new_entries = getattr(old, name), getattr(new, name)
+        old_keys = {_key(e) for e in old_entries}
+        new_keys = {_key(e) for e in new_entries}
+        removed = [e for e in old_entries if _key(e) not in new_keys]
+        added = [e for e in new_entries if _key(e) not in old_keys]
+        if removed:
+            diff.removed[name] = removed
+        if added:
+            diff.added[name] = added
+
+    if _key(old.empire_name_and_description) != _key(new.empire_name_and_description):
+        old_words = content_words(old.empire_name_and_description)
+        new_words = content_words(new.empire_name_and_description)
+        union = old_words | new_words
+        diff.description_similarity = len(old_words & new_words) / len(union) if union else 1.0
+    return diff
+
+
+def _containment(entry_words: Set[str], linked_words: Set[str]) -> float:
+    return len(entry_words & linked_words) / len(entry_words) if entry_words else 0.0
+
+
+def affected_agent_links(
+    agents: List[AgentSpecificationResponse],
+    old: ExtendedEmpireDescription,
+    diff: EmpireDiff,
+    threshold: float
+) -> Dict[int, str]:
+    """
+    Agents whose `linked_empire_need_or_component` depends on a removed or
+    changed entry, by index, mapped to that entry (as its match key).
+
+    An agent depends on an entry when at least `threshold` of the entry's
+    content words (stemmed) appear in its link text. It is affected when its
+    strongest link is to a removed entry rather than to one that is kept.
+    """
+    removed_keys = {_key(e) for entries in diff.removed.values() for e in entries}
+    if not removed_keys:
+        return {}
+    removed, kept = [], []
+    for name in LIST_FIELDS:
+        for entry in getattr(old, name):
+            key = _key(entry)
+            (removed if key in removed_keys else kept).append((content_words(entry), key))
+
+    affected = {}
+    for idx, agent in enumerate(agents):
+        linked_words = content_words(agent.linked_empire_need_or_component)
+        best_removed, best_key = max(((_containment(w, linked_words), k) for w, k in removed), default=(0.0, ""))
+        best_kept = max((_containment(w, linked_words) for w, _ in kept), default=0.0)
+        if best_removed >= threshold and best_removed >= best_kept:
+            affected[idx] = best_key
+    return affected
+
+
+def affected_agent_indices(
+    agents: List[AgentSpecificationResponse],
+    old: ExtendedEmpireDescription,
+    diff: EmpireDiff,
+    threshold: float
+) -> List[int]:
+    """Indices of the agents `affected_agent_links` finds, in order."""
+    return sorted(affected_agent_links(agents, old, diff, threshold))
+
+
+@dataclass
+class DeltaPlan:
+    """How an edit is served: `full`, `unchanged` or `incremental` (regenerating `affected`)."""
+    mode: str
+    diff: Optional[EmpireDiff] = None
+    affected: List[int] = field(default_factory=list)
+    regenerate_count: int = 0
+
+
+def plan_delta(
+    previous_empire: Optional[ExtendedEmpireDescription],
+    previous_agents: Optional[List[AgentSpecificationResponse]],
+    empire: ExtendedEmpireDescription,
+    link_threshold: float,
+    max_fraction: float,
+    min_description_similarity: float
+) -> DeltaPlan:
+    """
+    Decide whether an edit can be patched. Falls back to a full generation
+    without a previous swarm, when the description changed too much
+    (`min_description_similarity`) or when more than `max_fraction` of the
+    agents are affected. An edit of the name or description alone is also
+    regenerated in full: every agent may depend on it and no entry change
+    points to the ones to replace. Incremental plans regenerate the affected
+    agents plus one per added entry that no replaced agent covers: an edited
+    entry whose old version no agent linked to still gets an agent.
+    """
+    if previous_empire is None or not previous_agents:
+        return DeltaPlan("full")
+    diff = diff_empires(previous_empire, empire)
+    links = affected_agent_links(previous_agents, previous_empire, diff, link_threshold)
+    affected = sorted(links)
+    if (diff.description_similarity < min_description_similarity
+            or len(affected) > max_fraction * len(previous_agents)):
+        return DeltaPlan("full", diff, affected)
+    if diff.is_empty:
+        return DeltaPlan("unchanged", diff)
+    if not diff.removed_count and not diff.added_count:
+        return DeltaPlan("full", diff)
+    # Each removed entry with a replaced agent can hand that agent to an added entry
+    regenerate_count = len(affected) + max(0, diff.added_count - len(set(links.values())))
+    return DeltaPlan("incremental", diff, affected, regenerate_count)
+
+
+def _agent_brief(agent: AgentSpecificationResponse) -> dict:
+    return {
+        "agent_id": agent.agent_id,
+        "agent_name": agent.agent_name,
+        "linked_empire_need_or_component": agent.linked_empire_need_or_component,
+    }
+
+
+def render_delta_prompt(
+    template: str,
+    diff: EmpireDiff,
+    kept: List[AgentSpecificationResponse],
+    replaced: List[AgentSpecificationResponse],
+    agent_count: int
+) -> str:
+    """
+    Fill every delta prompt placeholder except {{empire_description_json}},
+    which build_prompt fills like for a full generation.
+    """
+    return (
+        template
+        .replace("{{empire_changes_json}}", json.dumps(diff.as_dict(), indent=1))
+        .replace("{{kept_agents_json}}", json.dumps([_agent_brief(a) for a in kept]))
+        .replace("{{replaced_agents_json}}", json.dumps([_agent_brief(a) for a in replaced]))
+        .replace("{{agent_count}}", str(agent_count))
+    )
+
+
+def merge_agents(
+    previous: List[AgentSpecificationResponse],
+    affected: List[int],
+    regenerated: List[AgentSpecificationResponse]
+) -> List[AgentSpecificationResponse]:
+    """
+    Kept agents in their original order, with regenerated agents taking the
+    replaced agents' positions and any extra ones appended. Agent ids that
+    clash with a kept agent are made unique.
+    """
+    affected_set = set(affected)
+    kept_ids = {a.agent_id for i, a in enumerate(previous) if i not in affected_set}
+    fresh = []
+    for agent in regenerated:
+        agent_id = agent.agent_id
+        suffix = 2
+        while agent_id in kept_ids:
+            agent_id = f"{agent.agent_id}-{suffix}"
+            suffix += 1
+        kept_ids.add(agent_id)
+        fresh.append(agent if agent_id == agent.agent_id else agent.model_copy(update={"agent_id": agent_id}))
+
+    merged = []
+    fresh_iter = iter(fresh)
+    for idx, agent in enumerate(previous):
+        if idx in affected_set:
+            replacement = next(fresh_iter, None)
+            if replacement is not None:
+                merged.append(replacement)
+        else:
+            merged.append(agent)
+    merged.extend(fresh_iter)
+    return merged
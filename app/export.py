@@ -0,0 +1,218 @@
+"""Streaming bulk export of stored agents and their swarm metadata (Arrow IPC, Parquet, CSV, NDJSON)."""
+
+import csv
+import functools
+import io
+import json
+import time
+from datetime import datetime, timezone
+from typing import Iterable, Iterator, List, Optional, Tuple
+from fastapi import HTTPException
+from app.history import EXPORT_COLUMNS, LIST_COLUMNS, HistoryStore
+from app.metrics import metrics
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:  # optional dependency
+    pyarrow = None
+
+metrics.describe("export_rows_total", "Agents written by bulk history exports, by format")
+metrics.describe("export_seconds", "Wall time of bulk history exports, by format")
+
+# Format name -> (media type, file extension)
+EXPORT_FORMATS = {
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+}
+COLUMNAR_FORMATS = ("parquet", "arrow")
+
+_CREATED_AT = EXPORT_COLUMNS.index("created_at")
+_DOMAINS = EXPORT_COLUMNS.index("domains")
+_LIST_COLUMNS = tuple(EXPORT_COLUMNS.index(name) for name in LIST_COLUMNS)
+
+
+def available_formats() -> List[str]:
+    """Export formats usable in this process (the columnar ones need pyarrow)."""
+    return [name for name in EXPORT_FORMATS if pyarrow is not None or name not in COLUMNAR_FORMATS]
+
+
+def resolve_format(name: Optional[str]) -> str:
+    """
+    Validate a `format=` parameter; without one, Parquet when pyarrow is
+    installed, else CSV.
+
+    Raises:
+        HTTPException: 422 for an unknown format or a columnar one without pyarrow
+    """
+    if not name:
+        return "parquet" if pyarrow is not None else "csv"
+    name = name.lower()
+    if name not in available_formats():
+        detail = f"Unsupported export format {name!r}. Available: {', '.join(available_formats())}"
+        if name in COLUMNAR_FORMATS:
+            detail += " (Arrow and Parquet require the pyarrow package)"
+        raise HTTPException(status_code=422, detail=detail)
+    return name
+
+
+def epoch_seconds(value: Optional[datetime]) -> Optional[float]:
+    """Epoch seconds of a query-parameter datetime; naive values are taken as UTC."""
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+@functools.lru_cache(maxsize=4096)
+def _domain_list(domains: str) -> Tuple[str, ...]:
+    # Every agent of a swarm repeats its domains, so the split is cached
+    return tuple(domains.split(",")) if domains else ()
+
+
+@functools.lru_cache(maxsize=4096)
+def _domains_json(domains: str) -> str:
+    return json.dumps(_domain_list(domains))
+
+
+def export_chunks(store: HistoryStore, export_format: str, batch_size: int = 10000, **filters) -> Iterator[bytes]:
+    """
+    Stream the agents matching `filters` (see `HistoryStore.iter_export_rows`)
+    as byte chunks of `export_format`, one per batch of `batch_size` rows
+    plus header/footer chunks where the format has them. Only one batch is
+    held in memory at a time.
+    """
+    writers = {"parquet": _parquet_chunks, "arrow": _arrow_chunks, "csv": _csv_chunks, "ndjson": _ndjson_chunks}
+    batches = store.iter_export_rows(batch_size=batch_size, json_objects=export_format == "ndjson", **filters)
+    started_at = time.monotonic()
+
+    def counted() -> Iterator[List[Tuple]]:
+        for rows in batches:
+            metrics.inc("export_rows_total", len(rows), format=export_format)
+            yield rows
+
+    try:
+        for chunk in writers[export_format](counted()):
+            if chunk:
+                yield chunk
+    finally:
+        # Release the read transaction even when the client goes away mid-export
+        batches.close()
+        metrics.observe("export_seconds", time.monotonic() - started_at, format=export_format)
+
+
+def _csv_chunks(batches: Iterable[List[Tuple]]) -> Iterator[bytes]:
+    """CSV with a header row; list columns are JSON arrays."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(EXPORT_COLUMNS)
+    for rows in batches:
+        writer.writerows(row[:_DOMAINS] + (_domains_json(row[_DOMAINS]),) + row[_DOMAINS + 1:] for row in rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+def _ndjson_chunks(batches: Iterable[List[Tuple]]) -> Iterator[bytes]:
+    """One JSON object per agent, from the halves SQLite rendered and the domains in between."""
+    for rows in batches:
+        yield "".join(
+            f'{head[:-1]},"domains":{_domains_json(domains)},{tail[1:]}\n' for head, domains, tail in rows
+        ).encode()
+
+
+class _ChunkSink:
+    """Write-only file object that collects what a pyarrow writer emits between batches."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def writable(self) -> bool:
+        return True
+
+    def readable(self) -> bool:
+        return False
+
+    def seekable(self) -> bool:
+        return False
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+@functools.lru_cache(maxsize=None)
+def _arrow_schema():
+    strings = pyarrow.list_(pyarrow.string())
+    types = {
+        "swarm_id": pyarrow.int64(),
+        "created_at": pyarrow.timestamp("us", tz="UTC"),
+        "domains": strings,
+        "position": pyarrow.int32(),
+        "key_data_inputs": strings,
+        "key_data_outputs_or_actions": strings,
+        "potential_dependencies_or_integrations": strings,
+    }
+    return pyarrow.schema(
+        [pyarrow.field(name, types.get(name, pyarrow.string()), nullable=(name == "potential_dependencies_or_integrations"))
+         for name in EXPORT_COLUMNS]
+    )
+
+
+def _record_batch(rows: List[Tuple]):
+    """Transpose one batch of row tuples into an Arrow record batch with typed list and timestamp columns."""
+    columns = list(zip(*rows))
+    columns[_CREATED_AT] = [int(value * 1_000_000) for value in columns[_CREATED_AT]]
+    columns[_DOMAINS] = [_domain_list(value) for value in columns[_DOMAINS]]
+    for index in _LIST_COLUMNS:
+        # One parse per column instead of one per cell
+        columns[index] = json.loads("[" + ",".join(value if value is not None else "null" for value in columns[index]) + "]")
+    schema = _arrow_schema()
+    return pyarrow.RecordBatch.from_arrays(
+        [pyarrow.array(column, type=field.type) for column, field in zip(columns, schema)],
+        schema=schema
+    )
+
+
+def _arrow_chunks(batches: Iterable[List[Tuple]]) -> Iterator[bytes]:
+    """Arrow IPC stream format, one record batch per row batch."""
+    sink = _ChunkSink()
+    with pyarrow.ipc.new_stream(pyarrow.PythonFile(sink, mode="w"), _arrow_schema()) as writer:
+        yield sink.drain()
+        for rows in batches:
+            writer.write_batch(_record_batch(rows))
+            yield sink.drain()
+    yield sink.drain()
+
+
+def _parquet_chunks(batches: Iterable[List[Tuple]]) -> Iterator[bytes]:
+    """Parquet (zstd), one row group per row batch; the footer is written at the end."""
+    sink = _ChunkSink()
+    with pyarrow.parquet.ParquetWriter(pyarrow.PythonFile(sink, mode="w"), _arrow_schema(), compression="zstd") as writer:
+        for rows in batches:
+            writer.write_batch(_record_batch(rows))
+            yield sink.drain()
+    yield sink.drain()
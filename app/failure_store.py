@@ -0,0 +1,158 @@
+"""Bounded on-disk store for Claude outputs that failed to parse."""
+
+import asyncio
+import gzip
+import json
+import logging
+import os
+import re
+import time
+import uuid
+from typing import List, Optional, Tuple
+from app.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+metrics.describe("failure_artifacts_written_total", "Failed model outputs saved to the artifact store")
+metrics.describe("failure_artifacts_dropped_total", "Failed model outputs not saved because the writer was backlogged")
+
+_ARTIFACT_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+
+class FailureArtifactStore:
+    """
+    Gzip-compressed failure artifacts with count and size based retention.
+
+    Each artifact is a `<id>.txt.gz` file holding the raw model output plus a
+    small `<id>.meta.json` sidecar (request id, prompt version, upstream usage,
+    error). Writes run in the default executor so the event loop never blocks
+    on disk I/O; when too many writes are pending new artifacts are dropped.
+    """
+
+    def __init__(self, directory: str, max_count: int, max_bytes: int, max_pending: int = 16):
+        self.directory = directory
+        self.max_count = max_count
+        self.max_bytes = max_bytes
+        self.max_pending = max_pending
+        self._pending: set = set()
+
+    def submit(
+        self,
+        content: str,
+        request_id: Optional[str] = None,
+        prompt_version: Optional[str] = None,
+        usage: Optional[dict] = None,
+        error: Optional[str] = None
+    ) -> Optional[str]:
+        """
+        Schedule an artifact write without blocking.
+
+        Returns:
+            The artifact id, or None if the write was dropped
+        """
+        if len(self._pending) >= self.max_pending:
+            metrics.inc("failure_artifacts_dropped_total")
+            logger.warning("Failure artifact writer backlogged, dropping output of request %s", request_id)
+            return None
+
+        artifact_id = uuid.uuid4().hex
+        meta = {
+            "id": artifact_id,
+            "created_at": time.time(),
+            "request_id": request_id,
+            "prompt_version": prompt_version,
+            "usage": usage,
+            "error": error,
+            "content_chars": len(content),
+        }
+        future = asyncio.get_running_loop().run_in_executor(None, self._write, artifact_id, content, meta)
+        self._pending.add(future)
+        future.add_done_callback(self._on_written)
+        return artifact_id
+
+    def _on_written(self, future: asyncio.Future) -> None:
+        self._pending.discard(future)
+        if future.exception() is not None:
+            logger.error("Failed to write failure artifact: %s", future.exception())
+        else:
+            metrics.inc("failure_artifacts_written_total")
+
+    async def drain(self) -> None:
+        """Wait for pending writes (used at shutdown)."""
+        if self._pending:
+            await asyncio.gather(*list(self._pending), return_exceptions=True)
+
+    def _path(self, artifact_id: str, suffix: str) -> str:
+        return os.path.join(self.directory, artifact_id + suffix)
+
+    def _write(self, artifact_id: str, content: str, meta: dict) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        with gzip.open(self._path(artifact_id, ".txt.gz"), "wt", encoding="utf-8", compresslevel=6) as f:
+            f.write(content)
+        meta["compressed_bytes"] = os.path.getsize(self._path(artifact_id, ".txt.gz"))
+        # Sidecar written last: an artifact is listed only once complete
+        with open(self._path(artifact_id, ".meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        logger.error("Saved problematic model output as failure artifact %s", artifact_id)
+        self._enforce_retention()
+
+    def _scan(self) -> List[Tuple[float, str, int]]:
+        """(mtime, id, bytes) of stored artifacts, oldest first."""
+        entries = []
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return entries
+        for name in names:
+            if not name.endswith(".meta.json"):
+                continue
+            artifact_id = name[:-len(".meta.json")]
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+                size = stat.st_size + os.path.getsize(self._path(artifact_id, ".txt.gz"))
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, artifact_id, size))
+        entries.sort()
+        return entries
+
+    def _enforce_retention(self) -> None:
+        entries = self._scan()
+        total = sum(size for _, _, size in entries)
+        while entries and (len(entries) > self.max_count or total > self.max_bytes):
+            _, artifact_id, size = entries.pop(0)
+            self._delete(artifact_id)
+            total -= size
+
+    def _delete(self, artifact_id: str) -> None:
+        for suffix in (".meta.json", ".txt.gz"):
+            try:
+                os.remove(self._path(artifact_id, suffix))
+            except FileNotFoundError:
+                pass
+
+    def list_recent(self, limit: int = 50) -> List[dict]:
+        """Metadata of the most recent artifacts, newest first."""
+        recent = []
+        for _, artifact_id, _ in reversed(self._scan()):
+            if len(recent) >= limit:
+                break
+            try:
+                with open(self._path(artifact_id, ".meta.json"), "r", encoding="utf-8") as f:
+                    recent.append(json.load(f))
+            except (FileNotFoundError, json.JSONDecodeError):
+                continue
+        return recent
+
+    def load(self, artifact_id: str) -> Optional[Tuple[dict, str]]:
+        """Metadata and raw content of one artifact, or None if unknown."""
+        if not _ARTIFACT_ID_RE.match(artifact_id):
+            return None
+        try:
+            with open(self._path(artifact_id, ".meta.json"), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            with gzip.open(self._path(artifact_id, ".txt.gz"), "rt", encoding="utf-8") as f:
+                content = f.read()
+        except FileNotFoundError:
+            return None
+        return meta, content
@@ -0,0 +1,522 @@
+"""Persistent generation history with full-text search over generated agents."""
+
+import json
+import logging
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+from typing import Iterator, List, Optional, Tuple
+from app.metrics import metrics
+from app.models import AgentSpecificationResponse
+
+logger = logging.getLogger(__name__)
+
+metrics.describe("history_swarms_written_total", "Generated swarms persisted to the history store")
+metrics.describe("history_swarms_dropped_total", "Generated swarms not persisted because the writer queue was full")
+metrics.describe("history_batch_seconds", "Time to write one batch of swarms")
+
+# Searchable agent fields, by the name used in the `field` query parameter
+SEARCH_FIELDS = {
+    "name": "agent_name",
+    "purpose": "agent_purpose_and_tasks",
+    "inputs": "key_data_inputs",
+    "outputs": "key_data_outputs_or_actions",
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS swarms (
+    id INTEGER PRIMARY KEY,
+    created_at REAL NOT NULL,
+    payload_hash TEXT NOT NULL,
+    prompt_version TEXT NOT NULL,
+    empire_name TEXT NOT NULL,
+    domains TEXT NOT NULL,
+    empire_json TEXT NOT NULL,
+    agent_count INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS swarms_created_at ON swarms(created_at);
+CREATE INDEX IF NOT EXISTS swarms_payload_hash ON swarms(payload_hash);
+CREATE INDEX IF NOT EXISTS swarms_prompt_version ON swarms(prompt_version);
+CREATE TABLE IF NOT EXISTS agents (
+    id INTEGER PRIMARY KEY,
+    swarm_id INTEGER NOT NULL REFERENCES swarms(id),
+    position INTEGER NOT NULL,
+    agent_id TEXT NOT NULL,
+    agent_name TEXT NOT NULL,
+    agent_purpose_and_tasks TEXT NOT NULL,
+    linked_empire_need_or_component TEXT NOT NULL,
+    suggested_technical_approach TEXT NOT NULL,
+    estimated_complexity_to_build TEXT NOT NULL,
+    key_data_inputs TEXT NOT NULL,
+    key_data_outputs_or_actions TEXT NOT NULL,
+    potential_dependencies_or_integrations TEXT
+);
+CREATE INDEX IF NOT EXISTS agents_swarm_id ON agents(swarm_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS agents_fts USING fts5(
+    agent_name,
+    agent_purpose_and_tasks,
+    key_data_inputs,
+    key_data_outputs_or_actions,
+    content='agents',
+    content_rowid='id'
+);
+"""
+
+_AGENT_COLUMNS = (
+    "agent_id, agent_name, agent_purpose_and_tasks, linked_empire_need_or_component, "
+    "suggested_technical_approach, estimated_complexity_to_build, key_data_inputs, "
+    "key_data_outputs_or_actions, potential_dependencies_or_integrations"
+)
+
+# Columns of `HistoryStore.iter_export_rows` tuples: swarm metadata, then the agent
+EXPORT_COLUMNS = (
+    "swarm_id", "created_at", "payload_hash", "prompt_version", "empire_name", "domains", "position",
+) + tuple(column.strip() for column in _AGENT_COLUMNS.split(","))
+
+# Agent columns stored as JSON arrays of strings
+LIST_COLUMNS = ("key_data_inputs", "key_data_outputs_or_actions", "potential_dependencies_or_integrations")
+
+_STOP = object()
+
+
+def fts_query(text: str, field: Optional[str] = None) -> Optional[str]:
+    """
+    Build a safe FTS5 MATCH expression from free text.
+
+    Every word becomes a quoted term (all must match); the last one also
+    matches as a prefix. Returns None if the text has no searchable words.
+    """
+    words = re.findall(r"\w+", text)
+    if not words:
+        return None
+    terms = [f'"{w}"' for w in words[:-1]] + [f'"{words[-1]}"*']
+    expression = " ".join(terms)
+    if field:
+        expression = f"{SEARCH_FIELDS[field]} : ({expression})"
+    return expression
+
+
+def _agent_from_row(row: sqlite3.Row) -> AgentSpecificationResponse:
+    return AgentSpecificationResponse(
+        agent_id=row["agent_id"],
+        agent_name=row["agent_name"],
+        agent_purpose_and_tasks=row["agent_purpose_and_tasks"],
+        linked_empire_need_or_component=row["linked_empire_need_or_component"],
+        suggested_technical_approach=row["suggested_technical_approach"],
+        estimated_complexity_to_build=row["estimated_complexity_to_build"],
+        key_data_inputs=json.loads(row["key_data_inputs"]),
+        key_data_outputs_or_actions=json.loads(row["key_data_outputs_or_actions"]),
+        potential_dependencies_or_integrations=(
+            json.loads(row["potential_dependencies_or_integrations"])
+            if row["potential_dependencies_or_integrations"] is not None else None
+        ),
+    )
+
+
+class HistoryStore:
+    """
+    SQLite (WAL + FTS5) store of every validated swarm.
+
+    `record` only enqueues; a single writer thread drains the queue and
+    commits swarms in batches, so persisting adds nothing to request latency.
+    Reads open their own connection and are meant to run off the event loop.
+    """
+
+    def __init__(self, path: str, batch_size: int = 50, flush_interval: float = 0.5, max_pending: int = 10000):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_pending)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def _connect(self, check_same_thread: bool = True) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30.0, check_same_thread=check_same_thread)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def start(self) -> None:
+        """Create the schema and start the writer thread (idempotent)."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = self._connect()
+            conn.executescript(_SCHEMA)
+            conn.close()
+            self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+            self._thread.start()
+
+    def close(self) -> None:
+        """Flush pending swarms and stop the writer thread."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join()
+
+    def record(
+        self,
+        agents: List[AgentSpecificationResponse],
+        payload_hash: str,
+        prompt_version: str,
+        empire_name: str,
+        domains: List[str],
+        empire_json: str
+    ) -> bool:
+        """
+        Queue one validated swarm for persistence without blocking.
+
+        Returns:
+            False if the writer is backlogged and the swarm was dropped
+        """
+        self.start()
+        record = (time.time(), payload_hash, prompt_version, empire_name, domains, empire_json, agents)
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            metrics.inc("history_swarms_dropped_total")
+            logger.warning("History writer backlogged, dropping swarm %s", payload_hash[:12])
+            return False
+        return True
+
+    def _run(self) -> None:
+        conn = self._connect()
+        try:
+            while True:
+                item = self._queue.get()
+                if item is _STOP:
+                    return
+                batch = [item]
+                deadline = time.monotonic() + self.flush_interval
+                stop = False
+                while len(batch) < self.batch_size:
+                    try:
+                        item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        stop = True
+                        break
+                    batch.append(item)
+                try:
+                    self._write_batch(conn, batch)
+                except sqlite3.Error as e:
+                    logger.error("Failed to write %d swarms to history: %s", len(batch), e)
+                if stop:
+                    return
+        finally:
+            conn.close()
+
+    def _write_batch(self, conn: sqlite3.Connection, batch: list) -> None:
+        started_at = time.monotonic()
+        with conn:
+            for created_at, payload_hash, prompt_version, empire_name, domains, empire_json, agents in batch:
+                cursor = conn.execute(
+                    "INSERT INTO swarms (created_at, payload_hash, prompt_version, empire_name, domains, "
+                    "empire_json, agent_count) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (created_at, payload_hash, prompt_version, empire_name,
+                     ",".join(domains), empire_json, len(agents))
+                )
+                swarm_id = cursor.lastrowid
+                for position, agent in enumerate(agents):
+                    inputs = json.dumps(agent.key_data_inputs)
+                    outputs = json.dumps(agent.key_data_outputs_or_actions)
+                    cursor = conn.execute(
+                        f"INSERT INTO agents (swarm_id, position, {_AGENT_COLUMNS}) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (swarm_id, position, agent.agent_id, agent.agent_name,
+                         agent.agent_purpose_and_tasks, agent.linked_empire_need_or_component,
+                         agent.suggested_technical_approach, agent.estimated_complexity_to_build,
+                         inputs, outputs,
+                         json.dumps(agent.potential_dependencies_or_integrations)
+                         if agent.potential_dependencies_or_integrations is not None else None)
+                    )
+                    conn.execute(
+                        "INSERT INTO agents_fts (rowid, agent_name, agent_purpose_and_tasks, "
+                        "key_data_inputs, key_data_outputs_or_actions) VALUES (?, ?, ?, ?, ?)",
+                        (cursor.lastrowid, agent.agent_name, agent.agent_purpose_and_tasks, inputs, outputs)
+                    )
+        metrics.inc("history_swarms_written_total", len(batch))
+        metrics.observe("history_batch_seconds", time.monotonic() - started_at)
+
+    def search_agents(
+        self,
+        query: Optional[str] = None,
+        field: Optional[str] = None,
+        limit: int = 50,
+        cursor: Optional[int] = None
+    ) -> dict:
+        """
+        Agents matching `query`, newest first, with keyset pagination.
+
+        Args:
+            query: Free text; all words must match (last word as prefix)
+            field: Restrict matching to one of SEARCH_FIELDS
+            limit: Page size
+            cursor: `next_cursor` from the previous page
+
+        Returns:
+            Dict with `items` and `next_cursor` (None on the last page)
+        """
+        self.start()
+        params: list = []
+        conditions = []
+        columns = "a.id, a.swarm_id, s.created_at, s.empire_name, s.prompt_version, " + ", ".join(
+            "a." + column.strip() for column in _AGENT_COLUMNS.split(",")
+        )
+        if query:
+            match = fts_query(query, field)
+            if match is None:
+                return {"items": [], "next_cursor": None}
+            # Drive the scan from the FTS index so rowid order and the cursor use it directly
+            sql = (
+                f"SELECT {columns} FROM agents_fts f "
+                "JOIN agents a ON a.id = f.rowid JOIN swarms s ON s.id = a.swarm_id"
+            )
+            conditions.append("agents_fts MATCH ?")
+            params.append(match)
+        else:
+            sql = f"SELECT {columns} FROM agents a JOIN swarms s ON s.id = a.swarm_id"
+        if cursor is not None:
+            conditions.append("a.id < ?")
+            params.append(cursor)
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY a.id DESC LIMIT ?"
+        params.append(limit + 1)
+
+        conn = self._connect()
+        try:
+            rows = conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+        items = [
+            {
+                "swarm_id": row["swarm_id"],
+                "created_at": row["created_at"],
+                "empire_name": row["empire_name"],
+                "prompt_version": row["prompt_version"],
+                "agent": _agent_from_row(row).model_dump(),
+            }
+            for row in rows[:limit]
+        ]
+        next_cursor = rows[limit - 1]["id"] if len(rows) > limit else None
+        return {"items": items, "next_cursor": next_cursor}
+
+    def list_swarms(self, limit: int = 50, cursor: Optional[int] = None, prompt_version: Optional[str] = None) -> dict:
+        """Swarm metadata, newest first, with keyset pagination."""
+        self.start()
+        sql = (
+            "SELECT id, created_at, payload_hash, prompt_version, empire_name, domains, agent_count "
+            "FROM swarms"
+        )
+        conditions, params = [], []
+        if cursor is not None:
+            conditions.append("id < ?")
+            params.append(cursor)
+        if prompt_version:
+            conditions.append("prompt_version = ?")
+            params.append(prompt_version)
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY id DESC LIMIT ?"
+        params.append(limit + 1)
+
+        conn = self._connect()
+        try:
+            rows = conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+        items = [
+            {**dict(row), "domains": row["domains"].split(",") if row["domains"] else []}
+            for row in rows[:limit]
+        ]
+        next_cursor = rows[limit - 1]["id"] if len(rows) > limit else None
+        return {"items": items, "next_cursor": next_cursor}
+
+    def get_swarm(self, swarm_id: int) -> Optional[dict]:
+        """One swarm with its empire payload and agents, or None."""
+        self.start()
+        conn = self._connect()
+        try:
+            swarm = conn.execute("SELECT * FROM swarms WHERE id = ?", (swarm_id,)).fetchone()
+            if swarm is None:
+                return None
+            rows = conn.execute(
+                f"SELECT {_AGENT_COLUMNS} FROM agents WHERE swarm_id = ? ORDER BY position",
+                (swarm_id,)
+            ).fetchall()
+        finally:
+            conn.close()
+        result = dict(swarm)
+        result["domains"] = result["domains"].split(",") if result["domains"] else []
+        result["empire"] = json.loads(result.pop("empire_json"))
+        result["agents"] = [_agent_from_row(row).model_dump() for row in rows]
+        return result
+
+    def latest_agents(self, payload_hash: str) -> Optional[List[AgentSpecificationResponse]]:
+        """Agents of the most recent swarm generated for `payload_hash`, or None."""
+        self.start()
+        conn = self._connect()
+        try:
+            swarm = conn.execute(
+                "SELECT id FROM swarms WHERE payload_hash = ? ORDER BY id DESC LIMIT 1",
+                (payload_hash,)
+            ).fetchone()
+            if swarm is None:
+                return None
+            rows = conn.execute(
+                f"SELECT {_AGENT_COLUMNS} FROM agents WHERE swarm_id = ? ORDER BY position",
+                (swarm["id"],)
+            ).fetchall()
+        finally:
+            conn.close()
+        return [_agent_from_row(row) for row in rows]
+
+    def recent_swarms(self, limit: int, prompt_version: Optional[str] = None) -> List[dict]:
+        """
+        Latest swarm of each of the `limit` most recently generated payloads,
+        newest first: payload hash, prompt version, creation time, empire
+        payload and agents (used to warm in-memory caches at startup).
+        """
+        self.start()
+        sql = "SELECT MAX(id) AS id FROM swarms"
+        params: list = []
+        if prompt_version:
+            sql += " WHERE prompt_version = ?"
+            params.append(prompt_version)
+        sql = (
+            "SELECT id, created_at, payload_hash, prompt_version, empire_json FROM swarms "
+            f"WHERE id IN ({sql} GROUP BY payload_hash) ORDER BY id DESC LIMIT ?"
+        )
+        params.append(limit)
+
+        conn = self._connect()
+        try:
+            swarms = [dict(row) for row in conn.execute(sql, params)]
+            agents: dict = {swarm["id"]: [] for swarm in swarms}
+            for start in range(0, len(swarms), 500):
+                ids = [swarm["id"] for swarm in swarms[start:start + 500]]
+                rows = conn.execute(
+                    f"SELECT swarm_id, {_AGENT_COLUMNS} FROM agents "
+                    f"WHERE swarm_id IN ({','.join('?' * len(ids))}) ORDER BY swarm_id, position",
+                    ids
+                )
+                for row in rows:
+                    agents[row["swarm_id"]].append(_agent_from_row(row))
+        finally:
+            conn.close()
+        for swarm in swarms:
+            swarm["empire"] = json.loads(swarm.pop("empire_json"))
+            swarm["agents"] = agents[swarm["id"]]
+        return swarms
+
+    def recent_agent_texts(self, limit: int, prompt_version: Optional[str] = None) -> List[dict]:
+        """
+        Id, swarm, name and purpose of the `limit` most recent agents
+        (lightweight rows for bulk analysis such as de-duplication).
+        """
+        self.start()
+        sql = (
+            "SELECT a.swarm_id, a.agent_id, a.agent_name, a.agent_purpose_and_tasks "
+            "FROM agents a JOIN swarms s ON s.id = a.swarm_id"
+        )
+        params: list = []
+        if prompt_version:
+            sql += " WHERE s.prompt_version = ?"
+            params.append(prompt_version)
+        sql += " ORDER BY a.id DESC LIMIT ?"
+        params.append(limit)
+
+        conn = self._connect()
+        try:
+            return [dict(row) for row in conn.execute(sql, params)]
+        finally:
+            conn.close()
+
+    def iter_export_rows(
+        self,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        prompt_version: Optional[str] = None,
+        domain: Optional[str] = None,
+        batch_size: int = 10000,
+        json_objects: bool = False
+    ) -> Iterator[List[Tuple]]:
+        """
+        Every stored agent with its swarm's metadata, oldest swarm first, in
+        batches of at most `batch_size` plain tuples ordered as EXPORT_COLUMNS.
+
+        Rows are fetched from one cursor inside one read transaction, so
+        memory is bounded by the batch size and the export is a consistent
+        snapshot even while the writer commits. `domains` stays comma-joined
+        and the list fields stay JSON text. Consecutive batches may be pulled
+        from different threads.
+
+        With `json_objects`, SQLite renders each row instead as (JSON object
+        of the columns before `domains`, `domains`, JSON object of the
+        columns after it), which is far cheaper than encoding in Python.
+
+        Args:
+            since: Only swarms created at or after this epoch time
+            until: Only swarms created before this epoch time
+            prompt_version: Only swarms generated with this prompt version
+            domain: Only swarms whose empire lists this domain (case-insensitive)
+        """
+        self.start()
+        expressions = dict(zip(EXPORT_COLUMNS, ("s.id", "s.created_at", "s.payload_hash", "s.prompt_version",
+                                                "s.empire_name", "s.domains", "a.position")))
+        for column in EXPORT_COLUMNS[len(expressions):]:
+            expressions[column] = "a." + column
+        if json_objects:
+            for column in LIST_COLUMNS:
+                expressions[column] = f"json({expressions[column]})"
+            split = EXPORT_COLUMNS.index("domains")
+            head, tail = EXPORT_COLUMNS[:split], EXPORT_COLUMNS[split + 1:]
+            selected = ", ".join((
+                "json_object(" + ", ".join(f"'{column}', {expressions[column]}" for column in head) + ")",
+                "s.domains",
+                "json_object(" + ", ".join(f"'{column}', {expressions[column]}" for column in tail) + ")",
+            ))
+        else:
+            selected = ", ".join(expressions.values())
+        sql = f"SELECT {selected} FROM swarms s JOIN agents a ON a.swarm_id = s.id"
+        conditions, params = [], []
+        if since is not None:
+            conditions.append("s.created_at >= ?")
+            params.append(since)
+        if until is not None:
+            conditions.append("s.created_at < ?")
+            params.append(until)
+        if prompt_version:
+            conditions.append("s.prompt_version = ?")
+            params.append(prompt_version)
+        if domain:
+            conditions.append("instr(',' || lower(s.domains) || ',', ?) > 0")
+            params.append(f",{domain.strip().lower()},")
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        # (swarm_id, rowid) is the agents_swarm_id index order, so no sort is needed
+        sql += " ORDER BY s.id, a.id"
+
+        conn = self._connect(check_same_thread=False)
+        # Plain tuples: no per-row Row objects on the export path
+        conn.row_factory = None
+        try:
+            cursor = conn.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    return
+                yield rows
+        finally:
+            conn.close()
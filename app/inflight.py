@@ -0,0 +1,136 @@
+"""Shared in-flight generations and cancellation on client disconnect."""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict
+from fastapi import HTTPException, Request
+from app.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+metrics.describe("inflight_shared_total", "Requests that joined an identical in-flight generation")
+metrics.describe("generation_cancelled_total", "Upstream generations cancelled because every client disconnected")
+metrics.describe("generation_detached_total", "Generations left running after a client disconnected")
+
+
+class ClientDisconnected(HTTPException):
+    """Raised to a handler whose client went away before the result was ready."""
+
+    def __init__(self):
+        super().__init__(status_code=499, detail="Client closed request")
+
+
+class SharedGeneration:
+    """A running generation task and the requests waiting on it."""
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+        # Set when the result is wanted even with nobody waiting (e.g. to fill a cache)
+        self.keep_result = False
+
+
+def _consume_result(task: asyncio.Task) -> None:
+    # Detached tasks may finish with an error nobody awaits; retrieve it to keep asyncio quiet
+    if not task.cancelled():
+        task.exception()
+
+
+async def wait_for_disconnect(request: Request) -> None:
+    """Return once the ASGI server reports that the client disconnected."""
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+class InflightGenerations:
+    """
+    Registry of generations in progress, keyed by payload hash.
+
+    Identical concurrent requests share one upstream call. When a waiting
+    client disconnects, the call is cancelled unless another request still
+    waits on it or its result is wanted anyway, in which case it is detached
+    and allowed to finish.
+    """
+
+    def __init__(self):
+        self._by_key: Dict[str, SharedGeneration] = {}
+
+    def __len__(self) -> int:
+        return len(self._by_key)
+
+    def get(self, key: str):
+        """The in-flight generation for `key`, if any."""
+        shared = self._by_key.get(key)
+        return shared if shared is not None and not shared.task.done() else None
+
+    def start(self, key: str, factory: Callable[[], Awaitable[Any]]) -> SharedGeneration:
+        """Join the generation for `key`, starting it with `factory` if none is running."""
+        shared = self.get(key)
+        if shared is None:
+            task = asyncio.create_task(factory())
+            task.add_done_callback(_consume_result)
+            shared = SharedGeneration(task)
+            self._by_key[key] = shared
+            task.add_done_callback(lambda _t, k=key, s=shared: self._forget(k, s))
+        else:
+            metrics.inc("inflight_shared_total")
+        shared.waiters += 1
+        return shared
+
+    def cancel(self, key: str, shared: SharedGeneration, reason: str) -> bool:
+        """
+        Cancel `shared` unless a request waits on it, and stop offering it
+        to new requests for `key` right away.
+
+        Returns:
+            Whether the generation was cancelled
+        """
+        if shared.waiters > 0 or shared.task.done():
+            return False
+        metrics.inc("generation_cancelled_total", reason=reason)
+        shared.task.cancel()
+        self._forget(key, shared)
+        return True
+
+    def _forget(self, key: str, shared: SharedGeneration) -> None:
+        if self._by_key.get(key) is shared:
+            del self._by_key[key]
+
+    def leave(self, shared: SharedGeneration, finish_anyway: bool = False) -> None:
+        """Stop waiting on `shared`; cancel it if nobody else needs the result."""
+        shared.waiters -= 1
+        if shared.task.done():
+            return
+        if shared.waiters > 0 or shared.keep_result or finish_anyway:
+            metrics.inc("generation_detached_total")
+            logger.info("Client left, generation detached (%d other waiters)", shared.waiters)
+        else:
+            metrics.inc("generation_cancelled_total", reason="client_disconnect")
+            logger.info("Client left, cancelling upstream generation")
+            shared.task.cancel()
+
+    async def wait(self, shared: SharedGeneration, request: Request, finish_anyway: bool = False) -> Any:
+        """
+        Wait for the shared result while watching `request` for a disconnect.
+
+        Raises:
+            ClientDisconnected: If the client went away first
+        """
+        disconnected = asyncio.create_task(wait_for_disconnect(request))
+        try:
+            await asyncio.wait({shared.task, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+        except BaseException:
+            # Handler itself cancelled (e.g. server shutdown)
+            disconnected.cancel()
+            self.leave(shared, finish_anyway)
+            raise
+
+        if shared.task.done():
+            disconnected.cancel()
+            shared.waiters -= 1
+            return shared.task.result()
+
+        self.leave(shared, finish_anyway)
+        raise ClientDisconnected()
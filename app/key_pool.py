@@ -0,0 +1,243 @@
+"""Pool of Claude API keys with per-key rate-limit state, health and least-loaded dispatch."""
+
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+import httpx
+from app.circuit_breaker import CircuitOpenError
+from app.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+metrics.describe("upstream_key_requests_total", "Upstream requests per API key and response status")
+metrics.describe("upstream_key_quarantined_total", "Times an API key was quarantined, by reason")
+metrics.describe("upstream_key_headroom", "Remaining rate-limit headroom (0-1) per API key, after in-flight reservations")
+metrics.describe("upstream_keys_available", "API keys currently not quarantined")
+
+DEFAULT_BASE_URL = "https://api.anthropic.com"
+MESSAGES_PATH = "/v1/messages"
+
+# Rate-limit dimensions reported in `anthropic-ratelimit-<kind>-{limit,remaining,reset}` headers
+LIMIT_KINDS = ("requests", "tokens", "input-tokens", "output-tokens")
+
+
+class NoKeyAvailableError(CircuitOpenError):
+    """
+    Raised when every API key is quarantined. Handled like an open circuit
+    (stale fallback, 503 with Retry-After).
+    """
+
+    def __init__(self, retry_after: float):
+        super().__init__(retry_after)
+        self.detail = "All Claude API keys are rate limited or rejected. Please retry later."
+
+
+def _parse_reset(value: Optional[str]) -> Optional[float]:
+    """Epoch seconds from an RFC 3339 reset header."""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+def _parse_int(value: Optional[str]) -> Optional[int]:
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+@dataclass
+class RateLimit:
+    """Last reported limit, remaining amount and reset time of one rate-limit dimension."""
+    limit: int
+    remaining: int
+    reset_at: Optional[float] = None
+
+
+@dataclass(eq=False)
+class UpstreamKey:
+    """One API key (and the endpoint it is used against) with its rate-limit state and health."""
+    api_key: str
+    base_url: str = DEFAULT_BASE_URL
+    limits: Dict[str, RateLimit] = field(default_factory=dict)
+    in_flight: int = 0
+    reserved_tokens: int = 0
+    quarantined_until: float = 0.0
+    quarantine_reason: Optional[str] = None
+    last_status: Optional[int] = None
+    last_used: float = 0.0
+
+    @property
+    def name(self) -> str:
+        """Key label safe for logs and metrics."""
+        return f"...{self.api_key[-4:]}" if len(self.api_key) > 8 else "key"
+
+    @property
+    def url(self) -> str:
+        return self.base_url.rstrip("/") + MESSAGES_PATH
+
+    def is_available(self, now: float) -> bool:
+        return self.quarantined_until <= now
+
+    def headroom(self, now: float) -> float:
+        """
+        Smallest fraction of any rate limit still free once in-flight requests
+        are counted (1.0 while nothing is known or after a reset passed).
+        """
+        fractions = [1.0]
+        for kind, limit in self.limits.items():
+            if limit.limit <= 0 or (limit.reset_at is not None and limit.reset_at <= now):
+                continue
+            reserved = self.in_flight if kind == "requests" else self.reserved_tokens
+            fractions.append(max(0.0, limit.remaining - reserved) / limit.limit)
+        return min(fractions)
+
+    def status(self, now: float) -> dict:
+        return {
+            "key": self.name,
+            "base_url": self.base_url,
+            "available": self.is_available(now),
+            "quarantined_for": round(max(0.0, self.quarantined_until - now), 1),
+            "quarantine_reason": self.quarantine_reason if not self.is_available(now) else None,
+            "headroom": round(self.headroom(now), 3),
+            "in_flight": self.in_flight,
+            "last_status": self.last_status,
+            "limits": {
+                kind: {"limit": limit.limit, "remaining": limit.remaining, "reset_at": limit.reset_at}
+                for kind, limit in self.limits.items()
+            },
+        }
+
+
+def parse_key_specs(primary_key: Optional[str], extra: Optional[str]) -> List[Tuple[str, str]]:
+    """
+    (api key, base URL) pairs from the primary key plus a comma-separated list
+    whose entries are `key` or `key@base_url`. Duplicate pairs are dropped.
+    """
+    specs = []
+    for entry in [primary_key or ""] + (extra or "").split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        api_key, _, base_url = entry.partition("@")
+        spec = (api_key.strip(), base_url.strip() or DEFAULT_BASE_URL)
+        if spec not in specs:
+            specs.append(spec)
+    return specs
+
+
+class KeyPool:
+    """
+    API keys shared by all upstream calls.
+
+    Each request goes to the available key with the most rate-limit headroom
+    (ties: fewest in flight, then least recently used), reserving its token
+    estimate until the response arrives. Responses update the key's limits
+    from the `anthropic-ratelimit-*` headers; 401/403 quarantine a key for
+    `auth_quarantine` seconds and 429 until `retry-after` (or the reported
+    reset, else `rate_limit_quarantine` seconds).
+    """
+
+    def __init__(
+        self,
+        keys: Iterable[Tuple[str, str]],
+        auth_quarantine: float = 600.0,
+        rate_limit_quarantine: float = 30.0
+    ):
+        self.keys = [UpstreamKey(api_key, base_url) for api_key, base_url in keys]
+        self.auth_quarantine = auth_quarantine
+        self.rate_limit_quarantine = rate_limit_quarantine
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def has_available(self, exclude: Iterable[UpstreamKey] = ()) -> bool:
+        """Whether a key outside `exclude` is currently not quarantined."""
+        now = time.time()
+        excluded = set(id(key) for key in exclude)
+        return any(id(key) not in excluded and key.is_available(now) for key in self.keys)
+
+    def acquire(self, tokens: int = 0, exclude: Iterable[UpstreamKey] = ()) -> UpstreamKey:
+        """
+        Reserve the least-loaded available key for one request of about `tokens` tokens.
+
+        Raises:
+            NoKeyAvailableError: If every key (not in `exclude`) is quarantined
+        """
+        now = time.time()
+        excluded = set(id(key) for key in exclude)
+        candidates = [key for key in self.keys if id(key) not in excluded and key.is_available(now)]
+        if not candidates:
+            pending = [key.quarantined_until - now for key in self.keys if not key.is_available(now)]
+            raise NoKeyAvailableError(min(pending) if pending else 1.0)
+        key = max(candidates, key=lambda k: (k.headroom(now), -k.in_flight, -k.last_used))
+        key.in_flight += 1
+        key.reserved_tokens += tokens
+        key.last_used = time.monotonic()
+        self._update_gauges(now)
+        return key
+
+    def release(self, key: UpstreamKey, tokens: int = 0, response: Optional[httpx.Response] = None) -> None:
+        """
+        Return a key reserved by `acquire`, recording the upstream response
+        (if one arrived) into its rate-limit state and health.
+        """
+        key.in_flight = max(0, key.in_flight - 1)
+        key.reserved_tokens = max(0, key.reserved_tokens - tokens)
+        now = time.time()
+        if response is not None:
+            self._observe(key, response, now)
+        self._update_gauges(now)
+
+    def _observe(self, key: UpstreamKey, response: httpx.Response, now: float) -> None:
+        headers = response.headers
+        key.last_status = response.status_code
+        metrics.inc("upstream_key_requests_total", key=key.name, status=str(response.status_code))
+        for kind in LIMIT_KINDS:
+            limit = _parse_int(headers.get(f"anthropic-ratelimit-{kind}-limit"))
+            remaining = _parse_int(headers.get(f"anthropic-ratelimit-{kind}-remaining"))
+            if remaining is None:
+                continue
+            previous = key.limits.get(kind)
+            key.limits[kind] = RateLimit(
+                limit=limit if limit is not None else (previous.limit if previous else remaining),
+                remaining=remaining,
+                reset_at=_parse_reset(headers.get(f"anthropic-ratelimit-{kind}-reset"))
+            )
+
+        if response.status_code in (401, 403):
+            self._quarantine(key, now + self.auth_quarantine, "unauthorized")
+        elif response.status_code == 429:
+            retry_after = _parse_int(headers.get("retry-after"))
+            if retry_after is not None:
+                until = now + retry_after
+            else:
+                resets = [
+                    limit.reset_at for limit in key.limits.values()
+                    if limit.reset_at is not None and limit.reset_at > now and limit.remaining <= 0
+                ]
+                until = min(resets) if resets else now + self.rate_limit_quarantine
+            self._quarantine(key, until, "rate_limited")
+
+    def _quarantine(self, key: UpstreamKey, until: float, reason: str) -> None:
+        key.quarantined_until = max(key.quarantined_until, until)
+        key.quarantine_reason = reason
+        metrics.inc("upstream_key_quarantined_total", key=key.name, reason=reason)
+        logger.warning(
+            "API key %s quarantined for %.0fs (%s)",
+            key.name, key.quarantined_until - time.time(), reason
+        )
+
+    def _update_gauges(self, now: float) -> None:
+        metrics.set_gauge("upstream_keys_available", sum(key.is_available(now) for key in self.keys))
+        for key in self.keys:
+            metrics.set_gauge("upstream_key_headroom", key.headroom(now), key=key.name)
+
+    def status(self) -> List[dict]:
+        now = time.time()
+        return [key.status(now) for key in self.keys]
@@ -1,21 +1,100 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, Header, HTTPException, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-from pydantic import BaseModel
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, ValidationError
 import httpx
+import asyncio
+import hashlib
 import json
+import logging
+import math
 import re
 import os
-from typing import Dict, Any, List, Optional
-from .models import EmpireDescriptionRequest, AgentSpecificationResponse, ExtendedEmpireDescription
-from .claude_service import get_claude_suggestions
+import secrets
+import time
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+from .models import (
+    EmpireDescriptionRequest,
+    AgentSpecificationResponse,
+    ExtendedEmpireDescription,
+    DeltaRegenerationRequest,
+)
+from .claude_service import (
+    get_claude_suggestions,
+    stream_claude_suggestions,
+    close_upstream_client,
+    prewarm_upstream_connections,
+    key_pool,
+    post_processor,
+    process_output_text,
+    WARMUP_OUTPUT,
+    estimate_request_tokens,
+    expected_agent_count,
+    failure_store,
+    prompt_version,
+    token_budgeter,
+)
+from .circuit_breaker import CircuitOpenError
+from .result_cache import ResultCache, payload_hash
+from .admission import AdmissionController
+from .scheduler import ClassPolicy, FairShareQueue, PRIORITY_CLASSES
+from .metrics import metrics
+from .inflight import InflightGenerations
+from .speculation import Speculation, SpeculativeGenerations
+from .history import HistoryStore, SEARCH_FIELDS
+from .export import EXPORT_FORMATS, epoch_seconds, export_chunks, resolve_format
+from .similarity import MinHashLSHIndex, payload_text
+from .delta import DeltaPlan, plan_delta, render_delta_prompt, merge_agents
+from .serialization import agents_etag, agents_response, etag_matches, parse_fields
+from .compression import CompressionMiddleware
+from .normalization import NormalizationLimits, normalize_empire
+from .dedup import cluster_texts, deduplicate_agents, group_clusters
+from .warmup import Readiness, WarmupStep
+from .memory_profile import MemoryProfileMiddleware, memory_profiler
+from .postprocess import EventLoopLagMonitor
 from .config import settings
 
+logger = logging.getLogger(__name__)
+
+# Every validated swarm, persisted in the background for search and export
+history_store = HistoryStore(
+    path=settings.HISTORY_DB_PATH,
+    batch_size=settings.HISTORY_BATCH_SIZE,
+    flush_interval=settings.HISTORY_FLUSH_INTERVAL
+)
+
+# Samples how late the event loop runs timers (blocking work shows up as lag)
+loop_lag_monitor = EventLoopLagMonitor(interval=settings.EVENT_LOOP_LAG_INTERVAL)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.MEMORY_PROFILING:
+        memory_profiler.start()
+    if settings.HISTORY_ENABLED:
+        await asyncio.to_thread(history_store.start)
+    loop_lag_monitor.start()
+    # Warm up in the background; /ready reports 503 until it has finished
+    readiness.reset()
+    warmup_task = asyncio.create_task(readiness.run(warmup_steps()))
+    yield
+    readiness.stop()
+    warmup_task.cancel()
+    await asyncio.gather(warmup_task, return_exceptions=True)
+    await asyncio.to_thread(history_store.close)
+    await failure_store.drain()
+    await close_upstream_client()
+    post_processor.close()
+    await loop_lag_monitor.stop()
+
 app = FastAPI(
     title="Agent Swarm MCP Server",
     description="A FastAPI-based MCP (Model Context Protocol) server for agent swarm operations",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configure CORS middleware
@@ -29,6 +108,16 @@ app.add_middleware(
     allow_headers=["*"],  # Allows all headers
 )
 
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.COMPRESSION_MIN_SIZE,
+    gzip_level=settings.GZIP_LEVEL,
+    brotli_quality=settings.BROTLI_QUALITY
+)
+
+# Outermost, so per-endpoint figures include compression
+app.add_middleware(MemoryProfileMiddleware, profiler=memory_profiler)
+
 # Get the directory where this file is located
 current_dir = os.path.dirname(os.path.abspath(__file__))
 parent_dir = os.path.dirname(current_dir)
@@ -37,6 +126,13 @@ static_dir = os.path.join(parent_dir, "static")
 # Mount static files
 app.mount("/static", StaticFiles(directory=static_dir), name="static")
 
+# Admin access check for /admin and /history endpoints; they stay disabled until ADMIN_API_KEY is set
+async def require_admin(x_admin_key: Optional[str] = Header(None)):
+    if not settings.ADMIN_API_KEY:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled; set ADMIN_API_KEY to enable them")
+    if x_admin_key is None or not secrets.compare_digest(x_admin_key.encode(), settings.ADMIN_API_KEY.encode()):
+        raise HTTPException(status_code=401, detail="Invalid or missing X-Admin-Key header")
+
 # Pydantic models for request/response structures
 class HealthResponse(BaseModel):
     status: str
@@ -60,6 +156,18 @@ async def health_check():
         message="Agent Swarm MCP Server is running"
     )
 
+# Readiness probe for the load balancer: 503 until startup warmup has finished
+@app.get("/ready")
+async def readiness_check(response: Response):
+    if not readiness.ready:
+        response.status_code = 503
+    return readiness.as_dict()
+
+# Metrics endpoint (Prometheus text format)
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    return metrics.render()
+
 # Root endpoint
 @app.get("/")
 async def root():
@@ -67,6 +175,7 @@ async def root():
         "message": "Welcome to Agent Swarm MCP Server",
         "docs": "/docs",
         "health": "/health",
+        "metrics": "/metrics",
         "empire_builder": "/empire-builder"
     }
 
@@ -85,25 +194,451 @@ async def mcp_handler(request: MCPRequest):
         result={"message": "MCP endpoint ready for implementation"}
     )
 
-# Agent suggestion endpoint
-@app.post("/suggest-agents", response_model=List[AgentSpecificationResponse])
-async def suggest_agents_endpoint(empire_input: EmpireDescriptionRequest):
+# Bounded concurrency and wait queue in front of Claude generations,
+# scheduled by priority class and shared fairly between tenants; the global
+# limit grows with the number of API keys when SCALE_CONCURRENCY_WITH_KEYS is set
+admission = AdmissionController(
+    max_concurrent=settings.MAX_CONCURRENT_GENERATIONS * (
+        max(1, len(key_pool)) if settings.SCALE_CONCURRENCY_WITH_KEYS else 1
+    ),
+    max_queue=settings.MAX_QUEUED_GENERATIONS,
+    queue_timeout=settings.QUEUE_TIMEOUT,
+    queue=FairShareQueue({
+        "interactive": ClassPolicy(settings.INTERACTIVE_MAX_CONCURRENT, settings.INTERACTIVE_TOKENS_PER_MINUTE),
+        "batch": ClassPolicy(settings.BATCH_MAX_CONCURRENT, settings.BATCH_TOKENS_PER_MINUTE),
+        "background": ClassPolicy(settings.BACKGROUND_MAX_CONCURRENT, settings.BACKGROUND_TOKENS_PER_MINUTE),
+    })
+)
+
+def granted_priority(requested: str, priority_key: Optional[str]) -> str:
+    """
+    Priority class a client may run at. Classes above DEFAULT_PRIORITY are
+    granted only with a priority key matching PRIORITY_API_KEY; other
+    requests (and unknown classes) run at DEFAULT_PRIORITY.
+    """
+    priority = requested.strip().lower()
+    if priority not in PRIORITY_CLASSES:
+        return settings.DEFAULT_PRIORITY
+    if PRIORITY_CLASSES.index(priority) < PRIORITY_CLASSES.index(settings.DEFAULT_PRIORITY):
+        if not settings.PRIORITY_API_KEY or priority_key is None or not secrets.compare_digest(
+                priority_key.encode(), settings.PRIORITY_API_KEY.encode()):
+            return settings.DEFAULT_PRIORITY
+    return priority
+
+def request_priority(request: Request) -> str:
+    """Priority class from the `X-Priority` header, gated by `X-Priority-Key` (see granted_priority)."""
+    return granted_priority(request.headers.get("x-priority", ""), request.headers.get("x-priority-key"))
+
+def request_id_for(request: Request) -> str:
+    """Caller-supplied `X-Request-ID`, or a fresh one."""
+    return request.headers.get("x-request-id") or uuid.uuid4().hex
+
+def request_tenant(request: Request) -> str:
+    """Tenant for fair sharing: `X-Tenant-ID`, else a digest of `X-API-Key`, else the client address."""
+    tenant = request.headers.get("x-tenant-id")
+    if tenant:
+        return tenant
+    api_key = request.headers.get("x-api-key")
+    if api_key:
+        return "key:" + hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+    return request.client.host if request.client else "anonymous"
+
+# Generations in progress, shared between identical concurrent requests
+inflight = InflightGenerations()
+
+# Speculative generations from empire builder drafts, handed to the final submit
+speculations = SpeculativeGenerations(
+    inflight,
+    max_sessions=settings.SPECULATION_MAX_SESSIONS,
+    ttl=settings.SPECULATION_TTL,
+    restart_similarity=settings.SPECULATION_RESTART_SIMILARITY
+)
+
+# Past payloads, for reusing results of near-duplicate requests
+similarity_index = MinHashLSHIndex(capacity=settings.SIMILARITY_INDEX_CAPACITY)
+
+metrics.describe("similarity_lookup_seconds", "Time to look up a near-duplicate payload")
+metrics.describe("similarity_reuse_total", "Requests answered with the result of a near-duplicate payload")
+metrics.describe("exact_reuse_total", "Requests answered with the stored result of the identical payload")
+
+# Last good result per payload, served while the Claude circuit is open
+last_good_results = ResultCache(max_entries=settings.STALE_CACHE_MAX_ENTRIES)
+
+# Size limits applied to every empire description before prompt assembly
+normalization_limits = NormalizationLimits(
+    max_entries=settings.INPUT_MAX_ENTRIES_PER_FIELD,
+    max_entry_tokens=settings.INPUT_MAX_ENTRY_TOKENS,
+    field_token_budget=settings.INPUT_FIELD_TOKEN_BUDGET,
+    text_token_budget=settings.INPUT_TEXT_TOKEN_BUDGET
+)
+
+metrics.describe("input_tokens_saved_total", "Estimated upstream input tokens removed by input normalization")
+metrics.describe("input_entries_dropped_total", "Duplicate, empty or over-budget entries dropped by input normalization")
+metrics.describe("input_entries_truncated_total", "Entries truncated to their token budget by input normalization")
+
+def normalize_input(empire_data: BaseModel, response: Optional[Response] = None) -> BaseModel:
+    """
+    Canonicalize an empire description so that prompts are smaller and
+    equivalent payloads share cache keys. Sets `X-Input-Tokens-Saved`, and
+    `X-Input-Entries-Dropped` when list entries were removed.
+    """
+    if not settings.NORMALIZE_INPUT:
+        return empire_data
+    with memory_profiler.phase("normalize"):
+        normalized, report = normalize_empire(empire_data, normalization_limits)
+    tokens_saved = math.ceil(report.tokens_saved * token_budgeter.estimator.ratio)
+    metrics.inc("input_tokens_saved_total", tokens_saved)
+    metrics.inc("input_entries_dropped_total", report.entries_dropped)
+    metrics.inc("input_entries_truncated_total", report.entries_truncated)
+    if response is not None:
+        response.headers["X-Input-Tokens-Saved"] = str(tokens_saved)
+        if report.entries_dropped:
+            response.headers["X-Input-Entries-Dropped"] = str(report.entries_dropped)
+    if report.entries_dropped or report.entries_truncated:
+        logger.info(
+            "Input normalization: ~%d tokens saved, %d entries dropped, %d truncated",
+            tokens_saved, report.entries_dropped, report.entries_truncated
+        )
+    for dropped in report.dropped:
+        logger.info("Input normalization dropped %s entry %r (%s)", dropped.field, dropped.entry[:80], dropped.reason)
+    return normalized
+
+async def find_similar_result(empire_data: BaseModel, prompt_template_str: str):
+    """
+    Result of the most similar earlier payload under the same prompt version,
+    if it is at least SIMILARITY_THRESHOLD similar.
+    
+    Returns:
+        Tuple of (agents, payload hash, similarity), or None
+    """
+    started_at = time.perf_counter()
+    match = similarity_index.query(
+        payload_text(empire_data.model_dump()),
+        group=similarity_group(empire_data, prompt_template_str)
+    )
+    metrics.observe("similarity_lookup_seconds", time.perf_counter() - started_at)
+    if match is None or match[1] < settings.SIMILARITY_THRESHOLD:
+        return None
+    similar_key, similarity = match
+    agents = await stored_agents(similar_key)
+    if not agents:
+        return None
+    return agents, similar_key, similarity
+
+async def stored_agents(cache_key: str) -> Optional[List[AgentSpecificationResponse]]:
+    """Latest result for a payload hash from the in-memory cache, else the history store."""
+    cached = last_good_results.get(cache_key)
+    if cached is not None:
+        return cached[0]
+    if settings.HISTORY_ENABLED:
+        return await asyncio.to_thread(history_store.latest_agents, cache_key)
+    return None
+
+async def conditional_result(
+    empire_data: BaseModel,
+    prompt_template_str: str,
+    request: Request,
+    response: Response
+) -> Optional[List[AgentSpecificationResponse]]:
+    """
+    Stored result to answer a conditional request with, without a generation:
+    when it matches `If-None-Match` (agents_response then answers 304), or
+    for `Cache-Control: only-if-cached`. None means a generation should run.
+    
+    Raises:
+        HTTPException: 504 for `only-if-cached` when no result is stored
+    """
+    if_none_match = request.headers.get("if-none-match")
+    cache_control = request.headers.get("cache-control", "")
+    only_if_cached = "only-if-cached" in cache_control
+    if not (if_none_match or only_if_cached) or "no-cache" in cache_control:
+        return None
+    agents = await stored_agents(payload_hash(empire_data, prompt_template_str))
+    if not agents:
+        if only_if_cached:
+            raise HTTPException(status_code=504, detail="No stored result for this payload")
+        return None
+    if only_if_cached or etag_matches(if_none_match, agents_etag(agents)):
+        response.headers["X-Cache-Status"] = "revalidated"
+        return agents
+    return None
+
+def similarity_group(empire_data: BaseModel, prompt_template_str: str) -> str:
+    """Payloads are only compared with payloads of the same type and prompt version."""
+    return f"{type(empire_data).__name__}:{prompt_version(prompt_template_str)}"
+
+def remember_result(
+    empire_data: BaseModel,
+    prompt_template_str: str,
+    cache_key: str,
+    agent_specs: List[AgentSpecificationResponse]
+) -> None:
+    """Index a complete swarm for similarity reuse and persist it to the history store."""
+    similarity_index.add(
+        payload_text(empire_data.model_dump()),
+        cache_key,
+        group=similarity_group(empire_data, prompt_template_str)
+    )
+    if settings.HISTORY_ENABLED:
+        empire_name, domains = empire_summary(empire_data)
+        history_store.record(
+            agent_specs,
+            payload_hash=cache_key,
+            prompt_version=prompt_version(prompt_template_str),
+            empire_name=empire_name,
+            domains=domains,
+            empire_json=empire_data.model_dump_json()
+        )
+
+async def suggest_with_stale_fallback(
+    empire_data: BaseModel,
+    prompt_template_str: str,
+    request: Request,
+    response: Response,
+    agent_count: Optional[int] = None,
+    reuse: bool = True,
+    remember: bool = True
+) -> List[AgentSpecificationResponse]:
+    """
+    Get agent suggestions, falling back to the last good result for the same
+    payload when the Claude circuit is open. Stale responses carry `Age`,
+    `Warning` and `X-Cache-Status: stale` headers.
+    
+    Identical concurrent requests share one generation, and the generation is
+    cancelled if every waiting client disconnects. A payload with a stored
+    result is answered from it (`X-Cache-Status: hit`), and payloads nearly
+    identical to an earlier one reuse its result (`X-Cache-Status: similar`),
+    unless the request sends `Cache-Control: no-cache`.
+    
+    A finished or running speculative generation of the same payload (see
+    `/suggest-agents-extended/draft`) is used as is (`X-Cache-Status: speculative`).
+    
+    `reuse=False` skips the similarity lookup and `remember=False` keeps the
+    result out of the similarity index and history (used for partial swarms).
+    """
+    cache_key = payload_hash(empire_data, prompt_template_str)
+    request_id = request_id_for(request)
+    response.headers["X-Request-ID"] = request_id
+    
+    speculation = speculations.claim(cache_key)
+    if speculation is not None:
+        response.headers["X-Cache-Status"] = "speculative"
+        if speculation.state == "ready":
+            agent_specs = speculation.shared.task.result()
+            if remember:
+                remember_result(empire_data, prompt_template_str, cache_key, agent_specs)
+            return agent_specs
+        # Still generating: inflight.start below joins it
+        reuse = False
+    
+    if (reuse and settings.SIMILARITY_REUSE_ENABLED
+            and "no-cache" not in request.headers.get("cache-control", "")):
+        stored = await stored_agents(cache_key)
+        if stored:
+            metrics.inc("exact_reuse_total")
+            response.headers["X-Cache-Status"] = "hit"
+            return stored
+        similar = await find_similar_result(empire_data, prompt_template_str)
+        if similar is not None:
+            agents, similar_key, similarity = similar
+            metrics.inc("similarity_reuse_total")
+            logger.info("Reusing result of similar payload %s (similarity %.2f)", similar_key[:12], similarity)
+            response.headers["X-Cache-Status"] = "similar"
+            response.headers["X-Similar-To"] = similar_key
+            response.headers["X-Similarity"] = f"{similarity:.3f}"
+            return agents
+    
+    async def generate() -> List[AgentSpecificationResponse]:
+        async with admission.admit(
+            priority=request_priority(request),
+            tenant=request_tenant(request),
+            tokens=estimate_request_tokens(empire_data, prompt_template_str, agent_count)
+        ):
+            agent_specs = await get_claude_suggestions(
+                empire_data=empire_data,
+                api_key=None,
+                prompt_template_str=prompt_template_str,
+                agent_count=agent_count,
+                request_id=request_id
+            )
+        # Cached and recorded here rather than by the caller so detached generations count too
+        last_good_results.put(cache_key, agent_specs)
+        if remember:
+            remember_result(empire_data, prompt_template_str, cache_key, agent_specs)
+        return agent_specs
+    
+    shared = inflight.start(cache_key, generate)
     try:
-        with open(settings.MASTER_PROMPT_PATH, 'r') as f:
-            prompt_template_str = f.read()
+        agent_specs = await inflight.wait(
+            shared,
+            request,
+            finish_anyway=settings.FINISH_GENERATION_ON_DISCONNECT
+        )
+    except CircuitOpenError:
+        cached = last_good_results.get(cache_key)
+        if cached is None:
+            raise
+        agent_specs, age = cached
+        logger.warning("Circuit open, serving stale result (%ds old)", int(age))
+        response.headers["Age"] = str(int(age))
+        response.headers["Warning"] = '110 - "Response is Stale"'
+        response.headers["X-Cache-Status"] = "stale"
+    
+    return agent_specs
+
+# Prompt templates by path, with the file modification time they were read at
+_prompt_templates: Dict[str, Tuple[int, str]] = {}
+
+def read_prompt_template(path: str, name: str = "Master") -> str:
+    """Read a prompt template (cached until the file changes), mapping a missing file to HTTP 500."""
+    try:
+        modified = os.stat(path).st_mtime_ns
+        cached = _prompt_templates.get(path)
+        if cached is not None and cached[0] == modified:
+            return cached[1]
+        with open(path, 'r') as f:
+            template = f.read()
     except FileNotFoundError:
-        raise HTTPException(status_code=500, detail="Master prompt file not found.")
+        raise HTTPException(status_code=500, detail=f"{name} prompt file not found.")
+    _prompt_templates[path] = (modified, template)
+    return template
+
+# Startup warmup: everything the first requests would otherwise pay for
+readiness = Readiness(timeout=settings.WARMUP_TIMEOUT)
+
+async def warm_prompts() -> dict:
+    master = read_prompt_template(settings.MASTER_PROMPT_PATH)
+    read_prompt_template(settings.DELTA_PROMPT_PATH, name="Delta")
+    return {"prompt_version": prompt_version(master)}
+
+async def warm_schemas() -> None:
+    # The OpenAPI schema, the output parser and normalization tables are built on first use
+    await asyncio.to_thread(app.openapi)
+    process_output_text(WARMUP_OUTPUT)
+    normalize_empire(
+        ExtendedEmpireDescription(**{
+            "empire_name_and_description": "Warmup",
+            **{name: ["warmup"] for name in ("ends", "means", "principles", "identity", "resentments", "emotions")}
+        }),
+        normalization_limits
+    )
+
+async def warm_upstream_connections() -> dict:
+    opened = await prewarm_upstream_connections(
+        settings.WARMUP_UPSTREAM_CONNECTIONS,
+        timeout=settings.WARMUP_TIMEOUT
+    )
+    return {"connections": opened}
+
+def stored_empire(data: dict) -> Optional[BaseModel]:
+    """An empire payload from the history store as the model it was generated from."""
+    for model in (ExtendedEmpireDescription, EmpireDescriptionRequest):
+        try:
+            return model.model_validate(data)
+        except ValidationError:
+            continue
+    return None
+
+async def warm_result_caches() -> dict:
+    """Load recent swarms of the current master prompt into the stale-result cache and similarity index."""
+    master = read_prompt_template(settings.MASTER_PROMPT_PATH)
+    swarms = await asyncio.to_thread(
+        history_store.recent_swarms,
+        settings.WARMUP_HISTORY_LIMIT,
+        prompt_version(master)
+    )
+    loaded = 0
+    # Oldest first, so that the newest swarms end up most recently used
+    for swarm in reversed(swarms):
+        empire = stored_empire(swarm["empire"])
+        if empire is None or not swarm["agents"]:
+            continue
+        last_good_results.put(swarm["payload_hash"], swarm["agents"], stored_at=swarm["created_at"])
+        similarity_index.add(
+            payload_text(empire.model_dump()),
+            swarm["payload_hash"],
+            group=similarity_group(empire, master)
+        )
+        loaded += 1
+    return {"payloads": loaded}
+
+async def warm_postprocess_workers() -> dict:
+    # Spawns the worker processes (and runs their initializer) before the first generation
+    return await post_processor.start()
+
+def warmup_steps() -> List[WarmupStep]:
+    if not settings.WARMUP_ENABLED:
+        return []
+    steps = [
+        WarmupStep("prompts", warm_prompts, required=True),
+        WarmupStep("schemas", warm_schemas),
+        WarmupStep("postprocess_workers", warm_postprocess_workers),
+    ]
+    if settings.WARMUP_UPSTREAM_CONNECTIONS > 0:
+        steps.append(WarmupStep("upstream_connections", warm_upstream_connections))
+    if settings.WARMUP_FROM_HISTORY and settings.HISTORY_ENABLED:
+        steps.append(WarmupStep("result_caches", warm_result_caches))
+    return steps
+
+# Agent suggestion endpoint
+@app.post("/suggest-agents", response_model=List[AgentSpecificationResponse])
+async def suggest_agents_endpoint(
+    empire_input: EmpireDescriptionRequest,
+    request: Request,
+    response: Response,
+    fields: Optional[str] = None
+):
+    selected_fields = parse_fields(fields)
+    prompt_template_str = read_prompt_template(settings.MASTER_PROMPT_PATH)
 
     # Convert Pydantic model to JSON string for injection
     # empire_data_json_str = empire_input.model_dump_json() # Pydantic v2+
     # For Pydantic v1, it might be empire_input.json()
 
-    agent_specs = await get_claude_suggestions(
-        empire_data=empire_input,
-        api_key=settings.CLAUDE_API_KEY,
-        prompt_template_str=prompt_template_str
-    )
-    return agent_specs
+    empire_data = normalize_input(empire_input, response)
+    agent_specs = await conditional_result(empire_data, prompt_template_str, request, response)
+    if agent_specs is None:
+        agent_specs = await suggest_with_stale_fallback(
+            empire_data=empire_data,
+            prompt_template_str=prompt_template_str,
+            request=request,
+            response=response
+        )
+    return agents_response(agent_specs, request, selected_fields, response) or agent_specs
+
+# Keywords used to detect an empire's primary focus domains
+DOMAIN_KEYWORDS = {
+    "governance": ["governance", "democratic", "political", "policy"],
+    "technology": ["AI", "tech", "digital", "software", "algorithm"],
+    "strategy": ["strategic", "foresight", "planning", "warfare"],
+    "narrative": ["narrative", "story", "discourse", "media"],
+    "cognitive": ["cognitive", "epistemic", "knowledge", "intelligence"],
+    "security": ["security", "defense", "protection", "risk"]
+}
+
+def detect_focus_domains(text: str) -> List[str]:
+    """Focus domains whose keywords appear in `text` ("general" if none do)."""
+    lowered = text.lower()
+    detected_domains = [
+        domain for domain, keywords in DOMAIN_KEYWORDS.items()
+        if any(keyword.lower() in lowered for keyword in keywords)
+    ]
+    return detected_domains or ["general"]
+
+def extract_empire_name(empire_text: str) -> str:
+    """Empire name from the first line or until the first period/newline."""
+    empire_name_match = re.match(r'^([^.\n]+)', empire_text.strip())
+    return empire_name_match.group(1).strip() if empire_name_match else "Unknown empire"
+
+def empire_summary(empire_data: BaseModel) -> tuple:
+    """(name, focus domains) of a standard or extended empire description."""
+    if isinstance(empire_data, EmpireDescriptionRequest):
+        return empire_data.empire_name, list(empire_data.primary_focus_domains)
+    full_text = (empire_data.empire_name_and_description + " " +
+                 " ".join(empire_data.ends) + " " +
+                 " ".join(empire_data.means) + " " +
+                 " ".join(empire_data.principles))
+    return extract_empire_name(empire_data.empire_name_and_description), detect_focus_domains(full_text)
 
 # Converter function from extended to standard format
 def convert_extended_to_standard(extended: ExtendedEmpireDescription) -> EmpireDescriptionRequest:
@@ -111,38 +646,13 @@ def convert_extended_to_standard(extended: ExtendedEmpireDescription) -> EmpireD
     Convert ExtendedEmpireDescription to EmpireDescriptionRequest.
     Maps the psychological/strategic dimensions to the standard format.
     """
-    # Extract empire name from the first line or until first period/newline
     empire_text = extended.empire_name_and_description.strip()
-    empire_name_match = re.match(r'^([^.\n]+)', empire_text)
-    empire_name = empire_name_match.group(1).strip() if empire_name_match else "Unknown empire"
-    
-    # Detect primary focus domains from content
-    # You could enhance this with more sophisticated keyword detection
-    domain_keywords = {
-        "governance": ["governance", "democratic", "political", "policy"],
-        "technology": ["AI", "tech", "digital", "software", "algorithm"],
-        "strategy": ["strategic", "foresight", "planning", "warfare"],
-        "narrative": ["narrative", "story", "discourse", "media"],
-        "cognitive": ["cognitive", "epistemic", "knowledge", "intelligence"],
-        "security": ["security", "defense", "protection", "risk"]
-    }
-    
-    detected_domains = set()
-    full_text = (empire_text + " " + 
-                 " ".join(extended.ends) + " " + 
-                 " ".join(extended.means) + " " + 
-                 " ".join(extended.principles))
-    
-    for domain, keywords in domain_keywords.items():
-        if any(keyword.lower() in full_text.lower() for keyword in keywords):
-            detected_domains.add(domain)
     
-    # If no domains detected, add a default
-    if not detected_domains:
-        detected_domains.add("general")
+    # Extract empire name and detect primary focus domains from content
+    empire_name, detected_domains = empire_summary(extended)
     
-    # Combine identity statements into operational style
-    operational_style = empire_text + "\n\nIdentity:\n" + "\n".join(extended.identity)
+    # Combine identity statements into operational style (repeated lines only once)
+    operational_style = empire_text + "\n\nIdentity:\n" + "\n".join(dict.fromkeys(extended.identity))
     
     # Keep resentments and emotions separate
     # For now, keep key_challenges empty or you could add other challenges if needed
@@ -150,7 +660,7 @@ def convert_extended_to_standard(extended: ExtendedEmpireDescription) -> EmpireD
     
     return EmpireDescriptionRequest(
         empire_name=empire_name,
-        primary_focus_domains=list(detected_domains),
+        primary_focus_domains=detected_domains,
         main_goals=extended.ends,
         available_resources=extended.means,
         core_principles=extended.principles,
@@ -162,11 +672,18 @@ def convert_extended_to_standard(extended: ExtendedEmpireDescription) -> EmpireD
 
 # Extended agent suggestion endpoint
 @app.post("/suggest-agents-extended", response_model=List[AgentSpecificationResponse])
-async def suggest_agents_extended_endpoint(extended_empire: ExtendedEmpireDescription):
+async def suggest_agents_extended_endpoint(
+    extended_empire: ExtendedEmpireDescription,
+    request: Request,
+    response: Response,
+    fields: Optional[str] = None
+):
     """
     Accept empire description in extended format with psychological/strategic dimensions.
     Directly passes to Claude without conversion for more focused agent generation.
     """
+    selected_fields = parse_fields(fields)
+    
     # Log the incoming request for debugging
     print("=" * 80)
     print("INCOMING REQUEST FROM UI:")
@@ -180,22 +697,712 @@ async def suggest_agents_extended_endpoint(extended_empire: ExtendedEmpireDescri
     print("=" * 80)
     
     # Load prompt template
-    try:
-        with open(settings.MASTER_PROMPT_PATH, 'r') as f:
-            prompt_template_str = f.read()
-    except FileNotFoundError:
-        raise HTTPException(status_code=500, detail="Master prompt file not found.")
+    prompt_template_str = read_prompt_template(settings.MASTER_PROMPT_PATH)
     
     # Pass extended empire directly to Claude (no conversion)
-    agent_specs = await get_claude_suggestions(
-        empire_data=extended_empire,
-        api_key=settings.CLAUDE_API_KEY,
-        prompt_template_str=prompt_template_str
-    )
+    empire_data = normalize_input(extended_empire, response)
+    agent_specs = await conditional_result(empire_data, prompt_template_str, request, response)
+    if agent_specs is None:
+        agent_specs = await suggest_with_stale_fallback(
+            empire_data=empire_data,
+            prompt_template_str=prompt_template_str,
+            request=request,
+            response=response
+        )
     
     print(f"Successfully generated {len(agent_specs)} agents")
+    return agents_response(agent_specs, request, selected_fields, response) or agent_specs
+
+async def speculative_generate(
+    speculation: Speculation,
+    empire_data: BaseModel,
+    prompt_template_str: str,
+    tenant: str
+) -> List[AgentSpecificationResponse]:
+    """
+    Generate a swarm for a draft at SPECULATION_PRIORITY. The result is
+    cached and indexed for near-duplicate reuse; it only goes into the
+    history once a submitted request has claimed it.
+    """
+    async with admission.admit(
+        priority=settings.SPECULATION_PRIORITY,
+        tenant=tenant,
+        tokens=estimate_request_tokens(empire_data, prompt_template_str)
+    ):
+        speculation.admitted = True
+        agent_specs = await get_claude_suggestions(
+            empire_data=empire_data,
+            api_key=None,
+            prompt_template_str=prompt_template_str,
+            request_id=f"draft-{speculation.key[:12]}"
+        )
+    last_good_results.put(speculation.key, agent_specs)
+    if speculation.claimed:
+        remember_result(empire_data, prompt_template_str, speculation.key, agent_specs)
+    else:
+        similarity_index.add(
+            payload_text(empire_data.model_dump()),
+            speculation.key,
+            group=similarity_group(empire_data, prompt_template_str)
+        )
     return agent_specs
 
+# Speculatively generate from a draft while the user is still editing
+@app.post("/suggest-agents-extended/draft", status_code=202)
+async def speculate_draft_endpoint(
+    extended_empire: ExtendedEmpireDescription,
+    request: Request,
+    x_draft_session: Optional[str] = Header(None)
+):
+    """
+    Start a low-priority generation for a draft of the extended form. A later
+    submit of the same (normalized) payload receives its result; a draft that
+    changed substantially cancels the previous speculation of its session.
+    """
+    if not settings.SPECULATION_ENABLED:
+        return {"status": "disabled"}
+    prompt_template_str = read_prompt_template(settings.MASTER_PROMPT_PATH)
+    empire_data = normalize_input(extended_empire)
+    tenant = request_tenant(request)
+    status, speculation = speculations.draft(
+        f"{tenant}:{x_draft_session or 'default'}",
+        payload_hash(empire_data, prompt_template_str),
+        payload_text(empire_data.model_dump()),
+        lambda spec: speculative_generate(spec, empire_data, prompt_template_str, tenant)
+    )
+    return {"status": status, "state": speculation.state, "draft_hash": speculation.key}
+
+def delta_prompt_for(plan: DeltaPlan, previous_agents: List[AgentSpecificationResponse]) -> str:
+    """Delta prompt asking for the `plan.regenerate_count` agents of an incremental plan."""
+    affected_set = set(plan.affected)
+    return render_delta_prompt(
+        read_prompt_template(settings.DELTA_PROMPT_PATH, name="Delta"),
+        plan.diff,
+        kept=[a for i, a in enumerate(previous_agents) if i not in affected_set],
+        replaced=[previous_agents[i] for i in plan.affected],
+        agent_count=plan.regenerate_count
+    )
+
+metrics.describe("delta_regenerations_total", "Delta requests by how they were served (incremental, full, unchanged)")
+metrics.describe("delta_agents_regenerated", "Agents regenerated per incremental delta request")
+
+# Regenerate only the agents affected by an edit of an extended empire description
+@app.post("/suggest-agents-extended/delta", response_model=List[AgentSpecificationResponse])
+async def suggest_agents_delta_endpoint(
+    delta: DeltaRegenerationRequest,
+    request: Request,
+    response: Response,
+    fields: Optional[str] = None,
+    x_admin_key: Optional[str] = Header(None)
+):
+    """
+    Diff the edited empire against the previous version and ask Claude only for
+    agents linked to removed or changed entries (plus one per added entry no replaced agent covers).
+    Kept agents are returned unchanged. Falls back to a full generation when
+    the edit is too broad to patch. Loading the previous version from the
+    history store by `previous_swarm_id` requires the admin key.
+    
+    Only merges onto a stored swarm are cached and recorded in the history;
+    merges onto `previous_agents` sent inline are returned without being kept,
+    so client-supplied agents are never served to other requests.
+    """
+    selected_fields = parse_fields(fields)
+    master_template = read_prompt_template(settings.MASTER_PROMPT_PATH)
+    previous_empire, previous_agents = delta.previous_empire, delta.previous_agents
+    # Agents sent inline are the client's word; only a stored swarm's may serve other requests
+    stored_baseline = False
+    if delta.previous_swarm_id is not None and (previous_empire is None or previous_agents is None):
+        await require_admin(x_admin_key)
+        swarm = await asyncio.to_thread(history_store.get_swarm, delta.previous_swarm_id)
+        if swarm is None:
+            raise HTTPException(status_code=404, detail="Swarm not found")
+        try:
+            previous_empire = previous_empire or ExtendedEmpireDescription.model_validate(swarm["empire"])
+        except ValueError:
+            raise HTTPException(
+                status_code=422,
+                detail="Swarm was not generated from an extended empire description"
+            )
+        if previous_agents is None:
+            previous_agents = [AgentSpecificationResponse(**agent) for agent in swarm["agents"]]
+            stored_baseline = True
+    
+    empire = normalize_input(delta.empire, response)
+    if previous_empire is not None and settings.NORMALIZE_INPUT:
+        # Same canonical form as `empire`, so formatting-only edits do not show up in the diff
+        previous_empire, _ = normalize_empire(previous_empire, normalization_limits)
+    plan = plan_delta(
+        previous_empire,
+        previous_agents,
+        empire,
+        link_threshold=settings.DELTA_LINK_THRESHOLD,
+        max_fraction=settings.DELTA_MAX_FRACTION,
+        min_description_similarity=settings.DELTA_MIN_DESCRIPTION_SIMILARITY
+    )
+    if plan.mode == "full":
+        metrics.inc("delta_regenerations_total", mode="full")
+        response.headers["X-Delta-Mode"] = "full"
+        agent_specs = await suggest_with_stale_fallback(
+            empire_data=empire,
+            prompt_template_str=master_template,
+            request=request,
+            response=response
+        )
+        return agents_response(agent_specs, request, selected_fields, response) or agent_specs
+    
+    if plan.mode == "unchanged":
+        metrics.inc("delta_regenerations_total", mode="unchanged")
+        response.headers["X-Delta-Mode"] = "unchanged"
+        return agents_response(previous_agents, request, selected_fields, response) or previous_agents
+    
+    affected = plan.affected
+    if plan.regenerate_count:
+        regenerated = await suggest_with_stale_fallback(
+            empire_data=empire,
+            prompt_template_str=delta_prompt_for(plan, previous_agents),
+            request=request,
+            response=response,
+            agent_count=plan.regenerate_count,
+            reuse=False,
+            remember=False
+        )
+        # Regenerated agents sometimes restate a kept one
+        agent_specs = deduplicate_agents(
+            merge_agents(previous_agents, affected, regenerated),
+            settings.DEDUP_SIMILARITY_THRESHOLD
+        )
+    else:
+        regenerated = []
+        agent_specs = list(previous_agents)
+    
+    if stored_baseline:
+        # Stored under the master prompt key so the merged swarm serves later full requests too
+        cache_key = payload_hash(empire, master_template)
+        last_good_results.put(cache_key, agent_specs)
+        remember_result(empire, master_template, cache_key, agent_specs)
+    
+    metrics.inc("delta_regenerations_total", mode="incremental")
+    metrics.observe("delta_agents_regenerated", len(regenerated))
+    response.headers["X-Delta-Mode"] = "incremental"
+    response.headers["X-Delta-Regenerated"] = str(len(regenerated))
+    response.headers["X-Delta-Kept"] = str(len(previous_agents) - len(affected))
+    logger.info("Delta regeneration: %d regenerated, %d kept", len(regenerated), len(previous_agents) - len(affected))
+    return agents_response(agent_specs, request, selected_fields, response) or agent_specs
+
+metrics.describe("ws_sessions_active", "Open swarm-building WebSocket sessions")
+metrics.describe("ws_messages_total", "Messages received on swarm-building WebSocket sessions, by type")
+
+WS_MESSAGE_TYPES = ("generate", "edit", "cancel")
+
+# Open swarm-building sessions by id
+swarm_sessions: Dict[str, "SwarmSession"] = {}
+
+class SwarmSession:
+    """
+    State of one `/ws/swarm` connection: the current empire and swarm, which
+    edits are diffed against, and the job (generation or edit) in progress.
+    """
+    
+    def __init__(self, websocket: WebSocket, priority: str, tenant: str):
+        self.id = uuid.uuid4().hex
+        self.websocket = websocket
+        self.priority = priority
+        self.tenant = tenant
+        self.empire: Optional[ExtendedEmpireDescription] = None
+        self.agents: Optional[List[AgentSpecificationResponse]] = None
+        self.task: Optional[asyncio.Task] = None
+        self._send_lock = asyncio.Lock()
+    
+    async def send(self, message: Dict[str, Any]) -> None:
+        """Send one message; dropped silently once the connection is closed."""
+        async with self._send_lock:
+            try:
+                await self.websocket.send_text(json.dumps(message))
+            except (WebSocketDisconnect, RuntimeError):
+                pass
+    
+    async def cancel(self) -> bool:
+        """Cancel the running job; True if there was one."""
+        task, self.task = self.task, None
+        if task is None or task.done():
+            return False
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return True
+    
+    def start(self, job, request_id: str) -> None:
+        self.task = asyncio.create_task(self._run(job, request_id))
+    
+    async def _run(self, job, request_id: str) -> None:
+        try:
+            await job
+        except HTTPException as e:
+            retry_after = (e.headers or {}).get("Retry-After")
+            await self.send({
+                "type": "error",
+                "request_id": request_id,
+                "status": e.status_code,
+                "detail": e.detail,
+                "retry_after": int(retry_after) if retry_after else None
+            })
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.exception("Swarm session %s job failed", self.id[:8])
+            await self.send({"type": "error", "request_id": request_id, "status": 500, "detail": str(e)})
+    
+    async def done(
+        self,
+        request_id: str,
+        mode: str,
+        agents: List[AgentSpecificationResponse],
+        send_agents: bool = True,
+        **extra
+    ) -> None:
+        """Adopt `agents` as the session's swarm and report it (without the agents when the client has them)."""
+        self.agents = list(agents)
+        message = {"type": "done", "request_id": request_id, "mode": mode, "etag": agents_etag(agents), **extra}
+        if send_agents:
+            message["agents"] = [agent.model_dump(mode="json") for agent in agents]
+        await self.send(message)
+
+async def stream_to_session(
+    session: SwarmSession,
+    empire_data: BaseModel,
+    prompt_template_str: str,
+    request_id: str,
+    agent_count: Optional[int] = None,
+    replaces: Optional[List[int]] = None
+) -> List[AgentSpecificationResponse]:
+    """
+    Run one streamed generation under admission control, forwarding agent,
+    progress and usage events to the session as they arrive.
+    
+    Args:
+        replaces: For partial regenerations, the index in the current swarm
+            that each new agent takes (agents past its end are additions)
+    
+    Returns:
+        The validated agents of the generation
+    """
+    await session.send({"type": "progress", "request_id": request_id, "stage": "queued"})
+    async with admission.admit(
+        priority=session.priority,
+        tenant=session.tenant,
+        tokens=estimate_request_tokens(empire_data, prompt_template_str, agent_count)
+    ):
+        await session.send({
+            "type": "progress",
+            "request_id": request_id,
+            "stage": "generating",
+            "received": 0,
+            "expected": expected_agent_count(empire_data, agent_count)
+        })
+        async for event in stream_claude_suggestions(
+            empire_data=empire_data,
+            api_key=None,
+            prompt_template_str=prompt_template_str,
+            agent_count=agent_count,
+            request_id=request_id
+        ):
+            if event["type"] == "complete":
+                return event["agents"]
+            message = dict(event, request_id=request_id)
+            if event["type"] == "agent":
+                message["agent"] = event["agent"].model_dump(mode="json")
+                if replaces is not None:
+                    index = event["index"]
+                    message["replaces"] = replaces[index] if index < len(replaces) else None
+            elif event["type"] == "progress":
+                message["stage"] = "generating"
+            await session.send(message)
+    raise HTTPException(status_code=502, detail="Claude API stream ended without a result")
+
+async def session_generate(
+    session: SwarmSession,
+    empire: ExtendedEmpireDescription,
+    request_id: str,
+    reuse: bool = True,
+    if_none_match: Optional[str] = None,
+    only_if_cached: bool = False
+) -> None:
+    """
+    Generate a full swarm for `empire`, reusing stored, similar or (circuit open) stale results.
+    
+    Like the HTTP conditional requests: a stored result matching
+    `if_none_match` is confirmed with `done.mode` "not_modified" (agents
+    omitted), and `only_if_cached` answers from stored results only.
+    """
+    prompt_template_str = read_prompt_template(settings.MASTER_PROMPT_PATH)
+    cache_key = payload_hash(empire, prompt_template_str)
+    
+    if if_none_match or only_if_cached:
+        stored = await stored_agents(cache_key)
+        if stored and etag_matches(if_none_match, agents_etag(stored)):
+            session.empire = empire
+            await session.done(request_id, "not_modified", stored, send_agents=False)
+            return
+        if only_if_cached:
+            if not stored:
+                raise HTTPException(status_code=504, detail="No stored result for this payload")
+            session.empire = empire
+            await session.done(request_id, "cached", stored)
+            return
+    
+    session.empire = empire
+    
+    speculation = speculations.claim(cache_key)
+    if speculation is not None:
+        ready = speculation.state == "ready"
+        if not ready:
+            await session.send({"type": "progress", "request_id": request_id, "stage": "speculative"})
+        # Shielded: cancelling this request must not cancel a generation others may claim
+        agent_specs = await asyncio.shield(speculation.shared.task)
+        if ready:
+            # A claimed generation that was still running records itself
+            remember_result(empire, prompt_template_str, cache_key, agent_specs)
+        await session.done(request_id, "speculative", agent_specs)
+        return
+    
+    if reuse and settings.SIMILARITY_REUSE_ENABLED:
+        stored = await stored_agents(cache_key)
+        if stored:
+            metrics.inc("exact_reuse_total")
+            await session.done(request_id, "cached", stored)
+            return
+        similar = await find_similar_result(empire, prompt_template_str)
+        if similar is not None:
+            agents, similar_key, similarity = similar
+            metrics.inc("similarity_reuse_total")
+            await session.done(request_id, "similar", agents, similar_to=similar_key, similarity=round(similarity, 3))
+            return
+    
+    try:
+        agent_specs = await stream_to_session(session, empire, prompt_template_str, request_id)
+    except CircuitOpenError:
+        cached = last_good_results.get(cache_key)
+        if cached is None:
+            raise
+        agent_specs, age = cached
+        logger.warning("Circuit open, serving stale result (%ds old) to swarm session %s", int(age), session.id[:8])
+        await session.done(request_id, "stale", agent_specs, age=int(age))
+        return
+    last_good_results.put(cache_key, agent_specs)
+    remember_result(empire, prompt_template_str, cache_key, agent_specs)
+    await session.done(request_id, "full", agent_specs)
+
+async def session_edit(session: SwarmSession, empire: ExtendedEmpireDescription, request_id: str) -> None:
+    """Apply an edited empire to the session's swarm, regenerating only affected agents."""
+    previous_empire, previous_agents = session.empire, session.agents
+    plan = plan_delta(
+        previous_empire,
+        previous_agents,
+        empire,
+        link_threshold=settings.DELTA_LINK_THRESHOLD,
+        max_fraction=settings.DELTA_MAX_FRACTION,
+        min_description_similarity=settings.DELTA_MIN_DESCRIPTION_SIMILARITY
+    )
+    metrics.inc("delta_regenerations_total", mode=plan.mode)
+    if plan.mode == "full":
+        await session_generate(session, empire, request_id)
+        return
+    if plan.mode == "unchanged":
+        await session.done(request_id, "unchanged", previous_agents)
+        return
+    
+    regenerated = []
+    agent_specs = list(previous_agents)
+    if plan.regenerate_count:
+        regenerated = await stream_to_session(
+            session,
+            empire,
+            delta_prompt_for(plan, previous_agents),
+            request_id,
+            agent_count=plan.regenerate_count,
+            replaces=plan.affected
+        )
+        agent_specs = deduplicate_agents(
+            merge_agents(previous_agents, plan.affected, regenerated),
+            settings.DEDUP_SIMILARITY_THRESHOLD
+        )
+    
+    master_template = read_prompt_template(settings.MASTER_PROMPT_PATH)
+    cache_key = payload_hash(empire, master_template)
+    last_good_results.put(cache_key, agent_specs)
+    remember_result(empire, master_template, cache_key, agent_specs)
+    metrics.observe("delta_agents_regenerated", len(regenerated))
+    session.empire = empire
+    await session.done(
+        request_id,
+        "incremental",
+        agent_specs,
+        regenerated=len(regenerated),
+        kept=len(previous_agents) - len(plan.affected)
+    )
+
+# Interactive swarm building: generate, edit and cancel over one connection
+@app.websocket("/ws/swarm")
+async def swarm_session_endpoint(websocket: WebSocket):
+    """
+    Client messages (JSON):
+        {"type": "generate", "empire": {...}, "request_id"?, "no_cache"?, "if_none_match"?, "only_if_cached"?}
+        {"type": "edit", "empire": {...}, "request_id"?}
+        {"type": "cancel"}
+    
+    Server messages: `session` once, then per job `progress`, `agent`,
+    `usage` and finally `done`, `cancelled` or `error`. A new generate or
+    edit cancels the job in progress, and so does closing the connection.
+    The priority class comes from the `priority` query parameter (default
+    `interactive`), gated by the `X-Priority-Key` header like HTTP requests.
+    """
+    await websocket.accept()
+    session = SwarmSession(
+        websocket,
+        priority=granted_priority(
+            websocket.query_params.get("priority", "interactive"),
+            websocket.headers.get("x-priority-key")
+        ),
+        tenant=request_tenant(websocket)
+    )
+    swarm_sessions[session.id] = session
+    metrics.set_gauge("ws_sessions_active", len(swarm_sessions))
+    await session.send({"type": "session", "session_id": session.id})
+    try:
+        while True:
+            try:
+                message = json.loads(await websocket.receive_text())
+            except json.JSONDecodeError:
+                metrics.inc("ws_messages_total", type="invalid")
+                await session.send({"type": "error", "status": 400, "detail": "Messages must be JSON objects"})
+                continue
+            message_type = message.get("type") if isinstance(message, dict) else None
+            # Unknown types share one label value; client-chosen ones would each create a series
+            metrics.inc("ws_messages_total", type=message_type if message_type in WS_MESSAGE_TYPES else "invalid")
+            
+            if message_type == "cancel":
+                if await session.cancel():
+                    await session.send({"type": "cancelled"})
+                continue
+            if message_type not in ("generate", "edit"):
+                await session.send({"type": "error", "status": 400, "detail": f"Unknown message type: {message_type}"})
+                continue
+            
+            request_id = str(message.get("request_id") or uuid.uuid4().hex)
+            try:
+                empire = ExtendedEmpireDescription.model_validate(message.get("empire"))
+            except ValidationError as e:
+                await session.send({
+                    "type": "error",
+                    "request_id": request_id,
+                    "status": 422,
+                    "detail": e.errors(include_url=False, include_context=False, include_input=False)
+                })
+                continue
+            if await session.cancel():
+                await session.send({"type": "cancelled"})
+            empire = normalize_input(empire)
+            if message_type == "edit" and session.agents:
+                session.start(session_edit(session, empire, request_id), request_id)
+            else:
+                session.start(
+                    session_generate(
+                        session,
+                        empire,
+                        request_id,
+                        reuse=not message.get("no_cache"),
+                        if_none_match=message.get("if_none_match"),
+                        only_if_cached=bool(message.get("only_if_cached"))
+                    ),
+                    request_id
+                )
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await session.cancel()
+        swarm_sessions.pop(session.id, None)
+        metrics.set_gauge("ws_sessions_active", len(swarm_sessions))
+
+# Collapse near-duplicate agents, e.g. after merging several swarms
+@app.post("/agents/deduplicate", response_model=List[AgentSpecificationResponse])
+async def deduplicate_agents_endpoint(
+    agents: List[AgentSpecificationResponse],
+    request: Request,
+    response: Response,
+    fields: Optional[str] = None
+):
+    selected_fields = parse_fields(fields)
+    if len(agents) > settings.DEDUP_MAX_AGENTS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {settings.DEDUP_MAX_AGENTS} agents can be de-duplicated per request"
+        )
+    unique_agents = await asyncio.to_thread(deduplicate_agents, agents, settings.DEDUP_SIMILARITY_THRESHOLD)
+    response.headers["X-Duplicates-Removed"] = str(len(agents) - len(unique_agents))
+    return agents_response(unique_agents, request, selected_fields, response) or unique_agents
+
+# Search generated agents across all stored swarms
+@app.get("/history/agents", dependencies=[Depends(require_admin)])
+async def search_history_agents(
+    q: Optional[str] = None,
+    field: Optional[str] = None,
+    limit: int = 50,
+    cursor: Optional[int] = None
+):
+    if field is not None and field not in SEARCH_FIELDS:
+        raise HTTPException(
+            status_code=422,
+            detail=f"field must be one of: {', '.join(SEARCH_FIELDS)}"
+        )
+    return await asyncio.to_thread(
+        history_store.search_agents, q, field, max(1, min(limit, 500)), cursor
+    )
+
+# Clusters of near-duplicate agents across stored swarms
+@app.get("/history/agents/clusters", dependencies=[Depends(require_admin)])
+async def history_agent_clusters(
+    limit: int = 10000,
+    prompt_version: Optional[str] = None,
+    min_size: int = 2,
+    max_clusters: int = 100
+):
+    """
+    Cluster the `limit` most recent stored agents by name/purpose similarity.
+    Each cluster lists its canonical representative first.
+    """
+    rows = await asyncio.to_thread(
+        history_store.recent_agent_texts, max(1, min(limit, settings.DEDUP_MAX_AGENTS)), prompt_version
+    )
+    representatives = await asyncio.to_thread(
+        cluster_texts,
+        [f"{row['agent_name']} {row['agent_purpose_and_tasks']}" for row in rows],
+        settings.DEDUP_SIMILARITY_THRESHOLD
+    )
+    clusters = group_clusters(representatives, max(2, min_size))
+    return {
+        "agents_scanned": len(rows),
+        "cluster_count": len(clusters),
+        "clusters": [
+            {
+                "size": len(members),
+                "representative": rows[members[0]],
+                "members": [
+                    {"swarm_id": rows[m]["swarm_id"], "agent_id": rows[m]["agent_id"], "agent_name": rows[m]["agent_name"]}
+                    for m in members
+                ],
+            }
+            for members in clusters[:max(1, max_clusters)]
+        ],
+    }
+
+# Stored swarms, newest first
+@app.get("/history/swarms", dependencies=[Depends(require_admin)])
+async def list_history_swarms(
+    limit: int = 50,
+    cursor: Optional[int] = None,
+    prompt_version: Optional[str] = None
+):
+    return await asyncio.to_thread(
+        history_store.list_swarms, max(1, min(limit, 500)), cursor, prompt_version
+    )
+
+# One stored swarm with its empire payload and agents
+@app.get("/history/swarms/{swarm_id}", dependencies=[Depends(require_admin)])
+async def get_history_swarm(swarm_id: int):
+    swarm = await asyncio.to_thread(history_store.get_swarm, swarm_id)
+    if swarm is None:
+        raise HTTPException(status_code=404, detail="Swarm not found")
+    return swarm
+
+# Bulk export of stored agents with their swarm metadata, streamed in batches
+@app.get("/history/export", dependencies=[Depends(require_admin)])
+async def export_history(
+    format: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    prompt_version: Optional[str] = None,
+    domain: Optional[str] = None
+):
+    """
+    Stream every stored agent matching the filters as Parquet or Arrow IPC
+    (with pyarrow installed), CSV or NDJSON. Rows are read and encoded
+    `HISTORY_EXPORT_BATCH_SIZE` at a time off the event loop.
+    """
+    export_format = resolve_format(format)
+    chunks = export_chunks(
+        history_store,
+        export_format,
+        max(1, settings.HISTORY_EXPORT_BATCH_SIZE),
+        since=epoch_seconds(since),
+        until=epoch_seconds(until),
+        prompt_version=prompt_version,
+        domain=domain
+    )
+    media_type, extension = EXPORT_FORMATS[export_format]
+    filename = f"agents-{time.strftime('%Y%m%dT%H%M%SZ', time.gmtime())}.{extension}"
+    logger.info("Exporting history as %s", export_format)
+    # A sync iterator: Starlette pulls each chunk on its thread pool
+    return StreamingResponse(
+        chunks,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"', "X-Export-Format": export_format}
+    )
+
+# Rate-limit headroom, load and quarantine state of every Claude API key
+@app.get("/admin/keys", dependencies=[Depends(require_admin)])
+async def list_keys():
+    return {"keys": key_pool.status()}
+
+# Recent failed model outputs
+@app.get("/admin/failures", dependencies=[Depends(require_admin)])
+async def list_failures(limit: int = 50):
+    return await asyncio.to_thread(failure_store.list_recent, max(1, min(limit, 500)))
+
+# One failed model output with its raw content
+@app.get("/admin/failures/{artifact_id}", dependencies=[Depends(require_admin)])
+async def get_failure(artifact_id: str):
+    artifact = await asyncio.to_thread(failure_store.load, artifact_id)
+    if artifact is None:
+        raise HTTPException(status_code=404, detail="Failure artifact not found")
+    meta, content = artifact
+    return {**meta, "content": content}
+
+# Re-run the current parser and validation against a stored failure
+@app.post("/admin/failures/{artifact_id}/replay", dependencies=[Depends(require_admin)])
+async def replay_failure(artifact_id: str):
+    artifact = await asyncio.to_thread(failure_store.load, artifact_id)
+    if artifact is None:
+        raise HTTPException(status_code=404, detail="Failure artifact not found")
+    meta, content = artifact
+    result = await post_processor.run(process_output_text, content)
+    if result.error is not None:
+        return {"artifact_id": artifact_id, "ok": False, "error": result.error}
+    return {
+        "artifact_id": artifact_id,
+        "ok": True,
+        "agent_count": len(result.agents),
+        "agents": [agent.model_dump() for agent in result.agents]
+    }
+
+# Allocation profile per phase and endpoint (tracemalloc), optionally with the top allocation sites
+@app.get("/admin/memory", dependencies=[Depends(require_admin)])
+async def memory_profile(top: int = 0):
+    return await asyncio.to_thread(memory_profiler.report, max(0, min(top, 100)))
+
+@app.post("/admin/memory/start", dependencies=[Depends(require_admin)])
+async def start_memory_profiling():
+    memory_profiler.start()
+    return memory_profiler.report()
+
+@app.post("/admin/memory/stop", dependencies=[Depends(require_admin)])
+async def stop_memory_profiling():
+    memory_profiler.stop()
+    return memory_profiler.report()
+
+@app.post("/admin/memory/reset", dependencies=[Depends(require_admin)])
+async def reset_memory_profile():
+    memory_profiler.reset()
+    return memory_profiler.report()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,155 @@
+"""Opt-in allocation profiling with tracemalloc, per phase and per endpoint."""
+
+import tracemalloc
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Dict, Optional
+from starlette.types import ASGIApp, Receive, Scope, Send
+from app.config import settings
+from app.metrics import metrics
+
+metrics.describe("memory_phase_peak_bytes", "Peak traced allocation per phase or endpoint while memory profiling is on")
+
+
+@dataclass
+class AllocationStats:
+    """Peak and retained traced bytes over every run of one phase."""
+    count: int = 0
+    peak_max: int = 0
+    peak_total: int = 0
+    retained_total: int = 0
+
+    def add(self, peak: int, retained: int) -> None:
+        self.count += 1
+        self.peak_max = max(self.peak_max, peak)
+        self.peak_total += peak
+        self.retained_total += retained
+
+    def as_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "peak_max_bytes": self.peak_max,
+            "peak_mean_bytes": self.peak_total // self.count if self.count else 0,
+            "retained_mean_bytes": self.retained_total // self.count if self.count else 0,
+        }
+
+
+class _Frame:
+    __slots__ = ("name", "base", "peak")
+
+    def __init__(self, name: str, base: int):
+        self.name = name
+        self.base = base
+        self.peak = 0
+
+
+_open_frames: ContextVar[tuple] = ContextVar("memory_profile_frames", default=())
+
+
+class MemoryProfiler:
+    """
+    Peak traced memory per named phase, measured with tracemalloc.
+
+    Phases are free no-ops unless tracing was started. They nest: an inner
+    phase resets the tracemalloc peak and folds its own peak into the
+    enclosing phase when it ends. The peak counter is process-wide, so
+    phases of concurrent requests overlap; profile under light load for
+    per-request figures.
+    """
+
+    def __init__(self, frames: int = 1):
+        self.frames = frames
+        self.stats: Dict[str, Dict[str, AllocationStats]] = {"phases": {}, "endpoints": {}}
+
+    @property
+    def active(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self) -> None:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+
+    def stop(self) -> None:
+        tracemalloc.stop()
+
+    def reset(self) -> None:
+        for group in self.stats.values():
+            group.clear()
+
+    @contextmanager
+    def phase(self, name: str, group: str = "phases"):
+        """
+        Measure the peak allocation (above the level at entry) of the block.
+        Yields the frame, whose `name` may be set later (e.g. once the route is known).
+        """
+        if not tracemalloc.is_tracing():
+            yield None
+            return
+        current, peak = tracemalloc.get_traced_memory()
+        parents = _open_frames.get()
+        if parents:
+            # The peak is about to be reset: keep what the enclosing phase has reached so far
+            parents[-1].peak = max(parents[-1].peak, peak)
+        tracemalloc.reset_peak()
+        frame = _Frame(name, current)
+        token = _open_frames.set(parents + (frame,))
+        try:
+            yield frame
+        finally:
+            _open_frames.reset(token)
+            if tracemalloc.is_tracing():
+                current, peak = tracemalloc.get_traced_memory()
+                peak = max(peak, frame.peak)
+                if parents:
+                    parents[-1].peak = max(parents[-1].peak, peak)
+                self._record(group, frame.name, max(0, peak - frame.base), current - frame.base)
+
+    def _record(self, group: str, name: str, peak: int, retained: int) -> None:
+        self.stats[group].setdefault(name, AllocationStats()).add(peak, retained)
+        metrics.observe("memory_phase_peak_bytes", peak, **{group[:-1]: name})
+
+    def report(self, top: int = 0) -> dict:
+        """Statistics per phase and endpoint, plus the `top` allocation sites now alive."""
+        tracing = tracemalloc.is_tracing()
+        current, peak = tracemalloc.get_traced_memory() if tracing else (0, 0)
+        result = {
+            "tracing": tracing,
+            "traced_bytes": current,
+            "peak_bytes": peak,
+            **{
+                group: {name: stats.as_dict() for name, stats in sorted(entries.items())}
+                for group, entries in self.stats.items()
+            },
+        }
+        if tracing and top > 0:
+            snapshot = tracemalloc.take_snapshot()
+            result["top_allocations"] = [
+                {"location": str(stat.traceback), "bytes": stat.size, "blocks": stat.count}
+                for stat in snapshot.statistics("lineno")[:top]
+            ]
+        return result
+
+
+# Shared profiler (tracing is off until started)
+memory_profiler = MemoryProfiler(frames=settings.MEMORY_PROFILING_FRAMES)
+
+
+class MemoryProfileMiddleware:
+    """Record each HTTP request as a phase named after its method and route while profiling is on."""
+
+    def __init__(self, app: ASGIApp, profiler: Optional[MemoryProfiler] = None):
+        self.app = app
+        self.profiler = profiler or memory_profiler
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self.profiler.active:
+            await self.app(scope, receive, send)
+            return
+        with self.profiler.phase(scope["path"], group="endpoints") as frame:
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                route = scope.get("route")
+                if frame is not None:
+                    frame.name = f"{scope['method']} {getattr(route, 'path', scope['path'])}"
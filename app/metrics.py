@@ -0,0 +1,95 @@
+"""In-process metrics registry rendered in Prometheus text format."""
+
+from typing import Dict, Tuple
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    """Label value escaped for the text exposition format."""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key: LabelKey) -> str:
+    if not key:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in key) + "}"
+
+
+class MetricsRegistry:
+    """
+    Minimal counter/gauge/summary registry.
+
+    Metrics are created on first use; summaries track count and sum, and
+    their largest observation is exported as a separate `<name>_max` gauge.
+    """
+
+    def __init__(self):
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._gauges: Dict[str, Dict[LabelKey, float]] = {}
+        self._summaries: Dict[str, Dict[LabelKey, list]] = {}
+        self._help: Dict[str, str] = {}
+
+    def describe(self, name: str, help_text: str) -> None:
+        """Attach a HELP line to a metric."""
+        self._help[name] = help_text
+
+    def inc(self, name: str, value: float = 1.0, **labels: str) -> None:
+        """Increment a counter."""
+        series = self._counters.setdefault(name, {})
+        key = _label_key(labels)
+        series[key] = series.get(key, 0.0) + value
+
+    def set_gauge(self, name: str, value: float, **labels: str) -> None:
+        """Set a gauge to an absolute value."""
+        self._gauges.setdefault(name, {})[_label_key(labels)] = value
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        """Record one observation in a summary."""
+        series = self._summaries.setdefault(name, {})
+        key = _label_key(labels)
+        entry = series.get(key)
+        if entry is None:
+            series[key] = [1, value, value]
+        else:
+            entry[0] += 1
+            entry[1] += value
+            entry[2] = max(entry[2], value)
+
+    def counter_value(self, name: str, **labels: str) -> float:
+        """Current value of a counter series (0 if never incremented)."""
+        return self._counters.get(name, {}).get(_label_key(labels), 0.0)
+
+    def render(self) -> str:
+        """Render all metrics in Prometheus text exposition format."""
+        lines = []
+        for kind, table in (("counter", self._counters), ("gauge", self._gauges)):
+            for name in sorted(table):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} {kind}")
+                for key, value in table[name].items():
+                    lines.append(f"{name}{_format_labels(key)} {value:g}")
+        for name in sorted(self._summaries):
+            series = self._summaries[name]
+            if name in self._help:
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} summary")
+            for key, (count, total, _maximum) in series.items():
+                labels = _format_labels(key)
+                lines.append(f"{name}_count{labels} {count}")
+                lines.append(f"{name}_sum{labels} {total:g}")
+            # A summary family may only hold _count/_sum/quantiles, so the max is its own gauge
+            lines.append(f"# HELP {name}_max Largest observation of {name}")
+            lines.append(f"# TYPE {name}_max gauge")
+            for key, (_count, _total, maximum) in series.items():
+                lines.append(f"{name}_max{_format_labels(key)} {maximum:g}")
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide registry
+metrics = MetricsRegistry()
@@ -129,3 +129,26 @@ class ExtendedEmpireDescription(BaseModel):
         min_items=1,
         description="Strategic emotional patterns"
     )
+
+
+class DeltaRegenerationRequest(BaseModel):
+    """
+    Edited empire description plus the swarm generated for its previous version.
+    The previous version is given inline or as the id of a stored swarm.
+    """
+    empire: ExtendedEmpireDescription = Field(
+        ...,
+        description="Edited empire description"
+    )
+    previous_empire: Optional[ExtendedEmpireDescription] = Field(
+        None,
+        description="Empire description the previous agents were generated for"
+    )
+    previous_agents: Optional[List[AgentSpecificationResponse]] = Field(
+        None,
+        description="Agents generated for the previous empire description"
+    )
+    previous_swarm_id: Optional[int] = Field(
+        None,
+        description="History swarm id to take the previous empire and agents from"
+    )
@@ -0,0 +1,159 @@
+"""Canonicalization and size limits for empire descriptions before prompt assembly."""
+
+import re
+import unicodedata
+from dataclasses import dataclass, field
+from typing import List, Tuple
+from pydantic import BaseModel
+from app.token_budget import TokenEstimator
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_ALNUM_RE = re.compile(r"\w")
+_EDGE_PUNCTUATION = " .,;:-–—*•"
+# ASCII, so that re-normalizing (NFKC) a truncated entry leaves it unchanged
+_ELLIPSIS = "..."
+
+
+@dataclass
+class NormalizationLimits:
+    """Per-field budgets; token counts use the uncalibrated TokenEstimator heuristic."""
+    max_entries: int = 20
+    max_entry_tokens: int = 120
+    field_token_budget: int = 600
+    text_token_budget: int = 800
+
+
+@dataclass
+class DroppedEntry:
+    """A list entry removed by normalization, with why: "empty", "duplicate" or "over_budget"."""
+    field: str
+    entry: str
+    reason: str
+
+
+@dataclass
+class NormalizationReport:
+    """What normalization removed from one payload."""
+    tokens_before: int = 0
+    tokens_after: int = 0
+    entries_truncated: int = 0
+    dropped: List[DroppedEntry] = field(default_factory=list)
+
+    @property
+    def entries_dropped(self) -> int:
+        return len(self.dropped)
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(0, self.tokens_before - self.tokens_after)
+
+
+def canonical_text(text: str) -> str:
+    """NFKC-normalized text with every whitespace run collapsed to one space."""
+    return _WHITESPACE_RE.sub(" ", unicodedata.normalize("NFKC", text)).strip()
+
+
+def canonical_block(text: str) -> str:
+    """Like canonical_text, but keeps line breaks (one per non-blank line)."""
+    lines = (canonical_text(line) for line in unicodedata.normalize("NFKC", text).splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def _dedup_key(text: str) -> str:
+    return text.casefold().strip(_EDGE_PUNCTUATION)
+
+
+def truncate_tokens(text: str, budget: int) -> str:
+    """
+    Cut `text` at the last whole word that fits in `budget` estimated tokens
+    and mark the cut with an ellipsis. Deterministic for a given text.
+    """
+    if TokenEstimator.raw_estimate(text) <= budget:
+        return text
+    kept = []
+    used = TokenEstimator.raw_estimate(_ELLIPSIS)
+    for word in text.split(" "):
+        cost = TokenEstimator.raw_estimate(word)
+        if used + cost > budget:
+            break
+        kept.append(word)
+        used += cost
+    return " ".join(kept).rstrip(_EDGE_PUNCTUATION) + _ELLIPSIS
+
+
+def normalize_entries(
+    entries: List[str],
+    limits: NormalizationLimits,
+    report: NormalizationReport,
+    field_name: str = ""
+) -> List[str]:
+    """
+    Canonical, de-duplicated list entries within the field's budgets.
+
+    Empty entries (only whitespace or punctuation) and case-insensitive
+    duplicates are dropped, long entries are truncated, and entries past
+    `max_entries` or the field token budget are dropped; the first entry
+    that overflows the budget is truncated to fit instead. Short entries
+    such as "AI" are kept. Every dropped entry is recorded in `report`.
+    """
+    result = []
+    seen = set()
+    remaining = limits.field_token_budget
+    for raw in entries:
+        entry = canonical_text(raw)
+        key = _dedup_key(entry)
+        if not _ALNUM_RE.search(entry):
+            report.dropped.append(DroppedEntry(field_name, raw, "empty"))
+            continue
+        if key in seen:
+            report.dropped.append(DroppedEntry(field_name, raw, "duplicate"))
+            continue
+        if len(result) >= limits.max_entries or remaining <= 1:
+            report.dropped.append(DroppedEntry(field_name, raw, "over_budget"))
+            continue
+        seen.add(key)
+        fitted = truncate_tokens(entry, min(limits.max_entry_tokens, remaining))
+        if fitted == _ELLIPSIS:
+            report.dropped.append(DroppedEntry(field_name, raw, "over_budget"))
+            continue
+        if fitted != entry:
+            report.entries_truncated += 1
+        remaining -= TokenEstimator.raw_estimate(fitted)
+        result.append(fitted)
+    return result
+
+
+def normalize_empire(
+    empire_data: BaseModel,
+    limits: NormalizationLimits
+) -> Tuple[BaseModel, NormalizationReport]:
+    """
+    Normalize every string and list-of-string field of an empire model.
+
+    Free-text fields are canonicalized (keeping line breaks) and truncated to `text_token_budget`;
+    list fields go through `normalize_entries`. A required list whose
+    entries are all dropped keeps its first canonical entry so the model
+    stays valid.
+
+    Returns:
+        (normalized copy, report with estimated tokens before and after)
+    """
+    report = NormalizationReport(tokens_before=TokenEstimator.raw_estimate(empire_data.model_dump_json()))
+    updates = {}
+    for name, value in empire_data:
+        if isinstance(value, str):
+            text = canonical_block(value)
+            fitted = truncate_tokens(text, limits.text_token_budget)
+            if fitted != text:
+                report.entries_truncated += 1
+            updates[name] = fitted
+        elif isinstance(value, list) and all(isinstance(item, str) for item in value):
+            entries = normalize_entries(value, limits, report, name)
+            if not entries and value and type(empire_data).model_fields[name].is_required():
+                entries = [truncate_tokens(canonical_text(value[0]), limits.max_entry_tokens)]
+                # value[0] was the field's first dropped entry; it is kept after all
+                del report.dropped[next(i for i, dropped in enumerate(report.dropped) if dropped.field == name)]
+            updates[name] = entries
+    normalized = empire_data.model_copy(update=updates)
+    report.tokens_after = TokenEstimator.raw_estimate(normalized.model_dump_json())
+    return normalized, report
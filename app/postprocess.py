@@ -0,0 +1,131 @@
+"""Execution backends for CPU-bound post-processing, and event-loop lag monitoring."""
+
+import asyncio
+import contextvars
+import functools
+import logging
+import multiprocessing
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Optional, TypeVar
+from app.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+metrics.describe("postprocess_seconds", "Wall time of post-processing model output (extraction, repair, validation), by backend")
+metrics.describe("event_loop_lag_seconds", "How late the event loop ran a timer that was due; high values mean blocking work on the loop")
+metrics.describe("event_loop_lag_last_seconds", "Most recent event-loop lag sample")
+
+BACKENDS = ("inline", "thread", "process")
+
+T = TypeVar("T")
+
+
+def _noop() -> None:
+    pass
+
+
+class PostProcessor:
+    """
+    Runs post-processing functions inline, on a thread pool or on a pool of
+    worker processes.
+
+    `inline` blocks the event loop for the duration of the call. `thread`
+    keeps the loop responsive between GIL switches and shares memory, so
+    tracemalloc phases still apply. `process` runs in parallel with the loop;
+    workers are spawned once and kept warm (the `initializer` runs in each),
+    and functions and arguments must be picklable. Pass bytes rather than
+    decoded structures to keep the copy into the worker to a single buffer.
+    """
+
+    def __init__(self, backend: str = "thread", workers: int = 2, initializer: Optional[Callable[[], None]] = None):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown post-processing backend {backend!r}; expected one of {', '.join(BACKENDS)}")
+        self.backend = backend
+        self.workers = max(1, workers)
+        self.initializer = initializer
+        self._executor: Optional[Executor] = None
+
+    def _create_executor(self) -> Optional[Executor]:
+        if self.backend == "thread":
+            return ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="postprocess")
+        if self.backend == "process":
+            # spawn: forking a process that runs an event loop and threads is unsafe
+            return ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=self.initializer
+            )
+        return None
+
+    async def start(self) -> dict:
+        """
+        Create the pool and, for processes, start every worker now so that
+        the first requests do not pay for interpreter startup and imports.
+        """
+        if self._executor is None:
+            self._executor = self._create_executor()
+        if self.backend == "process":
+            loop = asyncio.get_running_loop()
+            await asyncio.gather(*(loop.run_in_executor(self._executor, _noop) for _ in range(self.workers)))
+        return {"backend": self.backend, "workers": self.workers if self._executor is not None else 0}
+
+    async def run(self, fn: Callable[..., T], *args) -> T:
+        """Call `fn(*args)` on the configured backend and return its result."""
+        started_at = time.monotonic()
+        try:
+            if self.backend == "inline":
+                return fn(*args)
+            if self._executor is None:
+                self._executor = self._create_executor()
+            loop = asyncio.get_running_loop()
+            if self.backend == "thread":
+                # Carry context variables (e.g. open memory-profiling phases) into the thread
+                call = functools.partial(contextvars.copy_context().run, fn, *args)
+                return await loop.run_in_executor(self._executor, call)
+            try:
+                return await loop.run_in_executor(self._executor, fn, *args)
+            except BrokenProcessPool:
+                # A worker died (e.g. OOM-killed): replace the pool and retry once
+                logger.warning("Post-processing worker pool broken, restarting it")
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = self._create_executor()
+                return await loop.run_in_executor(self._executor, fn, *args)
+        finally:
+            metrics.observe("postprocess_seconds", time.monotonic() - started_at, backend=self.backend)
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+class EventLoopLagMonitor:
+    """
+    Samples event-loop lag: a timer is scheduled every `interval` seconds and
+    the delay past its due time is recorded. Lag near zero means nothing is
+    blocking the loop; lag of hundreds of milliseconds stalls every request.
+    """
+
+    def __init__(self, interval: float = 0.5):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            due = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.monotonic() - due)
+            metrics.observe("event_loop_lag_seconds", lag)
+            metrics.set_gauge("event_loop_lag_last_seconds", lag)
@@ -0,0 +1,63 @@
+"""In-memory store of the last good agent suggestions per request payload."""
+
+import hashlib
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+from pydantic import BaseModel
+from app.models import AgentSpecificationResponse
+
+
+def payload_hash(empire_data: BaseModel, prompt_template_str: str = "") -> str:
+    """
+    Stable key for an empire payload under a given prompt template.
+
+    Args:
+        empire_data: The empire description request data
+        prompt_template_str: Prompt template the result was generated with
+
+    Returns:
+        Hex SHA-256 digest
+    """
+    digest = hashlib.sha256()
+    digest.update(prompt_template_str.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(empire_data.model_dump_json().encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """Bounded LRU of validated agent lists, remembering when each was stored."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, List[AgentSpecificationResponse]]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def put(self, key: str, agents: List[AgentSpecificationResponse], stored_at: Optional[float] = None) -> None:
+        """
+        Store the latest good result for `key`, evicting the least recently used entry.
+        `stored_at` (epoch seconds) backdates results loaded from elsewhere.
+        """
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = (time.time() if stored_at is None else stored_at, agents)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, key: str) -> Optional[Tuple[List[AgentSpecificationResponse], float]]:
+        """
+        Look up the last good result for `key`.
+
+        Returns:
+            Tuple of (agents, age in seconds), or None if nothing is stored
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        self._entries.move_to_end(key)
+        stored_at, agents = entry
+        return agents, time.time() - stored_at
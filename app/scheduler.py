@@ -0,0 +1,162 @@
+"""Priority classes and per-tenant fair sharing for generation requests."""
+
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Dict, Optional
+from app.admission import Ticket
+from app.metrics import metrics
+
+# Highest priority first
+PRIORITY_CLASSES = ("interactive", "batch", "background")
+
+metrics.describe("scheduler_active", "Generations running per priority class")
+metrics.describe("scheduler_queue_depth", "Requests waiting per priority class")
+
+
+@dataclass
+class ClassPolicy:
+    """Limits for one priority class. A tokens_per_minute of 0 means unlimited."""
+    max_concurrent: int
+    tokens_per_minute: int = 0
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at `per_minute` tokens per minute."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = float(per_minute)
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_take(self, amount: int) -> bool:
+        """Take `amount` tokens if available. Oversized requests need a full bucket."""
+        self._refill()
+        needed = min(float(amount), self.capacity)
+        if self.level < needed:
+            return False
+        self.level -= amount
+        return True
+
+    def seconds_until(self, amount: int) -> float:
+        """Time until `amount` tokens (capped at capacity) are available."""
+        self._refill()
+        missing = min(float(amount), self.capacity) - self.level
+        return max(0.0, missing / self.rate) if self.rate > 0 else 0.0
+
+
+class FairShareQueue:
+    """
+    Wait queue for AdmissionController with strict priority between classes
+    and fair sharing between tenants inside a class.
+
+    A class may start a ticket only while it is under its own concurrency
+    limit and its token bucket covers the ticket's estimated tokens. Within a
+    class, the tenant with the fewest running generations goes next, ties
+    broken round-robin, so one tenant's backlog cannot starve the others.
+    """
+
+    def __init__(self, policies: Dict[str, ClassPolicy]):
+        self.policies = policies
+        self._queues: Dict[str, "OrderedDict[str, deque[Ticket]]"] = {
+            name: OrderedDict() for name in PRIORITY_CLASSES
+        }
+        self._buckets: Dict[str, TokenBucket] = {
+            name: TokenBucket(policy.tokens_per_minute)
+            for name, policy in policies.items() if policy.tokens_per_minute > 0
+        }
+        self._active: Dict[str, int] = {name: 0 for name in PRIORITY_CLASSES}
+        self._active_by_tenant: Dict[tuple, int] = {}
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _update_gauges(self, priority: str) -> None:
+        metrics.set_gauge("scheduler_active", self._active[priority], priority=priority)
+        metrics.set_gauge(
+            "scheduler_queue_depth",
+            sum(len(q) for q in self._queues[priority].values()),
+            priority=priority
+        )
+
+    def push(self, ticket: Ticket) -> None:
+        self._queues[ticket.priority].setdefault(ticket.tenant, deque()).append(ticket)
+        self._size += 1
+        self._update_gauges(ticket.priority)
+
+    def remove(self, ticket: Ticket) -> None:
+        tenants = self._queues[ticket.priority]
+        pending = tenants.get(ticket.tenant)
+        if pending is None or ticket not in pending:
+            return
+        pending.remove(ticket)
+        if not pending:
+            del tenants[ticket.tenant]
+        self._size -= 1
+        self._update_gauges(ticket.priority)
+
+    def _next_tenant(self, priority: str) -> str:
+        tenants = self._queues[priority]
+        return min(tenants, key=lambda t: self._active_by_tenant.get((priority, t), 0))
+
+    def pop_runnable(self) -> Optional[Ticket]:
+        for priority in PRIORITY_CLASSES:
+            tenants = self._queues[priority]
+            if not tenants or self._active[priority] >= self.policies[priority].max_concurrent:
+                continue
+            tenant = self._next_tenant(priority)
+            pending = tenants[tenant]
+            bucket = self._buckets.get(priority)
+            if bucket is not None and not bucket.try_take(pending[0].tokens):
+                continue
+            ticket = pending.popleft()
+            if pending:
+                tenants.move_to_end(tenant)
+            else:
+                del tenants[tenant]
+            self._size -= 1
+            self._update_gauges(priority)
+            return ticket
+        return None
+
+    def victim_for(self, ticket: Ticket) -> Optional[Ticket]:
+        rank = PRIORITY_CLASSES.index(ticket.priority)
+        for priority in reversed(PRIORITY_CLASSES[rank + 1:]):
+            tenants = self._queues[priority]
+            if tenants:
+                # Shed the newest request of the tenant with the longest backlog
+                tenant = max(tenants, key=lambda t: len(tenants[t]))
+                return tenants[tenant][-1]
+        return None
+
+    def retry_delay(self) -> Optional[float]:
+        delays = []
+        for priority, bucket in self._buckets.items():
+            tenants = self._queues[priority]
+            if tenants and self._active[priority] < self.policies[priority].max_concurrent:
+                head = tenants[self._next_tenant(priority)][0]
+                delays.append(bucket.seconds_until(head.tokens))
+        return max(0.05, min(delays)) if delays else None
+
+    def on_start(self, ticket: Ticket) -> None:
+        self._active[ticket.priority] += 1
+        key = (ticket.priority, ticket.tenant)
+        self._active_by_tenant[key] = self._active_by_tenant.get(key, 0) + 1
+        self._update_gauges(ticket.priority)
+
+    def on_finish(self, ticket: Ticket) -> None:
+        self._active[ticket.priority] -= 1
+        key = (ticket.priority, ticket.tenant)
+        remaining = self._active_by_tenant.get(key, 0) - 1
+        if remaining > 0:
+            self._active_by_tenant[key] = remaining
+        else:
+            self._active_by_tenant.pop(key, None)
+        self._update_gauges(ticket.priority)
@@ -0,0 +1,153 @@
+"""Field projection, compact output formats and ETags for agent list responses."""
+
+import hashlib
+from typing import List, Optional, Sequence
+from fastapi import HTTPException, Request, Response
+from pydantic import TypeAdapter
+from app.memory_profile import memory_profiler
+from app.models import AgentSpecificationResponse
+
+try:
+    import msgpack
+except ImportError:  # optional dependency
+    msgpack = None
+
+AGENT_FIELDS = tuple(AgentSpecificationResponse.model_fields)
+
+JSON = "application/json"
+NDJSON = "application/x-ndjson"
+MSGPACK = "application/msgpack"
+_MEDIA_TYPES = {
+    "application/json": JSON,
+    "application/*": JSON,
+    "*/*": JSON,
+    "application/x-ndjson": NDJSON,
+    "application/jsonl": NDJSON,
+    "application/msgpack": MSGPACK,
+    "application/x-msgpack": MSGPACK,
+    "application/vnd.msgpack": MSGPACK,
+}
+
+_agent_list = TypeAdapter(List[AgentSpecificationResponse])
+
+
+class NotModified(HTTPException):
+    """304 for a conditional request whose If-None-Match matches the result."""
+
+    def __init__(self, headers: dict):
+        super().__init__(status_code=304, headers=headers)
+
+
+def agents_etag(agents: Sequence[AgentSpecificationResponse]) -> str:
+    """
+    Weak ETag of an agent list. It depends only on the agents, so all formats
+    and projections of one result share it (hence weak).
+    """
+    return 'W/"' + hashlib.sha256(_agent_list.dump_json(list(agents))).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of `etag` against an If-None-Match header (`*` matches anything)."""
+    if not if_none_match:
+        return False
+    opaque = etag.removeprefix("W/")
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == opaque:
+            return True
+    return False
+
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """
+    Parse a comma-separated `fields=` projection.
+
+    Raises:
+        HTTPException: 422 if a field is not an AgentSpecificationResponse field
+    """
+    if not fields:
+        return None
+    selected = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in selected if name not in AGENT_FIELDS]
+    if unknown:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Unknown fields: {', '.join(unknown)}. Available: {', '.join(AGENT_FIELDS)}"
+        )
+    return selected or None
+
+
+def negotiate_format(accept: Optional[str]) -> str:
+    """
+    Pick JSON, NDJSON or MessagePack from an Accept header, honouring q-values.
+    Unsupported or missing preferences fall back to JSON; MessagePack is only
+    offered when the msgpack package is installed.
+    """
+    if not accept:
+        return JSON
+    preferences = []
+    for position, part in enumerate(accept.split(",")):
+        media_type, *params = [item.strip() for item in part.split(";")]
+        quality = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        preferences.append((-quality, position, media_type.lower()))
+    for negative_quality, _, media_type in sorted(preferences):
+        chosen = _MEDIA_TYPES.get(media_type)
+        if negative_quality >= 0 or chosen is None:
+            continue
+        if chosen == MSGPACK and msgpack is None:
+            continue
+        return chosen
+    return JSON
+
+
+def agents_response(
+    agents: Sequence[AgentSpecificationResponse],
+    request: Request,
+    fields: Optional[List[str]] = None,
+    response: Optional[Response] = None
+) -> Optional[Response]:
+    """
+    Serialize `agents` in the format the client asked for, tagged with an ETag.
+
+    Returns:
+        A Response carrying the headers already set on `response`, or None
+        when plain JSON of all fields was requested so that FastAPI's own
+        response_model serialization applies
+
+    Raises:
+        NotModified: If the request's If-None-Match matches the ETag
+    """
+    media_type = negotiate_format(request.headers.get("accept"))
+    etag = agents_etag(agents)
+    if response is not None:
+        response.headers.append("Vary", "Accept")
+        response.headers["ETag"] = etag
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        headers = dict(response.headers) if response is not None else {"ETag": etag}
+        headers.pop("content-length", None)
+        headers.pop("content-type", None)
+        raise NotModified(headers)
+    if media_type == JSON and fields is None:
+        return None
+
+    include = set(fields) if fields is not None else None
+    with memory_profiler.phase("serialize"):
+        if media_type == NDJSON:
+            content = b"".join(agent.model_dump_json(include=include).encode() + b"\n" for agent in agents)
+        elif media_type == MSGPACK:
+            content = msgpack.packb(_agent_list.dump_python(list(agents), mode="json", include={"__all__": include} if include else None))
+        else:
+            content = _agent_list.dump_json(list(agents), include={"__all__": include} if include else None)
+
+    rendered = Response(content=content, media_type=media_type)
+    if response is not None:
+        rendered.headers.raw.extend(
+            (name, value) for name, value in response.headers.raw if name not in (b"content-length", b"content-type")
+        )
+    return rendered
@@ -0,0 +1,160 @@
+"""MinHash/LSH similarity index over past empire payloads."""
+
+import re
+from hashlib import blake2b
+from typing import Iterable, List, Optional, Tuple
+import numpy as np
+
+_WORD_RE = re.compile(r"\w+")
+_EMPTY = np.uint32(0xFFFFFFFF)
+
+
+def payload_text(data) -> str:
+    """All string values of a (possibly nested) model dump, in field order."""
+    if isinstance(data, str):
+        return data
+    if isinstance(data, dict):
+        return " ".join(payload_text(value) for value in data.values())
+    if isinstance(data, (list, tuple)):
+        return " ".join(payload_text(value) for value in data)
+    return ""
+
+
+def shingle_hashes(text: str) -> np.ndarray:
+    """
+    64-bit BLAKE2b hashes of the word unigrams and bigrams of `text`.
+
+    The hashes do not depend on the process (unlike Python's string hash),
+    so signatures and similarity scores are the same across workers and restarts.
+    """
+    words = _WORD_RE.findall(text.lower())
+    shingles = set(words)
+    shingles.update(map(" ".join, zip(words, words[1:])))
+    shingles.discard("")
+    digests = b"".join(blake2b(shingle.encode(), digest_size=8).digest() for shingle in shingles)
+    return np.frombuffer(digests, dtype="<u8")
+
+
+def jaccard_similarity(text_a: str, text_b: str) -> float:
+    """Exact Jaccard similarity of the shingle sets of two texts (1.0 for two empty texts)."""
+    a, b = shingle_hashes(text_a), shingle_hashes(text_b)
+    union = len(np.union1d(a, b))
+    return len(np.intersect1d(a, b)) / union if union else 1.0
+
+
+class MinHashLSHIndex:
+    """
+    Fixed-capacity MinHash index with banded LSH buckets.
+
+    Signatures live in one preallocated uint32 matrix; when the index is full
+    the oldest entry is overwritten. Queries hash the query signature per band,
+    collect colliding entries and score them in a single vectorized comparison.
+    """
+
+    def __init__(self, capacity: int, num_perm: int = 128, bands: int = 16, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.capacity = capacity
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        rng = np.random.default_rng(seed)
+        self._band_mix = rng.integers(1, 1 << 63, size=self.rows, dtype=np.uint64) | np.uint64(1)
+        self._signatures = np.zeros((capacity, num_perm), dtype=np.uint32)
+        self._band_keys = np.zeros((capacity, bands), dtype=np.uint64)
+        self._keys: List[Optional[Tuple[str, str]]] = [None] * capacity
+        self._slot_by_key: dict = {}
+        self._buckets: List[dict] = [{} for _ in range(bands)]
+        self._next = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def signature(self, text: str) -> np.ndarray:
+        """
+        One-permutation MinHash signature of `text` (uint32 vector of length num_perm).
+
+        Each shingle hash is assigned to one of num_perm bins and the minimum
+        per bin is kept, which costs O(shingles) instead of O(shingles * num_perm).
+        Empty bins borrow from the next filled bin (rotation densification).
+        """
+        hashes = shingle_hashes(text)
+        signature = np.full(self.num_perm, _EMPTY, dtype=np.uint32)
+        if not len(hashes):
+            return signature
+        bins = (hashes % np.uint64(self.num_perm)).astype(np.intp)
+        np.minimum.at(signature, bins, (hashes >> np.uint64(32)).astype(np.uint32))
+
+        filled = np.flatnonzero(signature != _EMPTY)
+        if len(filled) < self.num_perm:
+            empty = np.flatnonzero(signature == _EMPTY)
+            source = filled[np.searchsorted(filled, empty) % len(filled)]
+            distance = ((source - empty) % self.num_perm).astype(np.uint32)
+            with np.errstate(over="ignore"):
+                signature[empty] = signature[source] + distance * np.uint32(0x9E3779B1)
+        return signature
+
+    def _band_hashes(self, signature: np.ndarray) -> np.ndarray:
+        bands = signature.reshape(self.bands, self.rows).astype(np.uint64)
+        with np.errstate(over="ignore"):
+            return (bands * self._band_mix).sum(axis=1, dtype=np.uint64)
+
+    def add(self, text: str, key: str, group: str = "") -> None:
+        """
+        Index `text` under `key`.
+
+        Args:
+            text: Text to index
+            key: Identifier returned by queries (e.g. a payload hash)
+            group: Only entries of the same group are returned by queries
+        """
+        if (key, group) in self._slot_by_key:
+            return
+        slot = self._next
+        if self._keys[slot] is not None:
+            self._evict(slot)
+        signature = self.signature(text)
+        band_keys = self._band_hashes(signature)
+        self._signatures[slot] = signature
+        self._band_keys[slot] = band_keys
+        self._keys[slot] = (key, group)
+        self._slot_by_key[(key, group)] = slot
+        for band, band_key in enumerate(band_keys.tolist()):
+            self._buckets[band].setdefault(band_key, set()).add(slot)
+        self._next = (slot + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+
+    def _evict(self, slot: int) -> None:
+        for band, band_key in enumerate(self._band_keys[slot].tolist()):
+            bucket = self._buckets[band].get(band_key)
+            if bucket is not None:
+                bucket.discard(slot)
+                if not bucket:
+                    del self._buckets[band][band_key]
+        self._slot_by_key.pop(self._keys[slot], None)
+        self._keys[slot] = None
+
+    def _candidates(self, band_keys: np.ndarray) -> Iterable[int]:
+        candidates = set()
+        for band, band_key in enumerate(band_keys.tolist()):
+            bucket = self._buckets[band].get(band_key)
+            if bucket:
+                candidates.update(bucket)
+        return candidates
+
+    def query(self, text: str, group: str = "") -> Optional[Tuple[str, float]]:
+        """
+        Most similar indexed entry of `group`.
+
+        Returns:
+            (key, estimated Jaccard similarity), or None if no LSH bucket collides
+        """
+        signature = self.signature(text)
+        slots = [s for s in self._candidates(self._band_hashes(signature)) if self._keys[s][1] == group]
+        if not slots:
+            return None
+        slots_array = np.fromiter(slots, dtype=np.intp, count=len(slots))
+        scores = (self._signatures[slots_array] == signature).mean(axis=1)
+        best = int(scores.argmax())
+        return self._keys[slots[best]][0], float(scores[best])
@@ -0,0 +1,170 @@
+"""Speculative generations started from draft payloads before the user submits."""
+
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from app.inflight import InflightGenerations, SharedGeneration
+from app.metrics import metrics
+from app.similarity import jaccard_similarity
+
+logger = logging.getLogger(__name__)
+
+metrics.describe("speculation_total", "Speculative generations by outcome (started, cancelled, claimed, expired)")
+metrics.describe("speculation_sessions", "Draft sessions with a speculative generation")
+
+
+@dataclass(eq=False)
+class Speculation:
+    """One speculative generation: the draft payload it was started for and its progress."""
+    session: str
+    key: str
+    text: str
+    started_at: float
+    shared: Optional[SharedGeneration] = None
+    admitted: bool = False
+    claimed: bool = False
+
+    @property
+    def state(self) -> str:
+        task = self.shared.task
+        if not task.done():
+            return "running" if self.admitted else "queued"
+        if task.cancelled() or task.exception() is not None:
+            return "failed"
+        return "ready"
+
+
+class SpeculativeGenerations:
+    """
+    At most one speculative generation per draft session, keyed by the
+    payload hash of the draft it was started for.
+
+    Generations run through `InflightGenerations`, so a submit whose payload
+    hash matches joins a running speculation like any identical request.
+    A new draft restarts the session's speculation only when its text is less
+    than `restart_similarity` similar to the speculated draft; smaller edits
+    keep it, and its result can still be reused as a near-duplicate. Results
+    are kept for `ttl` seconds after the start, or until a submit claims them.
+    """
+
+    def __init__(
+        self,
+        inflight: InflightGenerations,
+        max_sessions: int = 1000,
+        ttl: float = 900.0,
+        restart_similarity: float = 0.9
+    ):
+        self.inflight = inflight
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.restart_similarity = restart_similarity
+        self._sessions: "OrderedDict[str, Speculation]" = OrderedDict()
+        self._by_key: Dict[str, Speculation] = {}
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def draft(
+        self,
+        session: str,
+        key: str,
+        text: str,
+        factory: Callable[[Speculation], Awaitable[Any]]
+    ) -> Tuple[str, Speculation]:
+        """
+        Record a draft of `session` and speculate on it if needed.
+
+        `factory(speculation)` runs the generation; it should set
+        `speculation.admitted` once it holds a generation slot.
+
+        Returns:
+            (what happened: "started", "restarted", "unchanged" or "kept", the session's speculation)
+        """
+        self._evict(time.monotonic())
+        current = self._sessions.get(session)
+        outcome = "started"
+        if current is not None:
+            if current.key == key:
+                self._sessions.move_to_end(session)
+                return "unchanged", current
+            if current.state != "failed" and jaccard_similarity(current.text, text) >= self.restart_similarity:
+                self._sessions.move_to_end(session)
+                return "kept", current
+            self._drop(session, current)
+            outcome = "restarted"
+
+        speculation = Speculation(session=session, key=key, text=text, started_at=time.monotonic())
+        # Joining a generation someone else already started is as good as starting one
+        speculation.admitted = self.inflight.get(key) is not None
+        shared = self.inflight.start(key, lambda: factory(speculation))
+        # Nobody waits on a speculation, but its result is wanted
+        shared.waiters -= 1
+        shared.keep_result = True
+        speculation.shared = shared
+        self._sessions[session] = speculation
+        self._by_key[key] = speculation
+        metrics.inc("speculation_total", outcome="started")
+        metrics.set_gauge("speculation_sessions", len(self._sessions))
+        logger.info("Speculating on draft %s for session %s", key[:12], session)
+        return outcome, speculation
+
+    def claim(self, key: str) -> Optional[Speculation]:
+        """
+        Hand the speculation for payload hash `key` to a submitted request.
+
+        A speculation is handed over once: claiming removes it from its
+        session, so a later submit of the same draft goes through the usual
+        cache and similarity lookups instead of delivering (and recording)
+        the same result again. Whoever claims a ready speculation records
+        it; one claimed while running records itself when it finishes.
+
+        Returns:
+            The speculation if it finished successfully or already holds a
+            generation slot. One still queued for admission is cancelled and
+            None returned, so the request generates at its own priority.
+        """
+        speculation = self._by_key.get(key)
+        if speculation is None or time.monotonic() - speculation.started_at > self.ttl:
+            return None
+        state = speculation.state
+        if state == "failed":
+            return None
+        if state == "queued" and self.inflight.cancel(key, speculation.shared, reason="speculation_promoted"):
+            self._release(speculation)
+            return None
+        speculation.claimed = True
+        self._release(speculation)
+        metrics.inc("speculation_total", outcome="claimed")
+        return speculation
+
+    def _drop(self, session: str, speculation: Speculation) -> None:
+        """Remove a session's unclaimed speculation and cancel it."""
+        del self._sessions[session]
+        self._forget(speculation)
+        speculation.shared.keep_result = False
+        if self.inflight.cancel(speculation.key, speculation.shared, reason="draft_changed"):
+            metrics.inc("speculation_total", outcome="cancelled")
+
+    def _release(self, speculation: Speculation) -> None:
+        """Remove a speculation from its session without cancelling it."""
+        if self._sessions.get(speculation.session) is speculation:
+            del self._sessions[speculation.session]
+            metrics.set_gauge("speculation_sessions", len(self._sessions))
+        self._forget(speculation)
+
+    def _forget(self, speculation: Speculation) -> None:
+        if self._by_key.get(speculation.key) is speculation:
+            del self._by_key[speculation.key]
+
+    def _evict(self, now: float) -> None:
+        """Drop expired speculations and, over `max_sessions`, the least recently drafted ones."""
+        while self._sessions:
+            session, oldest = next(iter(self._sessions.items()))
+            expired = now - oldest.started_at > self.ttl
+            if not expired and len(self._sessions) < self.max_sessions:
+                break
+            self._drop(session, oldest)
+            metrics.inc("speculation_total", outcome="expired")
+        metrics.set_gauge("speculation_sessions", len(self._sessions))
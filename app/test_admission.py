@@ -0,0 +1,92 @@
+"""Admission control: bounded queue, load shedding and waiter cleanup.
+
+    python -m pytest app/test_admission.py
+"""
+
+import asyncio
+import pytest
+from app.admission import AdmissionController, LoadShedError
+from app.conftest import extended_empire
+
+
+async def hold(controller: AdmissionController, release: asyncio.Event) -> None:
+    async with controller.admit():
+        await release.wait()
+
+
+def test_request_beyond_full_queue_is_shed():
+    async def scenario():
+        controller = AdmissionController(max_concurrent=1, max_queue=1, queue_timeout=5.0)
+        release = asyncio.Event()
+        running = asyncio.create_task(hold(controller, release))
+        queued = asyncio.create_task(hold(controller, release))
+        await asyncio.sleep(0)
+        assert (controller.active, controller.queue_depth) == (1, 1)
+
+        with pytest.raises(LoadShedError) as shed:
+            async with controller.admit():
+                pass
+        assert shed.value.status_code == 503
+        assert shed.value.reason == "queue_full"
+        assert int(shed.value.headers["Retry-After"]) >= 1
+
+        release.set()
+        await asyncio.gather(running, queued)
+        assert (controller.active, controller.queue_depth) == (0, 0)
+
+    asyncio.run(scenario())
+
+
+def test_timed_out_waiter_is_removed():
+    async def scenario():
+        controller = AdmissionController(max_concurrent=1, max_queue=2, queue_timeout=0.05)
+        release = asyncio.Event()
+        running = asyncio.create_task(hold(controller, release))
+        await asyncio.sleep(0)
+
+        with pytest.raises(LoadShedError) as shed:
+            async with controller.admit():
+                pass
+        assert shed.value.reason == "queue_timeout"
+        assert controller.queue_depth == 0
+
+        # The freed slot goes to nobody rather than to the expired waiter
+        release.set()
+        await running
+        assert controller.active == 0
+        async with controller.admit():
+            assert controller.active == 1
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_is_removed():
+    async def scenario():
+        controller = AdmissionController(max_concurrent=1, max_queue=2, queue_timeout=5.0)
+        release = asyncio.Event()
+        running = asyncio.create_task(hold(controller, release))
+        waiting = asyncio.create_task(hold(controller, release))
+        await asyncio.sleep(0)
+        assert controller.queue_depth == 1
+
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        assert controller.queue_depth == 0
+
+        release.set()
+        await running
+        assert controller.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_endpoint_sheds_with_503_and_retry_after(client, upstream, monkeypatch):
+    from app import main
+    monkeypatch.setattr(main.admission, "max_concurrent", 0)
+    monkeypatch.setattr(main.admission, "max_queue", 0)
+
+    response = client.post("/suggest-agents-extended", json=extended_empire("Shed At Capacity"))
+    assert response.status_code == 503
+    assert int(response.headers["Retry-After"]) >= 1
+    assert not upstream.requests
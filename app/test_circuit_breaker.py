@@ -0,0 +1,157 @@
+"""Circuit breaker state transitions, alone and in front of a stubbed Claude API.
+
+    python -m pytest app/test_circuit_breaker.py
+"""
+
+import asyncio
+import json
+import httpx
+import pytest
+from fastapi import HTTPException
+from app import circuit_breaker, claude_service
+from app.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+from app.models import EmpireDescriptionRequest
+
+AGENT = {
+    "agent_id": "agent-1",
+    "agent_name": "Coalition Signal Monitor",
+    "agent_purpose_and_tasks": "Monitors public discourse for coalition risks",
+    "linked_empire_need_or_component": "ends: durable coalitions",
+    "suggested_technical_approach": "Python service with an LLM summariser",
+    "estimated_complexity_to_build": "Medium",
+    "key_data_inputs": ["news feeds"],
+    "key_data_outputs_or_actions": ["weekly briefs"],
+}
+
+
+class FakeClock:
+    """Stand-in for time.monotonic that only moves when told to."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", fake)
+    return fake
+
+
+def test_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=3, recovery_timeout=30)
+    for _ in range(2):
+        breaker.allow_request()
+        breaker.record_failure()
+    assert breaker.state == CLOSED
+
+    breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError) as raised:
+        breaker.allow_request()
+    assert raised.value.status_code == 503
+    assert raised.value.headers["Retry-After"] == "30"
+
+
+def test_success_resets_failure_count(clock):
+    breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=30)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+
+
+def test_half_open_allows_a_single_probe(clock):
+    breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=30)
+    breaker.record_failure()
+    clock.now += 29
+    assert breaker.state == OPEN
+    assert breaker.retry_after() == pytest.approx(1)
+
+    clock.now += 1
+    assert breaker.state == HALF_OPEN
+    breaker.allow_request()
+    with pytest.raises(CircuitOpenError):
+        breaker.allow_request()
+
+
+def test_probe_outcome_closes_or_reopens(clock):
+    breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=30)
+    breaker.record_failure()
+    clock.now += 30
+    breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+
+    clock.now += 30
+    breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    breaker.allow_request()
+
+
+def test_released_probe_can_be_retried(clock):
+    breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=30)
+    breaker.record_failure()
+    clock.now += 30
+    breaker.allow_request()
+    breaker.release()
+    breaker.allow_request()
+    assert breaker.state == HALF_OPEN
+
+
+def test_upstream_failures_open_the_shared_circuit(clock, monkeypatch):
+    """Overloaded responses open the circuit; later calls fail fast until a probe succeeds."""
+    upstream = {"status": 529, "calls": 0}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        upstream["calls"] += 1
+        if upstream["status"] != 200:
+            return httpx.Response(upstream["status"], text="overloaded")
+        return httpx.Response(200, json={
+            "content": [{"type": "text", "text": json.dumps([AGENT])}],
+            "usage": {"input_tokens": 100, "output_tokens": 50},
+            "stop_reason": "end_turn",
+        })
+
+    empire = EmpireDescriptionRequest(
+        empire_name="Test Empire",
+        primary_focus_domains=["governance"],
+        main_goals=["Build coalitions"],
+        available_resources=["AI tools"],
+        core_principles=["Transparency"],
+        key_challenges=["Information overload"],
+        operational_style="Collaborative",
+    )
+    breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=30)
+    monkeypatch.setattr(claude_service, "claude_circuit", breaker)
+
+    async def suggest():
+        return await claude_service.get_claude_suggestions(empire, None, "{{empire_description_json}}", agent_count=1)
+
+    async def scenario():
+        claude_service._http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        try:
+            for _ in range(2):
+                with pytest.raises(HTTPException) as raised:
+                    await suggest()
+                assert raised.value.status_code == 529
+            assert breaker.state == OPEN
+
+            with pytest.raises(CircuitOpenError):
+                await suggest()
+            assert upstream["calls"] == 2
+
+            clock.now += 30
+            upstream["status"] = 200
+            agents = await suggest()
+            assert [agent.agent_id for agent in agents] == ["agent-1"]
+            assert breaker.state == CLOSED
+        finally:
+            await claude_service.close_upstream_client()
+
+    asyncio.run(scenario())
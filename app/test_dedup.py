@@ -0,0 +1,74 @@
+"""Near-duplicate agent clustering: representatives, order, and the candidate path for large inputs.
+
+    python -m pytest app/test_dedup.py
+"""
+
+import numpy as np
+from app.conftest import sample_agent
+from app.dedup import cluster_texts, deduplicate_agents, group_clusters
+from app.models import AgentSpecificationResponse
+
+THRESHOLD = 0.7
+BUDGET = "Budget tracker agent that publishes municipal spending reports for every district council"
+BUDGET_REWORDED = "Budget tracker agent that publishes municipal spending reports for each district council"
+TRANSIT = "Transit planner agent that schedules night buses between neighbourhood assemblies"
+
+
+def agent(index: int, name: str, purpose: str) -> AgentSpecificationResponse:
+    return AgentSpecificationResponse(**dict(sample_agent(index), agent_name=name, agent_purpose_and_tasks=purpose))
+
+
+def test_near_duplicates_share_a_representative():
+    representatives = cluster_texts([BUDGET, TRANSIT, BUDGET_REWORDED, BUDGET], THRESHOLD)
+    assert representatives[0] == representatives[2] == representatives[3]
+    assert representatives[1] == 1
+    assert representatives[0] in (0, 2, 3)
+
+
+def test_distinct_texts_stay_apart():
+    assert cluster_texts([BUDGET, TRANSIT], THRESHOLD).tolist() == [0, 1]
+    assert cluster_texts([], THRESHOLD).tolist() == []
+
+
+def test_high_threshold_keeps_rewordings_apart():
+    representatives = cluster_texts([BUDGET, BUDGET_REWORDED, BUDGET], 0.999)
+    assert representatives[0] == representatives[2]
+    assert representatives[1] == 1
+
+
+def test_deduplicate_keeps_one_agent_per_cluster_in_first_seen_order():
+    agents = [
+        agent(0, "Budget Tracker", BUDGET),
+        agent(1, "Transit Planner", TRANSIT),
+        agent(2, "Budget Tracker", BUDGET_REWORDED),
+    ]
+    kept = deduplicate_agents(agents, THRESHOLD)
+    assert [a.agent_name for a in kept] == ["Budget Tracker", "Transit Planner"]
+    assert deduplicate_agents(agents[:1], THRESHOLD) == agents[:1]
+
+
+def test_group_clusters_lists_representative_first_and_largest_first():
+    representatives = np.array([2, 1, 2, 2, 4, 4, 6])
+    assert group_clusters(representatives) == [[2, 0, 3], [4, 5]]
+    assert group_clusters(representatives, min_size=3) == [[2, 0, 3]]
+
+
+def test_large_inputs_find_duplicates_through_candidate_pairs():
+    texts = [f"agent {number} maintains registry shard {number * 7919} for ward {number % 97}" for number in range(5000)]
+    texts[4321] = BUDGET
+    texts[17] = BUDGET_REWORDED
+    representatives = cluster_texts(texts, THRESHOLD)
+    assert representatives[17] == representatives[4321]
+    assert len(set(representatives.tolist())) == 4999
+
+
+def test_endpoint_reports_removed_duplicates(client):
+    agents = [
+        sample_agent(0) | {"agent_name": "Budget Tracker", "agent_purpose_and_tasks": BUDGET},
+        sample_agent(1) | {"agent_name": "Budget Tracker", "agent_purpose_and_tasks": BUDGET_REWORDED},
+        sample_agent(2) | {"agent_name": "Transit Planner", "agent_purpose_and_tasks": TRANSIT},
+    ]
+    response = client.post("/agents/deduplicate", json=agents)
+    assert response.status_code == 200
+    assert response.headers["X-Duplicates-Removed"] == "1"
+    assert [a["agent_name"] for a in response.json()] == ["Budget Tracker", "Transit Planner"]
@@ -0,0 +1,185 @@
+"""Delta planning: which edits are patched incrementally and which regenerate the swarm.
+
+    python -m pytest app/test_delta.py
+"""
+
+import pytest
+from app.conftest import extended_empire, sample_agent
+from app.delta import diff_empires, plan_delta, stem
+from app.models import AgentSpecificationResponse, ExtendedEmpireDescription
+
+LINK_THRESHOLD = 0.35
+MAX_FRACTION = 0.6
+MIN_DESCRIPTION_SIMILARITY = 0.5
+
+EMPIRE = {
+    "empire_name_and_description": "Civic Commons. A network of neighbourhood assemblies running open civic tools",
+    "ends": ["Durable democratic coalitions", "Transparent municipal budgets"],
+    "means": ["Open source civic software", "Volunteer organizers"],
+    "principles": ["Radical transparency"],
+    "identity": ["Stewards of the commons"],
+    "resentments": ["Backroom deals"],
+    "emotions": ["Quiet determination"],
+}
+
+LINKS = [
+    "ends: durable democratic coalitions",
+    "ends: transparent municipal budgets",
+    "means: open source civic software",
+    "means: volunteer organizers",
+    "principles: radical transparency",
+]
+
+
+def empire(**changes) -> ExtendedEmpireDescription:
+    return ExtendedEmpireDescription(**{**EMPIRE, **changes})
+
+
+def agents() -> list:
+    return [
+        AgentSpecificationResponse(
+            agent_id=f"agent-{index}",
+            agent_name=f"Agent {index}",
+            agent_purpose_and_tasks="Supports the empire",
+            linked_empire_need_or_component=link,
+            suggested_technical_approach="Python service",
+            estimated_complexity_to_build="Low",
+            key_data_inputs=["records"],
+            key_data_outputs_or_actions=["reports"],
+        )
+        for index, link in enumerate(LINKS)
+    ]
+
+
+def plan(new: ExtendedEmpireDescription, previous=None):
+    return plan_delta(
+        empire() if previous is None else previous,
+        agents(),
+        new,
+        link_threshold=LINK_THRESHOLD,
+        max_fraction=MAX_FRACTION,
+        min_description_similarity=MIN_DESCRIPTION_SIMILARITY
+    )
+
+
+def test_without_previous_swarm_is_full():
+    result = plan_delta(None, None, empire(), LINK_THRESHOLD, MAX_FRACTION, MIN_DESCRIPTION_SIMILARITY)
+    assert result.mode == "full"
+    assert plan_delta(empire(), [], empire(), LINK_THRESHOLD, MAX_FRACTION, MIN_DESCRIPTION_SIMILARITY).mode == "full"
+
+
+def test_whitespace_and_case_only_edit_is_unchanged():
+    result = plan(empire(ends=["durable  democratic COALITIONS", "Transparent municipal budgets"]))
+    assert result.mode == "unchanged"
+    assert result.regenerate_count == 0
+
+
+def test_edited_entry_replaces_its_linked_agent():
+    result = plan(empire(ends=["Durable democratic alliances", "Transparent municipal budgets"]))
+    assert result.mode == "incremental"
+    assert result.affected == [0]
+    assert result.regenerate_count == 1
+    assert result.diff.removed == {"ends": ["Durable democratic coalitions"]}
+    assert result.diff.added == {"ends": ["Durable democratic alliances"]}
+
+
+def test_inflected_link_still_matches():
+    result = plan(empire(means=["Open source civic software", "Paid staff"]))
+    assert result.affected == [3]
+
+
+def test_added_entry_gets_a_new_agent():
+    result = plan(empire(emotions=["Quiet determination", "Playful defiance"]))
+    assert result.mode == "incremental"
+    assert result.affected == []
+    assert result.regenerate_count == 1
+
+
+def test_edit_of_unlinked_entry_still_regenerates():
+    result = plan(empire(resentments=["Closed door negotiations"]))
+    assert result.mode == "incremental"
+    assert result.affected == []
+    assert result.regenerate_count == 1
+
+
+def test_rewritten_description_is_full():
+    result = plan(empire(empire_name_and_description="Harbour Freight Guild. Shipping logistics for island ports"))
+    assert result.mode == "full"
+    assert result.diff.description_similarity < MIN_DESCRIPTION_SIMILARITY
+
+
+def test_description_only_edit_is_full():
+    description = EMPIRE["empire_name_and_description"] + " and participatory budgeting"
+    result = plan(empire(empire_name_and_description=description))
+    assert result.mode == "full"
+    assert MIN_DESCRIPTION_SIMILARITY <= result.diff.description_similarity < 1.0
+    assert result.diff.removed_count == result.diff.added_count == 0
+
+
+def test_stopword_only_description_edit_is_unchanged():
+    description = EMPIRE["empire_name_and_description"].replace("A network", "The network")
+    assert plan(empire(empire_name_and_description=description)).mode == "unchanged"
+
+
+def test_description_edit_with_entry_edit_is_incremental():
+    description = EMPIRE["empire_name_and_description"] + " and participatory budgeting"
+    result = plan(empire(
+        empire_name_and_description=description,
+        ends=["Durable democratic alliances", "Transparent municipal budgets"]
+    ))
+    assert result.mode == "incremental"
+    assert result.affected == [0]
+
+
+def test_most_agents_affected_is_full():
+    result = plan(empire(
+        ends=["Something else entirely"],
+        means=["Unrelated capacity"],
+        principles=["Different driver"]
+    ))
+    assert result.mode == "full"
+    assert result.affected == [0, 1, 2, 3, 4]
+
+
+@pytest.mark.parametrize("word, expected", [
+    ("coalitions", "coalition"),
+    ("organizing", "organiz"),
+    ("organizers", "organiz"),
+    ("processes", "process"),
+    ("process", "process"),
+    ("policies", "policy"),
+    ("ais", "ais"),
+])
+def test_stem(word, expected):
+    assert stem(word) == expected
+
+
+def test_diff_lists_each_field_separately():
+    diff = diff_empires(empire(), empire(ends=["Durable democratic coalitions"], emotions=["Calm"]))
+    assert diff.removed == {"ends": ["Transparent municipal budgets"], "emotions": ["Quiet determination"]}
+    assert diff.added == {"emotions": ["Calm"]}
+    assert diff.removed_count == 2 and diff.added_count == 1
+
+
+def test_merge_onto_inline_agents_is_not_kept(client, upstream):
+    """Agents a client sends inline must not be served to later requests for the edited empire."""
+    previous = extended_empire("Inline Baseline")
+    edited = extended_empire("Inline Baseline", ends=["Durable democratic alliances", "Transparent municipal budgets"])
+    planted = [dict(sample_agent(index, link), agent_name=f"Planted {index}") for index, link in enumerate(LINKS[:3])]
+    upstream.agents = [sample_agent(9, "ends: durable democratic alliances")]
+
+    response = client.post("/suggest-agents-extended/delta", json={
+        "empire": edited,
+        "previous_empire": previous,
+        "previous_agents": planted,
+    })
+    assert response.status_code == 200
+    assert response.headers["X-Delta-Mode"] == "incremental"
+    assert "Planted 1" in [agent["agent_name"] for agent in response.json()]
+
+    upstream.agents = [sample_agent(index) for index in range(3)]
+    response = client.post("/suggest-agents-extended", json=edited)
+    assert response.status_code == 200
+    assert "X-Cache-Status" not in response.headers
+    assert not [agent for agent in response.json() if agent["agent_name"].startswith("Planted")]
+    assert len(upstream.requests) == 2
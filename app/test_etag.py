@@ -0,0 +1,60 @@
+"""ETags, If-None-Match revalidation and only-if-cached requests.
+
+    python -m pytest app/test_etag.py
+"""
+
+from app.conftest import extended_empire, sample_agent
+from app.models import AgentSpecificationResponse
+from app.serialization import agents_etag, etag_matches
+
+FRESH = {"Cache-Control": "no-cache"}
+
+
+def test_etag_depends_only_on_the_agents():
+    agents = [AgentSpecificationResponse(**sample_agent(n)) for n in range(2)]
+    etag = agents_etag(agents)
+    assert etag.startswith('W/"')
+    assert agents_etag(list(agents)) == etag
+    assert agents_etag(agents[:1]) != etag
+
+
+def test_etag_matching_is_weak_and_accepts_lists():
+    etag = 'W/"abc"'
+    assert etag_matches('"abc"', etag)
+    assert etag_matches('W/"other", W/"abc"', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches('"other"', etag)
+    assert not etag_matches(None, etag)
+
+
+def test_matching_if_none_match_answers_304_without_generating(client, upstream):
+    empire = extended_empire("Revalidated Swarm")
+    first = client.post("/suggest-agents-extended", json=empire, headers=FRESH)
+    etag = first.headers["ETag"]
+    projected = client.post("/suggest-agents-extended?fields=agent_id", json=empire)
+    assert projected.headers["ETag"] == etag
+
+    response = client.post("/suggest-agents-extended", json=empire, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert response.content == b""
+    assert len(upstream.requests) == 1
+
+
+def test_stale_if_none_match_gets_the_full_result(client, upstream):
+    empire = extended_empire("Changed Swarm")
+    client.post("/suggest-agents-extended", json=empire, headers=FRESH)
+
+    response = client.post("/suggest-agents-extended", json=empire, headers={"If-None-Match": 'W/"outdated"'})
+    assert response.status_code == 200
+    assert len(response.json()) == 3
+
+
+def test_only_if_cached_without_a_stored_result_is_504(client, upstream):
+    response = client.post(
+        "/suggest-agents-extended",
+        json=extended_empire("Never Generated"),
+        headers={"Cache-Control": "only-if-cached"}
+    )
+    assert response.status_code == 504
+    assert not upstream.requests
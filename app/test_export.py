@@ -0,0 +1,101 @@
+"""Bulk history export: CSV and NDJSON round trips, filters and the admin-only endpoint.
+
+    python -m pytest app/test_export.py
+"""
+
+import csv
+import io
+import json
+import pytest
+from fastapi import HTTPException
+from app.conftest import sample_agent
+from app.export import export_chunks, resolve_format
+from app.history import EXPORT_COLUMNS, LIST_COLUMNS, HistoryStore
+from app.models import AgentSpecificationResponse
+
+TRICKY = dict(
+    sample_agent(0),
+    agent_name='Ledger "Quote", comma\nand newline',
+    key_data_inputs=["minutes, signed", "ünïcode"],
+    potential_dependencies_or_integrations=["OpenCouncil API"],
+)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.sqlite3"), flush_interval=0.01)
+    agents = [AgentSpecificationResponse(**TRICKY), AgentSpecificationResponse(**sample_agent(1))]
+    store.record(agents, "hash-a", "v1", "Civic Empire", ["Civic Tech", "Budgets"], "{}")
+    store.record([AgentSpecificationResponse(**sample_agent(2))], "hash-b", "v2", "Other Empire", ["Mining"], "{}")
+    store.close()
+    yield store
+    store.close()
+
+
+def expected_rows() -> list:
+    return [
+        (AgentSpecificationResponse(**TRICKY), "hash-a", ["Civic Tech", "Budgets"], 0),
+        (AgentSpecificationResponse(**sample_agent(1)), "hash-a", ["Civic Tech", "Budgets"], 1),
+        (AgentSpecificationResponse(**sample_agent(2)), "hash-b", ["Mining"], 0),
+    ]
+
+
+def assert_round_trip(records: list) -> None:
+    assert len(records) == 3
+    for record, (agent, payload_hash, domains, position) in zip(records, expected_rows()):
+        assert list(record) == list(EXPORT_COLUMNS)
+        assert (record["payload_hash"], record["domains"], record["position"]) == (payload_hash, domains, position)
+        exported = {name: record[name] for name in AgentSpecificationResponse.model_fields}
+        assert AgentSpecificationResponse(**exported) == agent
+
+
+def export(store: HistoryStore, export_format: str, **filters) -> bytes:
+    return b"".join(export_chunks(store, export_format, batch_size=1, **filters))
+
+
+def test_csv_round_trip(store):
+    records = list(csv.DictReader(io.StringIO(export(store, "csv").decode(), newline="")))
+    for record in records:
+        for name in LIST_COLUMNS + ("domains",):
+            record[name] = json.loads(record[name]) if record[name] else None
+        record["position"] = int(record["position"])
+    assert_round_trip(records)
+
+
+def test_ndjson_round_trip(store):
+    records = [json.loads(line) for line in export(store, "ndjson").decode().splitlines()]
+    assert_round_trip(records)
+
+
+@pytest.mark.parametrize("export_format", ["csv", "ndjson"])
+def test_filters(store, export_format):
+    def agent_ids(**filters):
+        data = export(store, export_format, **filters).decode()
+        if export_format == "csv":
+            return [row["agent_id"] for row in csv.DictReader(io.StringIO(data, newline=""))]
+        return [json.loads(line)["agent_id"] for line in data.splitlines()]
+
+    assert agent_ids(domain="civic tech") == ["agent-0", "agent-1"]
+    assert agent_ids(prompt_version="v2") == ["agent-2"]
+    assert agent_ids(domain="civic") == []
+
+
+def test_resolve_format():
+    assert resolve_format("NDJSON") == "ndjson"
+    assert resolve_format(None) in ("parquet", "csv")
+    with pytest.raises(HTTPException) as error:
+        resolve_format("xlsx")
+    assert error.value.status_code == 422
+
+
+def test_export_endpoint_requires_the_admin_key(client, store, monkeypatch):
+    from app import main
+    monkeypatch.setattr(main, "history_store", store)
+    assert client.get("/history/export?format=csv").status_code == 403
+
+    monkeypatch.setattr(main.settings, "ADMIN_API_KEY", "admin-secret")
+    assert client.get("/history/export?format=csv", headers={"X-Admin-Key": "wrong"}).status_code == 401
+    response = client.get("/history/export?format=ndjson", headers={"X-Admin-Key": "admin-secret"})
+    assert response.status_code == 200
+    assert response.headers["X-Export-Format"] == "ndjson"
+    assert_round_trip([json.loads(line) for line in response.text.splitlines()])
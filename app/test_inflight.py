@@ -0,0 +1,115 @@
+"""Shared in-flight generations: joining, and cancellation when the last waiter disconnects.
+
+    python -m pytest app/test_inflight.py
+"""
+
+import asyncio
+import pytest
+from app.inflight import ClientDisconnected, InflightGenerations
+
+
+class FakeRequest:
+    """Just enough of a Starlette Request for wait_for_disconnect."""
+
+    def __init__(self):
+        self.gone = asyncio.Event()
+
+    async def receive(self) -> dict:
+        await self.gone.wait()
+        return {"type": "http.disconnect"}
+
+
+class Upstream:
+    """One generation call that runs until `finish` is set."""
+
+    def __init__(self):
+        self.calls = 0
+        self.finish = asyncio.Event()
+
+    async def generate(self) -> str:
+        self.calls += 1
+        await self.finish.wait()
+        return "agents"
+
+
+def test_identical_requests_share_one_call():
+    async def scenario():
+        inflight, upstream = InflightGenerations(), Upstream()
+        first = inflight.start("key", upstream.generate)
+        second = inflight.start("key", upstream.generate)
+        assert first is second and first.waiters == 2
+
+        waits = [asyncio.create_task(inflight.wait(first, FakeRequest())) for _ in range(2)]
+        await asyncio.sleep(0)
+        upstream.finish.set()
+        assert await asyncio.gather(*waits) == ["agents", "agents"]
+        assert upstream.calls == 1
+        assert len(inflight) == 0
+
+    asyncio.run(scenario())
+
+
+def test_call_survives_one_disconnect_and_is_cancelled_after_the_last():
+    async def scenario():
+        inflight, upstream = InflightGenerations(), Upstream()
+        shared = inflight.start("key", upstream.generate)
+        inflight.start("key", upstream.generate)
+        leaving, staying = FakeRequest(), FakeRequest()
+        left = asyncio.create_task(inflight.wait(shared, leaving))
+        stayed = asyncio.create_task(inflight.wait(shared, staying))
+        await asyncio.sleep(0)
+
+        leaving.gone.set()
+        with pytest.raises(ClientDisconnected):
+            await left
+        assert not shared.task.done()
+        assert shared.waiters == 1
+        assert inflight.get("key") is shared
+
+        staying.gone.set()
+        with pytest.raises(ClientDisconnected):
+            await stayed
+        await asyncio.sleep(0)
+        assert shared.task.cancelled()
+        assert inflight.get("key") is None
+        assert upstream.calls == 1
+
+    asyncio.run(scenario())
+
+
+def test_remaining_waiter_gets_the_result():
+    async def scenario():
+        inflight, upstream = InflightGenerations(), Upstream()
+        shared = inflight.start("key", upstream.generate)
+        inflight.start("key", upstream.generate)
+        leaving = FakeRequest()
+        left = asyncio.create_task(inflight.wait(shared, leaving))
+        stayed = asyncio.create_task(inflight.wait(shared, FakeRequest()))
+        await asyncio.sleep(0)
+
+        leaving.gone.set()
+        with pytest.raises(ClientDisconnected):
+            await left
+        upstream.finish.set()
+        assert await stayed == "agents"
+
+    asyncio.run(scenario())
+
+
+def test_last_disconnect_detaches_when_result_is_kept():
+    async def scenario():
+        inflight, upstream = InflightGenerations(), Upstream()
+        shared = inflight.start("key", upstream.generate)
+        shared.keep_result = True
+        leaving = FakeRequest()
+        left = asyncio.create_task(inflight.wait(shared, leaving))
+        await asyncio.sleep(0)
+
+        leaving.gone.set()
+        with pytest.raises(ClientDisconnected):
+            await left
+        assert not shared.task.done()
+        upstream.finish.set()
+        assert await shared.task == "agents"
+
+    asyncio.run(scenario())
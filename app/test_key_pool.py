@@ -0,0 +1,120 @@
+"""API key quarantine and rotation, alone and through a stubbed Claude API.
+
+    python -m pytest app/test_key_pool.py
+"""
+
+import asyncio
+import json
+import time
+import httpx
+import pytest
+from app import claude_service
+from app.key_pool import DEFAULT_BASE_URL, KeyPool, NoKeyAvailableError, parse_key_specs
+
+KEY_A = "sk-test-aaaa"
+KEY_B = "sk-test-bbbb"
+
+
+def pool(**kwargs) -> KeyPool:
+    return KeyPool([(KEY_A, DEFAULT_BASE_URL), (KEY_B, DEFAULT_BASE_URL)], **kwargs)
+
+
+def answer(status: int, **headers: str) -> httpx.Response:
+    return httpx.Response(status, headers=headers, request=httpx.Request("POST", DEFAULT_BASE_URL))
+
+
+def test_parse_key_specs():
+    assert parse_key_specs(KEY_A, f" {KEY_B}@https://proxy.example , {KEY_A},") == [
+        (KEY_A, DEFAULT_BASE_URL),
+        (KEY_B, "https://proxy.example"),
+    ]
+
+
+def test_acquire_prefers_headroom_then_fewest_in_flight():
+    keys = pool()
+    first = keys.acquire()
+    second = keys.acquire()
+    assert {first.api_key, second.api_key} == {KEY_A, KEY_B}
+    keys.release(first)
+
+    keys.release(second, response=answer(200, **{
+        "anthropic-ratelimit-tokens-limit": "1000",
+        "anthropic-ratelimit-tokens-remaining": "100",
+    }))
+    assert keys.acquire().api_key == first.api_key
+
+
+def test_unauthorized_key_is_quarantined():
+    keys = pool(auth_quarantine=600)
+    key = keys.acquire()
+    keys.release(key, response=answer(401))
+    assert not key.is_available(time.time())
+    assert key.quarantine_reason == "unauthorized"
+    assert key.quarantined_until == pytest.approx(time.time() + 600, abs=5)
+    for _ in range(3):
+        assert keys.acquire().api_key != key.api_key
+
+
+def test_rate_limited_key_waits_for_retry_after():
+    keys = pool(rate_limit_quarantine=30)
+    key = keys.acquire()
+    keys.release(key, response=answer(429, **{"retry-after": "5"}))
+    assert key.quarantine_reason == "rate_limited"
+    assert key.quarantined_until == pytest.approx(time.time() + 5, abs=1)
+
+
+def test_rate_limited_key_without_retry_after_uses_default():
+    keys = pool(rate_limit_quarantine=30)
+    key = keys.acquire()
+    keys.release(key, response=answer(429))
+    assert key.quarantined_until == pytest.approx(time.time() + 30, abs=1)
+
+
+def test_all_keys_quarantined_raises_with_retry_after():
+    keys = pool(rate_limit_quarantine=30)
+    for retry_after in ("5", "20"):
+        keys.release(keys.acquire(), response=answer(429, **{"retry-after": retry_after}))
+    with pytest.raises(NoKeyAvailableError) as raised:
+        keys.acquire()
+    assert raised.value.status_code == 503
+    assert 0 < raised.value.retry_after <= 5
+
+
+def test_quarantine_expires():
+    keys = pool()
+    key = keys.acquire()
+    keys.release(key, response=answer(429, **{"retry-after": "0"}))
+    assert keys.has_available()
+    assert key.is_available(time.time())
+
+
+def test_request_rotates_to_next_key(monkeypatch):
+    """A 429 from one key is retried once on the other; the first stays quarantined."""
+    seen = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        api_key = request.headers["x-api-key"]
+        seen.append(api_key)
+        if api_key == KEY_A:
+            return httpx.Response(429, headers={"retry-after": "60"}, text="rate limited")
+        return httpx.Response(200, json={"content": [{"type": "text", "text": json.dumps([])}]})
+
+    keys = pool()
+    monkeypatch.setattr(claude_service, "key_pool", keys)
+
+    async def send() -> int:
+        claude_service._http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        try:
+            async with claude_service.messages_response({}, tokens=100, timeout=httpx.Timeout(5.0)) as response:
+                return response.status_code
+        finally:
+            await claude_service.close_upstream_client()
+
+    assert asyncio.run(send()) == 200
+    assert seen == [KEY_A, KEY_B]
+    key_a, key_b = keys.keys
+    assert key_a.quarantine_reason == "rate_limited" and not key_a.is_available(time.time())
+    assert key_b.in_flight == 0 and key_b.reserved_tokens == 0
+
+    assert asyncio.run(send()) == 200
+    assert seen[2:] == [KEY_B]
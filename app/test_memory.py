@@ -0,0 +1,150 @@
+"""Memory regression benchmark for parsing and validating model output.
+
+Runs offline: the Claude API is replaced by an in-process transport. Peak
+traced allocation per phase is compared with limits expressed as multiples
+of the model output size; the tests fail (and the script exits non-zero)
+when one is exceeded.
+
+    python -m app.test_memory
+    python -m pytest app/test_memory.py
+"""
+
+import asyncio
+import json
+import sys
+import tracemalloc
+import httpx
+from app import claude_service
+from app.claude_service import get_claude_suggestions, parse_agent_specs, validate_agent_specs
+from app.memory_profile import memory_profiler
+from app.models import EmpireDescriptionRequest
+
+AGENT_COUNT = 25
+
+# Peak allocation limits, as multiples of the output text size
+PARSE_VALIDATE_LIMIT = 3.5
+PHASE_LIMITS = {
+    "upstream": 4.0,
+    "parse": 2.5,
+    "validate": 2.0,
+}
+
+
+def sample_agent(index: int) -> dict:
+    return {
+        "agent_id": f"agent-{index}",
+        "agent_name": f"Coalition Signal Monitor {index}",
+        "agent_purpose_and_tasks": "Monitors public discourse for coalition risks and summarises emerging narratives. " * 6,
+        "linked_empire_need_or_component": "ends: durable, AI-literate democratic coalitions",
+        "suggested_technical_approach": "Python service with an LLM summariser over a streaming ingest pipeline. " * 3,
+        "estimated_complexity_to_build": "Medium",
+        "key_data_inputs": ["news feeds", "social media posts", "policy documents"],
+        "key_data_outputs_or_actions": ["weekly briefs", "risk alerts"],
+        "potential_dependencies_or_integrations": ["vector store", "alerting"],
+    }
+
+
+def sample_outputs() -> dict:
+    """Model outputs in the shapes the parser has to handle."""
+    agents = [sample_agent(i) for i in range(AGENT_COUNT)]
+    objects = [json.dumps(agent, indent=2) for agent in agents]
+    return {
+        "fenced": "```json\n" + json.dumps(agents, indent=2) + "\n```",
+        "prose": "Here is the swarm:\n\n" + json.dumps(agents, indent=2) + "\n\nLet me know if you need changes.",
+        "missing_commas": "```json\n[\n" + "\n".join(objects) + "\n]\n```",
+        "truncated": "```json\n[\n" + ",\n".join(objects)[:-300],
+    }
+
+
+def measure_parse_validate(text: str) -> int:
+    """Peak traced bytes of parsing and validating `text`."""
+    tracemalloc.start()
+    try:
+        base = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        agents = validate_agent_specs(parse_agent_specs(text))
+        peak = tracemalloc.get_traced_memory()[1] - base
+    finally:
+        tracemalloc.stop()
+    assert agents, "no agents parsed"
+    return peak
+
+
+def parse_validate_failures() -> list:
+    """Output shapes whose parse + validate peak exceeds PARSE_VALIDATE_LIMIT times their size."""
+    failures = []
+    for name, text in sample_outputs().items():
+        peak = measure_parse_validate(text)
+        ratio = peak / len(text)
+        status = "ok" if ratio <= PARSE_VALIDATE_LIMIT else "REGRESSION"
+        print(f"{name:16} output {len(text):7d} B  peak {peak:8d} B  {ratio:4.2f}x  (limit {PARSE_VALIDATE_LIMIT}x)  {status}")
+        if status != "ok":
+            failures.append(name)
+    return failures
+
+
+async def generation_phases(output: str) -> dict:
+    """Run one generation against an in-process Claude API and return the profiler's phase statistics."""
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json={
+            "content": [{"type": "text", "text": output}],
+            "usage": {"input_tokens": 2000, "output_tokens": len(output) // 4},
+            "stop_reason": "end_turn",
+        })
+
+    empire = EmpireDescriptionRequest(
+        empire_name="Benchmark Empire",
+        primary_focus_domains=["governance"],
+        main_goals=["Build coalitions"],
+        available_resources=["AI tools"],
+        core_principles=["Transparency"],
+        key_challenges=["Information overload"],
+        operational_style="Collaborative",
+    )
+    claude_service._http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    memory_profiler.reset()
+    memory_profiler.start()
+    try:
+        await get_claude_suggestions(empire, "benchmark", "{{empire_description_json}}", agent_count=AGENT_COUNT)
+        return memory_profiler.report()["phases"]
+    finally:
+        memory_profiler.stop()
+        await claude_service.close_upstream_client()
+
+
+def generation_phase_failures() -> list:
+    """Phases of a full generation whose peak exceeds their PHASE_LIMITS multiple of the output size."""
+    output = sample_outputs()["fenced"]
+    phases = asyncio.run(generation_phases(output))
+    failures = []
+    for phase, limit in PHASE_LIMITS.items():
+        peak = phases[phase]["peak_max_bytes"]
+        ratio = peak / len(output)
+        status = "ok" if ratio <= limit else "REGRESSION"
+        print(f"phase {phase:10} peak {peak:8d} B  {ratio:4.2f}x  (limit {limit}x)  {status}")
+        if status != "ok":
+            failures.append(phase)
+    return failures
+
+
+def test_parse_validate_memory() -> None:
+    """Every output shape stays under PARSE_VALIDATE_LIMIT times its size."""
+    failures = parse_validate_failures()
+    assert not failures, failures
+
+
+def test_generation_phase_memory() -> None:
+    """Each phase of a full generation stays under its PHASE_LIMITS multiple of the output size."""
+    failures = generation_phase_failures()
+    assert not failures, failures
+
+
+if __name__ == "__main__":
+    print("Parse + validate:")
+    failed = parse_validate_failures()
+    print("\nGeneration phases:")
+    failed += generation_phase_failures()
+    if failed:
+        print(f"\nMemory regression in: {', '.join(failed)}")
+        sys.exit(1)
+    print("\nAll memory thresholds met")
@@ -0,0 +1,84 @@
+"""Input normalization: canonical text, dropped entries and per-entry, per-field and text budgets.
+
+    python -m pytest app/test_normalization.py
+"""
+
+from app.conftest import extended_empire
+from app.models import ExtendedEmpireDescription
+from app.normalization import (
+    NormalizationLimits,
+    NormalizationReport,
+    canonical_text,
+    normalize_empire,
+    normalize_entries,
+    truncate_tokens,
+)
+from app.token_budget import TokenEstimator
+
+LONG_ENTRY = " ".join(f"word{number}" for number in range(40))
+
+
+def reasons(report: NormalizationReport) -> list:
+    return [(dropped.entry, dropped.reason) for dropped in report.dropped]
+
+
+def test_canonical_text_collapses_whitespace_and_nfkc_normalizes():
+    assert canonical_text("  Ｆull width \t\n text ") == "Full width text"
+
+
+def test_empty_and_duplicate_entries_are_dropped_but_short_ones_kept():
+    report = NormalizationReport()
+    entries = normalize_entries(["AI", "  ", "--", "Open data", "open data.", "AI"], NormalizationLimits(), report, "means")
+    assert entries == ["AI", "Open data"]
+    assert reasons(report) == [("  ", "empty"), ("--", "empty"), ("open data.", "duplicate"), ("AI", "duplicate")]
+    assert {dropped.field for dropped in report.dropped} == {"means"}
+
+
+def test_entry_budget_truncates_at_a_word_boundary():
+    report = NormalizationReport()
+    [entry] = normalize_entries([LONG_ENTRY], NormalizationLimits(max_entry_tokens=10), report)
+    assert entry.endswith("...") and entry.startswith("word0 word1")
+    assert TokenEstimator.raw_estimate(entry) <= 10
+    assert report.entries_truncated == 1
+    assert truncate_tokens(entry, 10) == entry
+
+
+def test_field_budget_and_entry_count_drop_the_overflow():
+    limits = NormalizationLimits(max_entries=3, max_entry_tokens=50, field_token_budget=60)
+    report = NormalizationReport()
+    entries = normalize_entries([LONG_ENTRY, LONG_ENTRY + " again", "third", "fourth"], limits, report)
+    assert entries[0] == LONG_ENTRY
+    assert entries[1].endswith("...")
+    assert sum(map(TokenEstimator.raw_estimate, entries)) <= 60
+    assert len(entries) <= 3
+    assert ("fourth", "over_budget") in reasons(report)
+
+    report = NormalizationReport()
+    assert normalize_entries(["a", "b", "c", "d"], NormalizationLimits(max_entries=2), report) == ["a", "b"]
+    assert reasons(report) == [("c", "over_budget"), ("d", "over_budget")]
+
+
+def test_normalize_empire_applies_text_budget_and_keeps_required_lists():
+    empire = ExtendedEmpireDescription(**extended_empire(
+        "Budgets " + LONG_ENTRY,
+        ends=["...", "  "],
+        means=["Open  source", "open source", "Mutual aid"],
+    ))
+    normalized, report = normalize_empire(empire, NormalizationLimits(text_token_budget=20))
+    assert TokenEstimator.raw_estimate(normalized.empire_name_and_description) <= 20
+    assert normalized.ends == ["..."]
+    assert normalized.means == ["Open source", "Mutual aid"]
+    assert reasons(report) == [("  ", "empty"), ("open source", "duplicate")]
+    assert report.entries_truncated == 1
+    assert report.tokens_saved > 0
+
+
+def test_endpoint_reports_dropped_entries(client):
+    response = client.post(
+        "/suggest-agents-extended",
+        json=extended_empire("Normalized Input", means=["Open source", "OPEN SOURCE", "  "]),
+        headers={"Cache-Control": "no-cache"}
+    )
+    assert response.status_code == 200
+    assert response.headers["X-Input-Entries-Dropped"] == "2"
+    assert int(response.headers["X-Input-Tokens-Saved"]) > 0
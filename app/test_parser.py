@@ -0,0 +1,106 @@
+"""Parsing of model output into agent specifications: fences, prose, repairs and truncation.
+
+    python -m pytest app/test_parser.py
+"""
+
+import json
+import pytest
+from app.claude_service import AgentParseError, parse_agent_specs, process_output_text
+
+
+def sample_agent(index: int) -> dict:
+    return {
+        "agent_id": f"agent-{index}",
+        "agent_name": f"Monitor {index}",
+        # Brackets and braces inside strings must not confuse bracket matching
+        "agent_purpose_and_tasks": "Fills {placeholders} in [draft] briefs",
+        "linked_empire_need_or_component": "ends: durable coalitions",
+        "suggested_technical_approach": "Python service",
+        "estimated_complexity_to_build": "Low",
+        "key_data_inputs": ["news feeds"],
+        "key_data_outputs_or_actions": ["briefs"],
+    }
+
+
+AGENTS = [sample_agent(index) for index in range(3)]
+OBJECTS = [json.dumps(agent, indent=2) for agent in AGENTS]
+IDS = [agent["agent_id"] for agent in AGENTS]
+
+
+def ids(parsed: list) -> list:
+    return [agent["agent_id"] for agent in parsed]
+
+
+@pytest.mark.parametrize("text", [
+    json.dumps(AGENTS),
+    "```json\n" + json.dumps(AGENTS, indent=2) + "\n```",
+    "```\n" + json.dumps(AGENTS) + "\n```\n",
+    "  \n```json\n" + json.dumps(AGENTS) + "```  ",
+], ids=["bare", "json_fence", "plain_fence", "fence_with_whitespace"])
+def test_fenced_and_bare_arrays(text):
+    assert ids(parse_agent_specs(text)) == IDS
+
+
+def test_prose_around_array():
+    text = "Here is the swarm:\n\n" + json.dumps(AGENTS, indent=2) + "\n\nLet me know if you need changes."
+    assert ids(parse_agent_specs(text)) == IDS
+
+
+@pytest.mark.parametrize("text", [
+    "Note {see below}:\n" + json.dumps(AGENTS),
+    json.dumps(AGENTS) + "\n}",
+    json.dumps(AGENTS) + "\n{\"unfinished\": ",
+], ids=["brace_before", "closing_brace_after", "open_brace_after"])
+def test_stray_braces_outside_array(text):
+    assert ids(parse_agent_specs(text)) == IDS
+
+
+def test_missing_commas_between_objects():
+    text = "```json\n[\n" + "\n".join(OBJECTS) + "\n]\n```"
+    assert ids(parse_agent_specs(text)) == IDS
+
+
+def test_trailing_commas():
+    assert ids(parse_agent_specs("[" + ",".join(OBJECTS) + ",]")) == IDS
+    assert parse_agent_specs('[{"agent_id": "agent-0", "agent_name": "Monitor",}]') == [
+        {"agent_id": "agent-0", "agent_name": "Monitor"}
+    ]
+
+
+@pytest.mark.parametrize("suffix", ["", "\n```"], ids=["unterminated", "closed_fence"])
+def test_truncated_output_keeps_complete_objects(suffix):
+    text = "```json\n[\n" + ",\n".join(OBJECTS)[:-40] + suffix
+    assert ids(parse_agent_specs(text)) == IDS[:2]
+
+
+def test_truncated_output_with_inner_trailing_comma():
+    objects = list(OBJECTS)
+    objects[1] = objects[1][:-2] + ",\n}"
+    text = "```json\n[\n" + ",\n".join(objects)[:-40]
+    assert ids(parse_agent_specs(text)) == IDS[:2]
+
+
+def test_truncated_before_first_object_completes():
+    with pytest.raises(AgentParseError) as raised:
+        parse_agent_specs('[{"agent_id": "agent-0", "agent_name": "Mon')
+    assert raised.value.status_code == 502
+    assert "truncated" in raised.value.detail
+
+
+def test_output_without_json():
+    with pytest.raises(AgentParseError):
+        parse_agent_specs("I cannot help with that request.")
+
+
+def test_process_output_validates_agents():
+    result = process_output_text("```json\n" + json.dumps(AGENTS) + "\n```")
+    assert result.error is None
+    assert [agent.agent_id for agent in result.agents] == IDS
+
+
+def test_process_output_reports_invalid_agents():
+    text = json.dumps([AGENTS[0], {"agent_id": "incomplete"}])
+    result = process_output_text(text)
+    assert result.agents == []
+    assert "index 1" in result.error
+    assert result.content_text == text
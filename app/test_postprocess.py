@@ -0,0 +1,98 @@
+"""Post-processing backends (inline, thread, process) and the event-loop lag monitor.
+
+    python -m pytest app/test_postprocess.py
+"""
+
+import asyncio
+import contextvars
+import os
+import time
+from concurrent.futures.process import BrokenProcessPool
+import pytest
+from app.metrics import metrics
+from app.postprocess import EventLoopLagMonitor, PostProcessor
+
+phase = contextvars.ContextVar("phase", default=None)
+
+
+def current_phase() -> str:
+    return phase.get()
+
+
+def sample(name: str) -> float:
+    """Value of an unlabelled sample in the /metrics output (0 before the first observation)."""
+    for line in metrics.render().splitlines():
+        if line.startswith(name + " "):
+            return float(line.split()[1])
+    return 0.0
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError, match="fibers"):
+        PostProcessor(backend="fibers")
+
+
+@pytest.mark.parametrize("backend", ["inline", "thread"])
+def test_in_process_backends_see_context_variables(backend):
+    async def scenario():
+        processor = PostProcessor(backend=backend)
+        phase.set("parse")
+        try:
+            assert await processor.run(current_phase) == "parse"
+        finally:
+            processor.close()
+
+    asyncio.run(scenario())
+
+
+def test_thread_backend_keeps_the_loop_responsive():
+    async def scenario():
+        processor = PostProcessor(backend="thread")
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker = asyncio.create_task(tick())
+        await processor.run(time.sleep, 0.2)
+        ticker.cancel()
+        processor.close()
+        assert ticks >= 5
+
+    asyncio.run(scenario())
+
+
+def test_process_backend_starts_warm_workers_and_survives_a_dead_one():
+    async def scenario():
+        processor = PostProcessor(backend="process", workers=2)
+        try:
+            assert await processor.start() == {"backend": "process", "workers": 2}
+            assert await processor.run(abs, -3) == 3
+
+            # Kill a worker behind the processor's back; the next call replaces the pool
+            with pytest.raises(BrokenProcessPool):
+                await asyncio.get_running_loop().run_in_executor(processor._executor, os._exit, 1)
+            assert await processor.run(abs, -4) == 4
+        finally:
+            processor.close()
+
+    asyncio.run(scenario())
+
+
+def test_lag_monitor_reports_blocking_work():
+    async def scenario():
+        monitor = EventLoopLagMonitor(interval=0.01)
+        lag_before = sample("event_loop_lag_seconds_sum")
+        monitor.start()
+        await asyncio.sleep(0.05)
+        assert sample("event_loop_lag_last_seconds") < 0.1
+
+        time.sleep(0.15)
+        await asyncio.sleep(0.05)
+        await monitor.stop()
+        assert sample("event_loop_lag_seconds_sum") - lag_before >= 0.1
+
+    asyncio.run(scenario())
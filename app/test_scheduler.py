@@ -0,0 +1,105 @@
+"""Priority classes, per-tenant fair sharing and gating of client-requested priorities.
+
+    python -m pytest app/test_scheduler.py
+"""
+
+import asyncio
+from app.admission import AdmissionController, Ticket
+from app.scheduler import ClassPolicy, FairShareQueue
+
+
+def fair_share_queue(**limits) -> FairShareQueue:
+    policies = {name: ClassPolicy(max_concurrent=4) for name in ("interactive", "batch", "background")}
+    policies.update({name: ClassPolicy(max_concurrent=limit) for name, limit in limits.items()})
+    return FairShareQueue(policies)
+
+
+def drain(queue: FairShareQueue) -> list:
+    order = []
+    while (ticket := queue.pop_runnable()) is not None:
+        queue.on_start(ticket)
+        order.append(ticket)
+    return order
+
+
+def test_higher_classes_start_first():
+    queue = fair_share_queue()
+    tickets = [Ticket(priority=priority) for priority in ("background", "batch", "interactive", "batch")]
+    for ticket in tickets:
+        queue.push(ticket)
+    assert drain(queue) == [tickets[2], tickets[1], tickets[3], tickets[0]]
+
+
+def test_class_at_its_limit_lets_lower_classes_run():
+    queue = fair_share_queue(batch=1)
+    running, waiting, background = Ticket(priority="batch"), Ticket(priority="batch"), Ticket(priority="background")
+    queue.on_start(running)
+    queue.push(waiting)
+    queue.push(background)
+    assert drain(queue) == [background]
+
+    queue.on_finish(running)
+    assert drain(queue) == [waiting]
+
+
+def test_tenants_take_turns_within_a_class():
+    queue = fair_share_queue()
+    backlog = [Ticket(tenant="busy") for _ in range(3)]
+    quiet = Ticket(tenant="quiet")
+    for ticket in backlog + [quiet]:
+        queue.push(ticket)
+    assert drain(queue) == [backlog[0], quiet, backlog[1], backlog[2]]
+
+
+def test_tenant_with_fewest_running_goes_next():
+    queue = fair_share_queue()
+    queue.on_start(Ticket(tenant="busy"))
+    busy, quiet = Ticket(tenant="busy"), Ticket(tenant="quiet")
+    queue.push(busy)
+    queue.push(quiet)
+    assert queue.pop_runnable() is quiet
+
+
+def test_full_queue_displaces_newest_request_of_lowest_class():
+    queue = fair_share_queue()
+    batch = Ticket(priority="batch")
+    older, newer = Ticket(priority="background"), Ticket(priority="background")
+    for ticket in (batch, older, newer):
+        queue.push(ticket)
+    assert queue.victim_for(Ticket(priority="interactive")) is newer
+    assert queue.victim_for(Ticket(priority="background")) is None
+
+
+def test_interactive_waiter_overtakes_earlier_background_waiter():
+    async def scenario():
+        controller = AdmissionController(max_concurrent=1, max_queue=4, queue_timeout=5.0, queue=fair_share_queue())
+        release, started = asyncio.Event(), []
+
+        async def run(priority: str):
+            async with controller.admit(priority=priority):
+                started.append(priority)
+                await release.wait()
+
+        tasks = [asyncio.create_task(run("batch"))]
+        await asyncio.sleep(0)
+        tasks += [asyncio.create_task(run("background")), asyncio.create_task(run("interactive"))]
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(*tasks)
+        assert started == ["batch", "interactive", "background"]
+
+    asyncio.run(scenario())
+
+
+def test_priorities_above_default_need_the_priority_key(monkeypatch):
+    from app import main
+    monkeypatch.setattr(main.settings, "DEFAULT_PRIORITY", "batch")
+    monkeypatch.setattr(main.settings, "PRIORITY_API_KEY", None)
+    assert main.granted_priority("interactive", None) == "batch"
+    assert main.granted_priority("interactive", "guess") == "batch"
+    assert main.granted_priority("Background ", None) == "background"
+    assert main.granted_priority("urgent", None) == "batch"
+
+    monkeypatch.setattr(main.settings, "PRIORITY_API_KEY", "secret")
+    assert main.granted_priority("interactive", "guess") == "batch"
+    assert main.granted_priority("interactive", "secret") == "interactive"
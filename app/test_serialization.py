@@ -0,0 +1,91 @@
+"""fields= projection, NDJSON/MessagePack negotiation and response compression.
+
+    python -m pytest app/test_serialization.py
+"""
+
+import json
+import pytest
+from fastapi import HTTPException
+from app.conftest import extended_empire, sample_agent
+from app.models import AgentSpecificationResponse
+from app.serialization import JSON, MSGPACK, NDJSON, negotiate_format, parse_fields
+
+# extended_empire payloads are near-duplicates of each other; generate each one afresh
+FRESH = {"Cache-Control": "no-cache"}
+
+
+def test_parse_fields():
+    assert parse_fields(None) is None
+    assert parse_fields(" , ") is None
+    assert parse_fields("agent_id, agent_name") == ["agent_id", "agent_name"]
+    with pytest.raises(HTTPException) as error:
+        parse_fields("agent_id,secret_sauce")
+    assert error.value.status_code == 422
+    assert "secret_sauce" in error.value.detail
+
+
+def test_negotiate_format_honours_q_values():
+    assert negotiate_format(None) == JSON
+    assert negotiate_format("text/html") == JSON
+    assert negotiate_format("application/x-ndjson") == NDJSON
+    assert negotiate_format("application/json;q=0.5, application/x-ndjson") == NDJSON
+    assert negotiate_format("application/x-ndjson;q=0, */*") == JSON
+
+
+def test_bad_fields_value_is_rejected_before_generating(client, upstream):
+    response = client.post("/suggest-agents-extended?fields=agent_id,nope", json=extended_empire("Bad Fields"))
+    assert response.status_code == 422
+    assert "nope" in response.json()["detail"]
+    assert not upstream.requests
+
+
+def test_fields_projection(client):
+    response = client.post(
+        "/suggest-agents-extended?fields=agent_id,agent_name",
+        json=extended_empire("Projected"),
+        headers=FRESH
+    )
+    assert response.status_code == 200
+    assert response.json() == [
+        {"agent_id": agent["agent_id"], "agent_name": agent["agent_name"]} for agent in map(sample_agent, range(3))
+    ]
+
+
+def test_ndjson_output(client):
+    response = client.post(
+        "/suggest-agents-extended?fields=agent_id",
+        json=extended_empire("Ndjson Output"),
+        headers={**FRESH, "Accept": "application/x-ndjson"}
+    )
+    assert response.headers["content-type"].startswith(NDJSON)
+    assert [json.loads(line) for line in response.text.splitlines()] == [{"agent_id": f"agent-{n}"} for n in range(3)]
+
+
+def test_msgpack_output(client):
+    msgpack = pytest.importorskip("msgpack")
+    response = client.post(
+        "/suggest-agents-extended",
+        json=extended_empire("Msgpack Output"),
+        headers={**FRESH, "Accept": "application/msgpack"}
+    )
+    assert response.headers["content-type"].startswith(MSGPACK)
+    assert msgpack.unpackb(response.content) == [
+        AgentSpecificationResponse(**sample_agent(n)).model_dump(mode="json") for n in range(3)
+    ]
+
+
+@pytest.mark.parametrize("encoding", ["gzip", "br"])
+def test_large_responses_are_compressed(client, upstream, encoding):
+    if encoding == "br":
+        pytest.importorskip("brotli")
+    upstream.agents = [sample_agent(n, f"ends: goal number {n}") for n in range(8)]
+    response = client.post(
+        "/suggest-agents-extended",
+        json=extended_empire(f"Compressed {encoding}"),
+        headers={**FRESH, "Accept-Encoding": encoding}
+    )
+    assert response.headers["content-encoding"] == encoding
+    assert len(response.json()) == 8
+
+    small = client.get("/health", headers={"Accept-Encoding": encoding})
+    assert "content-encoding" not in small.headers
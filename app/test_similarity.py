@@ -0,0 +1,105 @@
+"""MinHash LSH lookups: near-duplicates above the reuse threshold, misses below it.
+
+    python -m pytest app/test_similarity.py
+"""
+
+import os
+import subprocess
+import sys
+import pytest
+from app.conftest import REPO_DIR, extended_empire
+from app.config import settings
+from app.similarity import MinHashLSHIndex, jaccard_similarity, payload_text, shingle_hashes
+
+BASE = (
+    "A coalition of municipal governments building open data tools for participatory budgeting, "
+    "neighbourhood assemblies and transparent public procurement across the region. It trains "
+    "volunteers to run civic workshops, publishes plain-language summaries of council decisions "
+    "and maintains a shared registry of local service providers, grant programmes and meeting minutes."
+)
+NEAR = BASE.replace("meeting minutes", "meeting notes")
+EDITED = BASE.split(". ")[0] + ". It lobbies national parliaments for citizen juries."
+UNRELATED = "Deep sea mining consortium extracting polymetallic nodules with autonomous submarines."
+
+
+@pytest.fixture
+def index() -> MinHashLSHIndex:
+    index = MinHashLSHIndex(capacity=4)
+    index.add(BASE, "base")
+    return index
+
+
+def test_identical_text_scores_one(index):
+    assert index.query(BASE) == ("base", 1.0)
+
+
+def test_near_duplicate_is_reused(index):
+    key, similarity = index.query(NEAR)
+    assert key == "base"
+    assert similarity >= settings.SIMILARITY_THRESHOLD
+    assert similarity == pytest.approx(jaccard_similarity(BASE, NEAR), abs=0.1)
+
+
+def test_real_edit_is_not_reused(index):
+    match = index.query(EDITED)
+    assert match is None or match[1] < settings.SIMILARITY_THRESHOLD
+
+
+def test_unrelated_text_misses(index):
+    assert index.query(UNRELATED) is None
+    assert index.query("") is None
+
+
+def test_groups_are_isolated(index):
+    assert index.query(BASE, group="other") is None
+    index.add(BASE, "other-base", group="other")
+    assert index.query(BASE, group="other") == ("other-base", 1.0)
+    assert index.query(BASE) == ("base", 1.0)
+
+
+def test_oldest_entry_is_overwritten_when_full(index):
+    for number in range(4):
+        index.add(f"{UNRELATED} batch {number}", f"filler-{number}")
+    assert len(index) == 4
+    assert index.query(BASE) is None
+    assert index.query(f"{UNRELATED} batch 3")[0] == "filler-3"
+
+
+def test_adding_a_key_twice_keeps_one_entry(index):
+    index.add(NEAR, "base")
+    assert len(index) == 1
+    assert index.query(BASE) == ("base", 1.0)
+
+
+def test_payload_text_joins_nested_strings_in_field_order():
+    assert payload_text({"name": "Empire", "ends": ["a", "b"], "extra": {"means": ["c"]}}) == "Empire a b c"
+
+
+def test_shingle_hashes_are_stable_across_processes():
+    script = "from app.similarity import shingle_hashes; print(sorted(shingle_hashes('open civic tools').tolist()))"
+    outputs = {
+        subprocess.run(
+            [sys.executable, "-c", script], cwd=REPO_DIR, capture_output=True, text=True, check=True,
+            env={**os.environ, "PYTHONHASHSEED": seed}
+        ).stdout
+        for seed in ("1", "2")
+    }
+    assert outputs == {f"{sorted(shingle_hashes('open civic tools').tolist())}\n"}
+
+
+def test_identical_resubmit_is_an_exact_hit(client, upstream):
+    empire = extended_empire("Exact Resubmit")
+    # no-cache: other tests' payloads are near-duplicates of this one
+    first = client.post("/suggest-agents-extended", json=empire, headers={"Cache-Control": "no-cache"})
+    assert first.status_code == 200
+
+    second = client.post("/suggest-agents-extended", json=empire)
+    assert second.status_code == 200
+    assert second.headers["X-Cache-Status"] == "hit"
+    assert "X-Similar-To" not in second.headers
+    assert second.json() == first.json()
+    assert len(upstream.requests) == 1
+
+    fresh = client.post("/suggest-agents-extended", json=empire, headers={"Cache-Control": "no-cache"})
+    assert "X-Cache-Status" not in fresh.headers
+    assert len(upstream.requests) == 2
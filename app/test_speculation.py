@@ -0,0 +1,90 @@
+"""Speculative generations from drafts: restarts, claiming exactly once, and promotion of queued ones.
+
+    python -m pytest app/test_speculation.py
+"""
+
+import asyncio
+from app.conftest import extended_empire
+from app.inflight import InflightGenerations
+from app.speculation import SpeculativeGenerations
+
+DRAFT = "A network of neighbourhood assemblies running open civic tools for transparent municipal budgets"
+
+
+def speculations() -> SpeculativeGenerations:
+    return SpeculativeGenerations(InflightGenerations(), restart_similarity=0.8)
+
+
+def generation(gate: asyncio.Event, admitted: bool = True):
+    async def run(speculation):
+        speculation.admitted = admitted
+        await gate.wait()
+        return f"agents for {speculation.key}"
+    return run
+
+
+def test_speculation_is_claimed_exactly_once():
+    async def scenario():
+        registry, gate = speculations(), asyncio.Event()
+        status, speculation = registry.draft("session", "key", DRAFT, generation(gate))
+        assert status == "started"
+        await asyncio.sleep(0)
+        assert speculation.state == "running"
+
+        claimed = registry.claim("key")
+        assert claimed is speculation and claimed.claimed
+        assert registry.claim("key") is None
+        assert len(registry) == 0
+
+        gate.set()
+        assert await claimed.shared.task == "agents for key"
+
+    asyncio.run(scenario())
+
+
+def test_queued_speculation_is_cancelled_instead_of_claimed():
+    async def scenario():
+        registry = speculations()
+        _, speculation = registry.draft("session", "key", DRAFT, generation(asyncio.Event(), admitted=False))
+        await asyncio.sleep(0)
+        assert speculation.state == "queued"
+
+        assert registry.claim("key") is None
+        await asyncio.sleep(0)
+        assert speculation.shared.task.cancelled()
+        assert registry.claim("key") is None
+
+    asyncio.run(scenario())
+
+
+def test_small_edits_keep_the_speculation_and_large_ones_restart_it():
+    async def scenario():
+        registry, gate = speculations(), asyncio.Event()
+        _, first = registry.draft("session", "key", DRAFT, generation(gate))
+        assert registry.draft("session", "key", DRAFT, generation(gate)) == ("unchanged", first)
+        assert registry.draft("session", "key-2", DRAFT + " today", generation(gate)) == ("kept", first)
+
+        status, second = registry.draft("session", "key-3", "Deep sea mining consortium", generation(gate))
+        assert status == "restarted" and second is not first
+        await asyncio.sleep(0)
+        assert first.shared.task.cancelled()
+        assert registry.claim("key") is None
+        gate.set()
+
+    asyncio.run(scenario())
+
+
+def test_submit_receives_the_speculation_once(client, upstream, monkeypatch):
+    from app import main
+    monkeypatch.setattr(main.settings, "SPECULATION_ENABLED", True)
+    empire = extended_empire("Speculated Draft", means=["Mutual aid networks"])
+    response = client.post("/suggest-agents-extended/draft", json=empire, headers={"X-Draft-Session": "tab-1"})
+    assert response.status_code == 202
+    assert response.json()["status"] == "started"
+
+    first = client.post("/suggest-agents-extended", json=empire)
+    assert first.headers["X-Cache-Status"] == "speculative"
+    second = client.post("/suggest-agents-extended", json=empire)
+    assert second.headers["X-Cache-Status"] != "speculative"
+    assert second.json() == first.json()
+    assert len(upstream.requests) == 1
@@ -0,0 +1,72 @@
+"""Token budgeting: max_tokens and timeouts from the prompt, expected agents and calibration.
+
+    python -m pytest app/test_token_budget.py
+"""
+
+import pytest
+from app.token_budget import TokenBudgeter, TokenEstimator
+
+PROMPT = "Design an agent swarm for a civic empire. " * 50
+
+
+def budgeter(**overrides) -> TokenBudgeter:
+    options = dict(
+        estimator=TokenEstimator(),
+        max_tokens_cap=20000,
+        min_max_tokens=2048,
+        tokens_per_agent=550.0,
+        output_tokens_per_second=60.0,
+        headroom=1.25,
+        base_timeout=15.0,
+        min_timeout=30.0,
+        max_timeout=120.0,
+        min_agents=15,
+        max_agents=25,
+        agents_per_entry=1.5,
+    )
+    options.update(overrides)
+    return TokenBudgeter(**options)
+
+
+def test_budget_scales_with_agent_count_within_bounds():
+    tokens = budgeter()
+    small, large = tokens.budget(PROMPT, 2), tokens.budget(PROMPT, 25)
+    assert small.max_tokens == 2048
+    assert large.max_tokens == 17188
+    assert small.read_timeout < large.read_timeout <= 120.0
+    assert tokens.budget(PROMPT, 100).max_tokens == 20000
+
+
+def test_expected_agents_follow_request_size():
+    tokens = budgeter()
+    assert tokens.expected_agents(2) == 15
+    assert tokens.expected_agents(12) == 18
+    assert tokens.expected_agents(40) == 25
+
+
+def test_estimator_calibrates_towards_reported_usage():
+    estimator = TokenEstimator(smoothing=0.5)
+    raw = estimator.raw_estimate(PROMPT)
+    estimator.calibrate(PROMPT, raw * 2)
+    assert estimator.ratio == pytest.approx(1.5)
+    assert estimator.estimate(PROMPT) == pytest.approx(raw * 1.5, abs=1)
+
+
+def test_truncation_growth_is_clamped_and_recovers():
+    tokens = budgeter()
+    for _ in range(100):
+        tokens.observe(PROMPT, {"output_tokens": 20000}, agent_count=20, elapsed_seconds=60.0, truncated=True)
+    assert tokens.tokens_per_agent == pytest.approx(20000 / 1.25)
+
+    for _ in range(40):
+        tokens.observe(PROMPT, {"output_tokens": 11000}, agent_count=20, elapsed_seconds=60.0)
+    assert tokens.tokens_per_agent == pytest.approx(550, rel=0.05)
+    assert tokens.budget(PROMPT, 20).max_tokens < 20000
+
+
+def test_agents_per_entry_learns_only_from_complete_outputs():
+    tokens = budgeter()
+    tokens.observe(PROMPT, {"output_tokens": 5000}, agent_count=10, elapsed_seconds=10.0, truncated=True, entry_count=10)
+    assert tokens.agents_per_entry == 1.5
+    tokens.observe(PROMPT, {"output_tokens": 5000}, agent_count=10, elapsed_seconds=10.0, entry_count=10)
+    assert tokens.agents_per_entry == pytest.approx(1.4)
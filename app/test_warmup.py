@@ -0,0 +1,95 @@
+"""Startup warmup and the /ready probe.
+
+    python -m pytest app/test_warmup.py
+"""
+
+import asyncio
+import threading
+import time
+from app.warmup import Readiness, WarmupStep
+
+
+async def succeed():
+    return "ok"
+
+
+async def fail():
+    raise RuntimeError("no prompts")
+
+
+def test_ready_once_every_step_finished():
+    async def scenario():
+        readiness, gate = Readiness(timeout=5.0), asyncio.Event()
+        task = asyncio.create_task(readiness.run([
+            WarmupStep("fast", succeed, required=True),
+            WarmupStep("slow", gate.wait),
+        ]))
+        await asyncio.sleep(0.01)
+        assert not readiness.ready
+        assert readiness.as_dict()["status"] == "warming"
+        assert readiness.steps["fast"]["status"] == "done"
+
+        gate.set()
+        await task
+        assert readiness.ready
+        assert readiness.as_dict()["status"] == "ready"
+
+        readiness.stop()
+        assert not readiness.ready and readiness.as_dict()["status"] == "stopping"
+        readiness.reset()
+        assert readiness.as_dict() == {"status": "warming", "steps": {}}
+
+    asyncio.run(scenario())
+
+
+def test_only_required_failures_block_readiness():
+    async def scenario():
+        optional = Readiness()
+        await optional.run([WarmupStep("prompts", succeed, required=True), WarmupStep("extra", fail)])
+        assert optional.ready
+        assert optional.steps["extra"]["status"] == "failed"
+        assert optional.steps["extra"]["error"] == "no prompts"
+
+        required = Readiness()
+        await required.run([WarmupStep("prompts", fail, required=True)])
+        assert not required.ready
+        assert required.as_dict()["status"] == "failed"
+
+    asyncio.run(scenario())
+
+
+def test_slow_step_times_out():
+    async def scenario():
+        readiness = Readiness(timeout=0.01)
+        await readiness.run([WarmupStep("stuck", asyncio.Event().wait, required=True)])
+        assert not readiness.ready
+        assert readiness.steps["stuck"]["error"] == "TimeoutError"
+
+    asyncio.run(scenario())
+
+
+def test_ready_endpoint_reports_503_until_warmup_finished(upstream, monkeypatch):
+    from fastapi.testclient import TestClient
+    from app import main
+    monkeypatch.setattr(main.settings, "HISTORY_ENABLED", False)
+    gate = threading.Event()
+
+    async def held():
+        while not gate.is_set():
+            await asyncio.sleep(0.01)
+
+    monkeypatch.setattr(main, "warmup_steps", lambda: [WarmupStep("held", held, required=True)])
+    for _ in range(2):
+        # A second start in the same process warms up again from scratch
+        gate.clear()
+        with TestClient(main.app) as client:
+            response = client.get("/ready")
+            assert response.status_code == 503
+            assert response.json()["status"] == "warming"
+
+            gate.set()
+            deadline = time.monotonic() + 5
+            while client.get("/ready").status_code != 200 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert client.get("/ready").json()["status"] == "ready"
+            assert client.get("/health").status_code == 200
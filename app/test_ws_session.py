@@ -0,0 +1,207 @@
+"""Swarm-building WebSocket sessions against a stubbed, streaming Claude API.
+
+    python -m pytest app/test_ws_session.py
+"""
+
+import asyncio
+import json
+import os
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from app import claude_service, main
+from app.metrics import MetricsRegistry
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+EMPIRE = {
+    "empire_name_and_description": "Civic Commons. A network of neighbourhood assemblies running open civic tools",
+    "ends": ["Durable democratic coalitions", "Transparent municipal budgets"],
+    "means": ["Open source civic software"],
+    "principles": ["Radical transparency"],
+    "identity": ["Stewards of the commons"],
+    "resentments": ["Backroom deals"],
+    "emotions": ["Quiet determination"],
+}
+
+LINKS = [
+    "ends: durable democratic coalitions",
+    "ends: transparent municipal budgets",
+    "means: open source civic software",
+]
+
+# What the stub streams back: agents linked to these entries, one SSE chunk every `delay` seconds
+upstream = {"links": LINKS, "delay": 0.0, "requests": []}
+
+
+def sample_agent(index: int, link: str) -> dict:
+    return {
+        "agent_id": f"agent-{index}",
+        "agent_name": f"Agent {index} for {link}",
+        "agent_purpose_and_tasks": f"Serves {link}",
+        "linked_empire_need_or_component": link,
+        "suggested_technical_approach": "Python service",
+        "estimated_complexity_to_build": "Low",
+        "key_data_inputs": ["records"],
+        "key_data_outputs_or_actions": ["reports"],
+    }
+
+
+def sse(event: dict) -> bytes:
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n".encode()
+
+
+async def handler(request: httpx.Request) -> httpx.Response:
+    payload = json.loads(request.content)
+    upstream["requests"].append(payload)
+    agents = [sample_agent(index, link) for index, link in enumerate(upstream["links"])]
+    text = "```json\n" + json.dumps(agents, indent=1) + "\n```"
+    if not payload.get("stream"):
+        return httpx.Response(200, json={
+            "content": [{"type": "text", "text": text}],
+            "usage": {"input_tokens": 1000, "output_tokens": 300},
+            "stop_reason": "end_turn",
+        })
+
+    events = [{"type": "message_start", "message": {"usage": {"input_tokens": 1000, "output_tokens": 1}}}]
+    events += [
+        {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": text[i:i + 64]}}
+        for i in range(0, len(text), 64)
+    ]
+    events += [
+        {"type": "message_delta", "delta": {"stop_reason": "end_turn"}, "usage": {"output_tokens": 300}},
+        {"type": "message_stop"},
+    ]
+    delay = upstream["delay"]
+
+    async def body():
+        for event in events:
+            await asyncio.sleep(delay)
+            yield sse(event)
+
+    return httpx.Response(200, content=body(), headers={"content-type": "text/event-stream"})
+
+
+@pytest.fixture(scope="module")
+def client():
+    with pytest.MonkeyPatch.context() as patch:
+        patch.chdir(REPO_DIR)
+        patch.setattr(main.settings, "HISTORY_ENABLED", False)
+        patch.setattr(main.settings, "WARMUP_UPSTREAM_CONNECTIONS", 0)
+        claude_service._http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        with TestClient(main.app) as client:
+            yield client
+
+
+@pytest.fixture(autouse=True)
+def reset_upstream():
+    upstream.update(links=LINKS, delay=0.0, requests=[])
+
+
+def receive_until(ws, *types: str) -> list:
+    """Messages up to and including the first one of `types`."""
+    messages = []
+    while True:
+        message = ws.receive_json()
+        messages.append(message)
+        if message["type"] in types:
+            return messages
+
+
+def of_type(messages: list, message_type: str) -> list:
+    return [message for message in messages if message["type"] == message_type]
+
+
+def test_generate_streams_agents_then_done(client):
+    with client.websocket_connect("/ws/swarm?priority=interactive") as ws:
+        assert ws.receive_json()["type"] == "session"
+        ws.send_json({"type": "generate", "empire": EMPIRE, "request_id": "r1", "no_cache": True})
+        messages = receive_until(ws, "done", "error")
+
+    done = messages[-1]
+    assert done["type"] == "done" and done["mode"] == "full"
+    assert [agent["agent_id"] for agent in done["agents"]] == ["agent-0", "agent-1", "agent-2"]
+    assert done["etag"]
+    assert all(message.get("request_id") == "r1" for message in messages)
+    assert [message["index"] for message in of_type(messages, "agent")] == [0, 1, 2]
+    assert of_type(messages, "usage")[-1]["output_tokens"] == 300
+    assert {message["stage"] for message in of_type(messages, "progress")} >= {"queued", "generating"}
+    assert upstream["requests"][0]["stream"] is True
+
+
+def test_edit_regenerates_only_the_affected_agent(client):
+    edited = dict(EMPIRE, ends=["Durable democratic alliances", "Transparent municipal budgets"])
+    with client.websocket_connect("/ws/swarm") as ws:
+        ws.receive_json()
+        ws.send_json({"type": "generate", "empire": EMPIRE, "no_cache": True})
+        receive_until(ws, "done", "error")
+
+        upstream["links"] = ["ends: durable democratic alliances"]
+        ws.send_json({"type": "edit", "empire": edited, "request_id": "e1"})
+        messages = receive_until(ws, "done", "error")
+
+        ws.send_json({"type": "edit", "empire": edited})
+        unchanged = receive_until(ws, "done", "error")[-1]
+
+    done = messages[-1]
+    assert done["type"] == "done" and done["mode"] == "incremental"
+    assert done["regenerated"] == 1 and done["kept"] == 2
+    assert [message["replaces"] for message in of_type(messages, "agent")] == [0]
+    links = [agent["linked_empire_need_or_component"] for agent in done["agents"]]
+    assert sorted(links) == sorted(["ends: durable democratic alliances"] + LINKS[1:])
+    assert len(upstream["requests"]) == 2
+    assert unchanged["mode"] == "unchanged"
+
+
+def test_cancel_stops_the_running_job(client):
+    upstream["delay"] = 0.05
+    empire = dict(EMPIRE, ends=["Participatory budgeting in every ward"])
+    with client.websocket_connect("/ws/swarm") as ws:
+        ws.receive_json()
+        ws.send_json({"type": "generate", "empire": empire, "no_cache": True})
+        started = receive_until(ws, "agent", "done", "error")
+        assert started[-1]["type"] == "agent"
+
+        ws.send_json({"type": "cancel"})
+        messages = receive_until(ws, "cancelled", "done", "error")
+        assert messages[-1]["type"] == "cancelled"
+
+        # Nothing is running any more, so a second cancel is not acknowledged
+        upstream["delay"] = 0.0
+        ws.send_json({"type": "cancel"})
+        ws.send_json({"type": "generate", "empire": empire, "no_cache": True})
+        after = receive_until(ws, "done", "error")
+
+    assert not of_type(after, "cancelled")
+    assert after[-1]["type"] == "done" and after[-1]["mode"] == "full"
+
+
+def test_invalid_messages_are_rejected(client):
+    with client.websocket_connect("/ws/swarm") as ws:
+        ws.receive_json()
+        ws.send_text("not json")
+        assert ws.receive_json()["status"] == 400
+        ws.send_json({"type": "rename"})
+        assert ws.receive_json()["status"] == 400
+        ws.send_json({"type": "generate", "empire": {"ends": []}, "request_id": "bad"})
+        error = ws.receive_json()
+        assert error["status"] == 422 and error["request_id"] == "bad"
+
+
+def test_unknown_message_types_share_one_metric_label(client):
+    hostile = 'x"} 1\nfake_metric{a="'
+    with client.websocket_connect("/ws/swarm") as ws:
+        ws.receive_json()
+        ws.send_json({"type": hostile})
+        ws.receive_json()
+        ws.send_json({"type": ["list"]})
+        ws.receive_json()
+    exposition = client.get("/metrics").text
+    assert 'ws_messages_total{type="invalid"}' in exposition
+    assert "fake_metric" not in exposition
+
+
+def test_label_values_are_escaped():
+    registry = MetricsRegistry()
+    registry.inc("requests_total", path='a\\b"c\nd')
+    assert 'requests_total{path="a\\\\b\\"c\\nd"} 1' in registry.render()
@@ -0,0 +1,171 @@
+"""Local token estimation and max_tokens/timeout budgeting for Claude requests."""
+
+import logging
+import math
+import re
+from dataclasses import dataclass
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Words, numbers and single punctuation marks roughly track BPE token boundaries
+_TOKEN_PIECE_RE = re.compile(r"\w+|[^\w\s]")
+
+
+class TokenEstimator:
+    """
+    Offline token counter.
+
+    Uses a word/punctuation heuristic scaled by a correction ratio that is
+    learned from the `usage.input_tokens` reported by the Claude API.
+    """
+
+    def __init__(self, smoothing: float = 0.2):
+        self.smoothing = smoothing
+        self.ratio = 1.0
+
+    @staticmethod
+    def raw_estimate(text: str) -> int:
+        """Uncalibrated estimate: long words split into several tokens, punctuation is one each."""
+        count = 0
+        for piece in _TOKEN_PIECE_RE.findall(text):
+            count += max(1, math.ceil(len(piece) / 6)) if piece[0].isalnum() else 1
+        return count
+
+    def estimate(self, text: str) -> int:
+        """Calibrated token estimate for `text`."""
+        return math.ceil(self.raw_estimate(text) * self.ratio)
+
+    def calibrate(self, text: str, actual_tokens: int) -> None:
+        """Move the correction ratio towards the observed tokens-per-estimate for `text`."""
+        raw = self.raw_estimate(text)
+        if raw <= 0 or actual_tokens <= 0:
+            return
+        observed = actual_tokens / raw
+        self.ratio += self.smoothing * (observed - self.ratio)
+
+
+@dataclass
+class RequestBudget:
+    """Per-request limits sent to the Claude API."""
+    input_tokens: int
+    max_tokens: int
+    read_timeout: float
+
+
+class TokenBudgeter:
+    """
+    Sizes `max_tokens` and the read timeout of a generation request.
+
+    Output size is predicted as expected agent count times tokens per agent,
+    and the timeout from the predicted output size and the observed output
+    throughput. Without an explicit count, the agent count is predicted from
+    the size of the request (its number of list entries) with a learned
+    agents-per-entry rate. All rates are calibrated from upstream `usage`
+    numbers and returned agent counts.
+    """
+
+    def __init__(
+        self,
+        estimator: TokenEstimator,
+        max_tokens_cap: int,
+        min_max_tokens: int,
+        tokens_per_agent: float,
+        output_tokens_per_second: float,
+        headroom: float,
+        base_timeout: float,
+        min_timeout: float,
+        max_timeout: float,
+        min_agents: int = 1,
+        max_agents: int = 25,
+        agents_per_entry: float = 1.5,
+        smoothing: float = 0.2
+    ):
+        self.estimator = estimator
+        self.max_tokens_cap = max_tokens_cap
+        self.min_max_tokens = min_max_tokens
+        self.tokens_per_agent = tokens_per_agent
+        self.output_tokens_per_second = output_tokens_per_second
+        self.headroom = headroom
+        self.base_timeout = base_timeout
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.min_agents = min_agents
+        self.max_agents = max_agents
+        self.agents_per_entry = agents_per_entry
+        self.smoothing = smoothing
+
+    def expected_agents(self, entry_count: int) -> int:
+        """Agents a full generation is expected to return for a request with `entry_count` list entries."""
+        predicted = math.ceil(entry_count * self.agents_per_entry)
+        return int(min(self.max_agents, max(self.min_agents, predicted)))
+
+    def budget(self, prompt: str, agent_count: int) -> RequestBudget:
+        """
+        Compute limits for a prompt expected to yield `agent_count` agents.
+
+        Args:
+            prompt: Final prompt text sent to the model
+            agent_count: Upper bound of agents the prompt asks for
+
+        Returns:
+            RequestBudget with estimated input tokens, max_tokens and read timeout
+        """
+        input_tokens = self.estimator.estimate(prompt)
+        expected_output = agent_count * self.tokens_per_agent * self.headroom
+        max_tokens = int(min(self.max_tokens_cap, max(self.min_max_tokens, math.ceil(expected_output))))
+
+        # Input is processed far faster than output; count it at a tenth of the output rate
+        generation_seconds = (max_tokens + input_tokens / 10) / self.output_tokens_per_second
+        read_timeout = min(self.max_timeout, max(self.min_timeout, self.base_timeout + generation_seconds))
+        return RequestBudget(input_tokens=input_tokens, max_tokens=max_tokens, read_timeout=read_timeout)
+
+    def observe(
+        self,
+        prompt: str,
+        usage: dict,
+        agent_count: int,
+        elapsed_seconds: float,
+        truncated: bool = False,
+        entry_count: Optional[int] = None
+    ) -> None:
+        """
+        Calibrate from a completed request.
+
+        Args:
+            prompt: Prompt that was sent
+            usage: The `usage` object from the Claude API response
+            agent_count: Number of agents actually returned
+            elapsed_seconds: Wall time of the upstream call
+            truncated: Whether generation stopped at max_tokens
+            entry_count: List entries of the request, for requests whose agent
+                count was predicted (None when the prompt asked for an exact count)
+        """
+        input_tokens = usage.get("input_tokens") or 0
+        output_tokens = usage.get("output_tokens") or 0
+        if input_tokens:
+            self.estimator.calibrate(prompt, input_tokens)
+
+        if truncated:
+            # Output was cut off, so per-agent size is a lower bound: grow it, but
+            # not past the size at which a single agent already fills max_tokens_cap
+            self.tokens_per_agent = min(
+                self.tokens_per_agent * (1.0 + self.smoothing),
+                self.max_tokens_cap / self.headroom
+            )
+        elif output_tokens and agent_count:
+            observed = output_tokens / agent_count
+            self.tokens_per_agent += self.smoothing * (observed - self.tokens_per_agent)
+        if entry_count and agent_count and not truncated:
+            observed = agent_count / entry_count
+            self.agents_per_entry += self.smoothing * (observed - self.agents_per_entry)
+
+        # Small outputs are dominated by time-to-first-token and would skew the rate
+        if output_tokens >= 256 and elapsed_seconds >= 1.0:
+            observed_rate = output_tokens / elapsed_seconds
+            self.output_tokens_per_second += self.smoothing * (observed_rate - self.output_tokens_per_second)
+
+        logger.info(
+            "Token budget calibrated: ratio=%.3f tokens_per_agent=%.0f agents_per_entry=%.2f output_tps=%.1f",
+            self.estimator.ratio, self.tokens_per_agent, self.agents_per_entry, self.output_tokens_per_second
+        )
@@ -0,0 +1,89 @@
+"""Startup warmup steps and readiness tracking."""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from app.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+metrics.describe("ready", "1 once startup warmup has finished and the server takes traffic")
+metrics.describe("warmup_seconds", "Duration of each startup warmup step")
+
+
+@dataclass
+class WarmupStep:
+    """One warmup action. Failures of steps that are not `required` do not block readiness."""
+    name: str
+    run: Callable[[], Awaitable[Any]]
+    required: bool = False
+
+
+class Readiness:
+    """
+    Runs warmup steps concurrently and reports readiness.
+
+    Ready once every step has finished and no required step failed;
+    not ready again once shutdown starts.
+    """
+
+    def __init__(self, timeout: float = 30.0):
+        self.timeout = timeout
+        self.reset()
+
+    def reset(self) -> None:
+        """Forget a previous run and shutdown (the app can be started again in one process)."""
+        self.ready = False
+        self.stopping = False
+        self.steps: Dict[str, dict] = {}
+        self.finished_at: Optional[float] = None
+        metrics.set_gauge("ready", 0)
+
+    async def _run_step(self, step: WarmupStep) -> bool:
+        started_at = time.monotonic()
+        try:
+            result = await asyncio.wait_for(step.run(), timeout=self.timeout)
+        except Exception as e:
+            outcome = {"status": "failed", "error": str(e) or type(e).__name__}
+            logger.warning("Warmup step %s failed: %s", step.name, outcome["error"])
+        else:
+            outcome = {"status": "done"}
+            if result is not None:
+                outcome["result"] = result
+        outcome["seconds"] = round(time.monotonic() - started_at, 3)
+        outcome["required"] = step.required
+        self.steps[step.name] = outcome
+        metrics.set_gauge("warmup_seconds", outcome["seconds"], step=step.name)
+        return outcome["status"] == "done" or not step.required
+
+    async def run(self, steps: List[WarmupStep]) -> None:
+        """Run `steps` and mark the server ready if all required ones succeeded."""
+        for step in steps:
+            self.steps[step.name] = {"status": "running", "required": step.required}
+        results = await asyncio.gather(*(self._run_step(step) for step in steps))
+        self.finished_at = time.time()
+        if all(results) and not self.stopping:
+            self.ready = True
+            metrics.set_gauge("ready", 1)
+            logger.info("Warmup finished, ready for traffic")
+        else:
+            logger.error("Warmup failed, not ready: %s", self.steps)
+
+    def stop(self) -> None:
+        """Report not ready from now on (shutdown in progress)."""
+        self.stopping = True
+        self.ready = False
+        metrics.set_gauge("ready", 0)
+
+    def as_dict(self) -> dict:
+        if self.ready:
+            status = "ready"
+        elif self.stopping:
+            status = "stopping"
+        elif self.finished_at is not None:
+            status = "failed"
+        else:
+            status = "warming"
+        return {"status": status, "steps": self.steps}
@@ -113,13 +113,98 @@ function collectFormData() {
     return formData;
 }
 
+// Build the card for one agent
+function createAgentCard(agent, index) {
+    const agentCard = document.createElement('div');
+    agentCard.className = 'agent-card';
+    agentCard.style.animationDelay = `${Math.min(index, 10) * 0.1}s`;
+    
+    const complexityClass = agent.estimated_complexity_to_build ? agent.estimated_complexity_to_build.toLowerCase() : 'medium';
+    
+    agentCard.innerHTML = `
+        <h3>${agent.agent_name || 'Unnamed Agent'}</h3>
+        <div class="agent-id">${agent.agent_id || 'No ID'}</div>
+        
+        <div class="agent-detail">
+            <strong>purpose & tasks:</strong> ${agent.agent_purpose_and_tasks || 'No description'}
+        </div>
+        
+        <div class="agent-detail">
+            <strong>empire component:</strong> ${agent.linked_empire_need_or_component || 'Not specified'}
+        </div>
+        
+        <div class="agent-detail">
+            <span class="complexity-badge complexity-${complexityClass}">${agent.estimated_complexity_to_build || 'Medium'}</span>
+        </div>
+        
+        <div class="agent-detail">
+            <strong>technical approach:</strong> ${agent.suggested_technical_approach || 'Not specified'}
+        </div>
+        
+        <div class="agent-detail">
+            <strong>key inputs:</strong>
+            <ul class="agent-list">
+                ${agent.key_data_inputs && agent.key_data_inputs.length > 0 
+                    ? agent.key_data_inputs.map(input => `<li>${input}</li>`).join('')
+                    : '<li>None specified</li>'}
+            </ul>
+        </div>
+        
+        <div class="agent-detail">
+            <strong>key outputs/actions:</strong>
+            <ul class="agent-list">
+                ${agent.key_data_outputs_or_actions && agent.key_data_outputs_or_actions.length > 0
+                    ? agent.key_data_outputs_or_actions.map(output => `<li>${output}</li>`).join('')
+                    : '<li>None specified</li>'}
+            </ul>
+        </div>
+        
+        ${agent.potential_dependencies_or_integrations && agent.potential_dependencies_or_integrations.length > 0 ? `
+        <div class="agent-detail">
+            <strong>dependencies/integrations:</strong>
+            <ul class="agent-list">
+                ${agent.potential_dependencies_or_integrations.map(dep => `<li>${dep}</li>`).join('')}
+            </ul>
+        </div>
+        ` : ''}
+    `;
+    return agentCard;
+}
+
+// Cards are created in batches as the list scrolls into view, so hundreds of agents do not block the page
+const RENDER_BATCH_SIZE = 30;
+let renderObserver = null;
+
+function renderAgentCard(agent, index) {
+    try {
+        return createAgentCard(agent, index);
+    } catch (error) {
+        console.error(`Error creating card for agent ${index + 1}:`, error);
+        console.error('Agent data that caused error:', agent);
+        
+        // Create error card
+        const errorCard = document.createElement('div');
+        errorCard.className = 'agent-card';
+        errorCard.style.backgroundColor = '#ffeeee';
+        errorCard.innerHTML = `
+            <h3>Error rendering agent ${index + 1}</h3>
+            <p>error: ${error.message}</p>
+            <p>agent id: ${agent.agent_id || 'Unknown'}</p>
+        `;
+        return errorCard;
+    }
+}
+
 // Display results
 function displayResults(agents) {
-    console.log('displayResults called with agents:', agents);
     console.log('Number of agents received:', agents ? agents.length : 0);
     
     const resultsContent = document.getElementById('resultsContent');
     resultsContent.innerHTML = '';
+    if (renderObserver) {
+        renderObserver.disconnect();
+        renderObserver = null;
+    }
     
     if (!agents || agents.length === 0) {
         resultsContent.innerHTML = '<p>No agents were generated. Please try again.</p>';
@@ -132,93 +217,50 @@ function displayResults(agents) {
     summary.innerHTML = `<p><strong>Generated ${agents.length} agents</strong></p>`;
     resultsContent.appendChild(summary);
     
-    let successCount = 0;
-    let errorCount = 0;
+    const sentinel = document.createElement('div');
+    resultsContent.appendChild(sentinel);
+    let rendered = 0;
     
-    agents.forEach((agent, index) => {
-        try {
-            console.log(`Creating card for agent ${index + 1}:`, agent.agent_name);
-            
-            const agentCard = document.createElement('div');
-            agentCard.className = 'agent-card';
-            agentCard.style.animationDelay = `${index * 0.1}s`;
-            
-            const complexityClass = agent.estimated_complexity_to_build ? agent.estimated_complexity_to_build.toLowerCase() : 'medium';
-            
-            agentCard.innerHTML = `
-                <h3>${agent.agent_name || 'Unnamed Agent'}</h3>
-                <div class="agent-id">${agent.agent_id || 'No ID'}</div>
-                
-                <div class="agent-detail">
-                    <strong>purpose & tasks:</strong> ${agent.agent_purpose_and_tasks || 'No description'}
-                </div>
-                
-                <div class="agent-detail">
-                    <strong>empire component:</strong> ${agent.linked_empire_need_or_component || 'Not specified'}
-                </div>
-                
-                <div class="agent-detail">
-                    <span class="complexity-badge complexity-${complexityClass}">${agent.estimated_complexity_to_build || 'Medium'}</span>
-                </div>
-                
-                <div class="agent-detail">
-                    <strong>technical approach:</strong> ${agent.suggested_technical_approach || 'Not specified'}
-                </div>
-                
-                <div class="agent-detail">
-                    <strong>key inputs:</strong>
-                    <ul class="agent-list">
-                        ${agent.key_data_inputs && agent.key_data_inputs.length > 0 
-                            ? agent.key_data_inputs.map(input => `<li>${input}</li>`).join('')
-                            : '<li>None specified</li>'}
-                    </ul>
-                </div>
-                
-                <div class="agent-detail">
-                    <strong>key outputs/actions:</strong>
-                    <ul class="agent-list">
-                        ${agent.key_data_outputs_or_actions && agent.key_data_outputs_or_actions.length > 0
-                            ? agent.key_data_outputs_or_actions.map(output => `<li>${output}</li>`).join('')
-                            : '<li>None specified</li>'}
-                    </ul>
-                </div>
-                
-                ${agent.potential_dependencies_or_integrations && agent.potential_dependencies_or_integrations.length > 0 ? `
-                <div class="agent-detail">
-                    <strong>dependencies/integrations:</strong>
-                    <ul class="agent-list">
-                        ${agent.potential_dependencies_or_integrations.map(dep => `<li>${dep}</li>`).join('')}
-                    </ul>
-                </div>
-                ` : ''}
-            `;
-            
-            resultsContent.appendChild(agentCard);
-            successCount++;
-            console.log(`Successfully created card ${successCount}`);
-        } catch (error) {
-            errorCount++;
-            console.error(`Error creating card for agent ${index + 1}:`, error);
-            console.error('Agent data that caused error:', agent);
-            
-            // Create error card
-            const errorCard = document.createElement('div');
-            errorCard.className = 'agent-card';
-            errorCard.style.backgroundColor = '#ffeeee';
-            errorCard.innerHTML = `
-                <h3>Error rendering agent ${index + 1}</h3>
-                <p>error: ${error.message}</p>
-                <p>agent id: ${agent.agent_id || 'Unknown'}</p>
-            `;
-            resultsContent.appendChild(errorCard);
+    function renderBatch() {
+        const fragment = document.createDocumentFragment();
+        const end = Math.min(rendered + RENDER_BATCH_SIZE, agents.length);
+        for (; rendered < end; rendered++) {
+            const card = renderAgentCard(agents[rendered], rendered);
+            if (rendered >= RENDER_BATCH_SIZE) {
+                card.style.animationDelay = '0s';
+            }
+            fragment.appendChild(card);
         }
-    });
-    
-    console.log(`Display complete. Success: ${successCount}, Errors: ${errorCount}`);
+        resultsContent.insertBefore(fragment, sentinel);
+        if (rendered >= agents.length) {
+            if (renderObserver) {
+                renderObserver.disconnect();
+                renderObserver = null;
+            }
+            sentinel.remove();
+        }
+    }
     
-    // Check if cards are actually visible
-    const cards = resultsContent.querySelectorAll('.agent-card');
-    console.log(`Cards found in DOM: ${cards.length}`);
+    if (!('IntersectionObserver' in window)) {
+        while (rendered < agents.length) {
+            renderBatch();
+        }
+        return;
+    }
+    renderObserver = new IntersectionObserver(entries => {
+        if (entries.some(entry => entry.isIntersecting)) {
+            renderBatch();
+            if (renderObserver) {
+                // Re-observing reports the sentinel's new position, in case it is still in view
+                renderObserver.unobserve(sentinel);
+                renderObserver.observe(sentinel);
+            }
+        }
+    }, { rootMargin: '1500px 0px' });
+    renderBatch();
+    if (renderObserver) {
+        renderObserver.observe(sentinel);
+    }
 }
 
 // Display error
@@ -229,60 +271,396 @@ function displayError(message) {
 
 // Start new empire
 function startNewEmpire() {
+    cancelGeneration();
+    currentAgents = [];
     document.getElementById('empireForm').reset();
+    document.getElementById('submitBtn').textContent = 'Generate Agent Swarm';
     document.getElementById('results').style.display = 'none';
     document.getElementById('empireForm').style.display = 'block';
     window.scrollTo(0, 0);
 }
 
+// Edit the current empire; the next submission only regenerates affected agents
+function editEmpire() {
+    document.getElementById('submitBtn').textContent = 'Update Agent Swarm';
+    document.getElementById('results').style.display = 'none';
+    document.getElementById('empireForm').style.display = 'block';
+    window.scrollTo(0, 0);
+}
+
+// Browser-side result cache (IndexedDB), keyed by a hash of the normalized form payload
+const RESULT_DB_NAME = 'empire-builder';
+const RESULT_STORE = 'swarms';
+const RESULT_CACHE_MAX_ENTRIES = 50;
+const FIELD_TYPES = ['ends', 'means', 'principles', 'identity', 'resentments', 'emotions'];
+let resultDbPromise = null;
+
+function openResultDb() {
+    if (!window.indexedDB) {
+        return Promise.resolve(null);
+    }
+    if (!resultDbPromise) {
+        resultDbPromise = new Promise(resolve => {
+            const request = indexedDB.open(RESULT_DB_NAME, 1);
+            request.onupgradeneeded = () => {
+                const store = request.result.createObjectStore(RESULT_STORE, { keyPath: 'key' });
+                store.createIndex('storedAt', 'storedAt');
+            };
+            request.onsuccess = () => resolve(request.result);
+            // E.g. private browsing: work without the cache
+            request.onerror = () => resolve(null);
+        });
+    }
+    return resultDbPromise;
+}
+
+// Same canonical form as the server's input normalization: NFKC, collapsed whitespace, no repeated entries
+function normalizeText(text) {
+    return text.normalize('NFKC').replace(/\s+/g, ' ').trim();
+}
+
+function normalizedPayload(formData) {
+    const normalized = { empire_name_and_description: normalizeText(formData.empire_name_and_description) };
+    FIELD_TYPES.forEach(fieldType => {
+        const seen = new Set();
+        normalized[fieldType] = formData[fieldType].map(normalizeText).filter(entry => {
+            const key = entry.toLowerCase();
+            if (!entry || seen.has(key)) {
+                return false;
+            }
+            seen.add(key);
+            return true;
+        });
+    });
+    return normalized;
+}
+
+async function payloadKey(formData) {
+    const text = JSON.stringify(normalizedPayload(formData));
+    if (!(window.crypto && crypto.subtle)) {
+        return text; // Not a secure context: the payload itself is the key
+    }
+    const digest = await crypto.subtle.digest('SHA-256', new TextEncoder().encode(text));
+    return Array.from(new Uint8Array(digest), byte => byte.toString(16).padStart(2, '0')).join('');
+}
+
+async function readCachedSwarm(key) {
+    const db = await openResultDb();
+    if (!db) {
+        return null;
+    }
+    return new Promise(resolve => {
+        const request = db.transaction(RESULT_STORE).objectStore(RESULT_STORE).get(key);
+        request.onsuccess = () => resolve(request.result || null);
+        request.onerror = () => resolve(null);
+    });
+}
+
+async function storeCachedSwarm(key, agents, etag) {
+    const db = await openResultDb();
+    if (!db || !key || !agents) {
+        return;
+    }
+    const store = db.transaction(RESULT_STORE, 'readwrite').objectStore(RESULT_STORE);
+    store.put({ key, agents, etag, storedAt: Date.now() });
+    // Keep only the most recently stored swarms
+    const countRequest = store.count();
+    countRequest.onsuccess = () => {
+        let excess = countRequest.result - RESULT_CACHE_MAX_ENTRIES;
+        if (excess <= 0) {
+            return;
+        }
+        store.index('storedAt').openCursor().onsuccess = event => {
+            const cursor = event.target.result;
+            if (cursor && excess-- > 0) {
+                cursor.delete();
+                cursor.continue();
+            }
+        };
+    };
+}
+
+// Swarm-building session over a WebSocket, kept open across generations and edits
+let swarmSocket = null;
+let currentAgents = [];
+let activeRequestId = null;
+// Cache key of the active request's payload, and whether it only revalidates a cached swarm
+let activeCacheKey = null;
+let activeRevalidation = false;
+let forceRegenerate = false;
+
+function connectSwarmSession() {
+    if (swarmSocket && swarmSocket.readyState === WebSocket.OPEN) {
+        return Promise.resolve(swarmSocket);
+    }
+    return new Promise((resolve, reject) => {
+        const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+        const socket = new WebSocket(`${protocol}//${window.location.host}/ws/swarm?priority=interactive`);
+        socket.onopen = () => {
+            swarmSocket = socket;
+            resolve(socket);
+        };
+        socket.onerror = () => reject(new Error('Could not open a swarm session'));
+        socket.onclose = () => {
+            if (swarmSocket === socket) {
+                swarmSocket = null;
+                // A new session starts without the server-side swarm, so the next submission is a full generation
+                if (activeRequestId) {
+                    finishGeneration();
+                    displayError('Error: Connection to the server was lost');
+                }
+            }
+        };
+        socket.onmessage = event => handleSessionMessage(JSON.parse(event.data));
+    });
+}
+
+function setStreamStatus(text) {
+    document.getElementById('streamStatusText').textContent = text;
+}
+
+function finishGeneration() {
+    activeRequestId = null;
+    activeRevalidation = false;
+    document.getElementById('streamStatus').style.display = 'none';
+    document.getElementById('submitBtn').disabled = false;
+}
+
+function cancelGeneration() {
+    if (activeRequestId && swarmSocket) {
+        swarmSocket.send(JSON.stringify({ type: 'cancel' }));
+    }
+}
+
+// Show or replace one streamed agent card
+function showStreamedAgent(message) {
+    const resultsContent = document.getElementById('resultsContent');
+    const cards = resultsContent.querySelectorAll('.agent-card');
+    const card = createAgentCard(message.agent, message.index);
+    card.style.animationDelay = '0s';
+    const target = 'replaces' in message ? message.replaces : null;
+    if (target !== null && target !== undefined && cards[target]) {
+        cards[target].replaceWith(card);
+    } else {
+        resultsContent.appendChild(card);
+    }
+}
+
+function handleSessionMessage(message) {
+    if (message.request_id && message.request_id !== activeRequestId) {
+        return; // Late message of a superseded request
+    }
+    switch (message.type) {
+        case 'progress':
+            if (message.stage === 'queued') {
+                setStreamStatus('Waiting for a free generation slot...');
+            } else if (message.stage === 'speculative') {
+                setStreamStatus('Finishing the generation started from your draft...');
+            } else {
+                setStreamStatus(`Generating agents... ${message.received} of about ${message.expected}`);
+            }
+            break;
+        case 'usage':
+            console.log('Token usage:', message.input_tokens, 'in /', message.output_tokens, 'out');
+            break;
+        case 'agent':
+            showStreamedAgent(message);
+            break;
+        case 'done':
+            if (message.mode === 'not_modified') {
+                console.log('Cached swarm is up to date');
+            } else {
+                console.log(`Swarm ready (${message.mode}):`, message.agents.length, 'agents');
+                currentAgents = message.agents;
+                displayResults(message.agents);
+            }
+            storeCachedSwarm(activeCacheKey, currentAgents, message.etag);
+            finishGeneration();
+            break;
+        case 'cancelled':
+            finishGeneration();
+            displayResults(currentAgents);
+            break;
+        case 'error':
+            if (activeRevalidation) {
+                // The server has no stored result to compare with: keep showing the cached swarm
+                finishGeneration();
+                break;
+            }
+            if (message.request_id || activeRequestId) {
+                finishGeneration();
+                const detail = typeof message.detail === 'string' ? message.detail : JSON.stringify(message.detail);
+                const retry = message.retry_after ? ` (retry in ${message.retry_after}s)` : '';
+                displayError(`Error: ${detail}${retry}`);
+            }
+            break;
+    }
+}
+
+// Speculative mode: debounced drafts let the server start generating before submit
+const SPECULATION_DEBOUNCE_MS = 1500;
+const draftSessionId = (window.crypto && crypto.randomUUID) ? crypto.randomUUID() : String(Date.now());
+let draftTimer = null;
+let lastDraft = null;
+let speculationAvailable = true;
+
+function isDraftComplete(formData) {
+    return formData.empire_name_and_description.length > 0 &&
+        FIELD_TYPES.every(field => formData[field].length > 0);
+}
+
+async function sendDraft() {
+    const formData = collectFormData();
+    const draft = JSON.stringify(formData);
+    if (!isDraftComplete(formData) || draft === lastDraft) {
+        return;
+    }
+    lastDraft = draft;
+    try {
+        const response = await fetch('/suggest-agents-extended/draft', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-Draft-Session': draftSessionId,
+            },
+            body: draft
+        });
+        const result = await response.json();
+        if (result.status === 'disabled') {
+            speculationAvailable = false;
+        }
+        console.log('Draft speculation:', result.status, result.state);
+    } catch (error) {
+        console.warn('Could not send draft:', error);
+    }
+}
+
+function scheduleDraft() {
+    // Edits of an existing swarm go through delta regeneration instead
+    if (!speculationAvailable || currentAgents.length > 0 || !document.getElementById('speculativeMode').checked) {
+        return;
+    }
+    clearTimeout(draftTimer);
+    draftTimer = setTimeout(sendDraft, SPECULATION_DEBOUNCE_MS);
+}
+
+document.addEventListener('DOMContentLoaded', function() {
+    const toggle = document.getElementById('speculativeMode');
+    toggle.checked = localStorage.getItem('speculativeMode') === 'on';
+    toggle.addEventListener('change', () => {
+        localStorage.setItem('speculativeMode', toggle.checked ? 'on' : 'off');
+        scheduleDraft();
+    });
+    document.getElementById('empireForm').addEventListener('input', scheduleDraft);
+});
+
+// Fallback for browsers or proxies without WebSocket support; a cached swarm is only revalidated
+async function generateOverHttp(formData, cached, regenerate) {
+    const headers = {
+        'Content-Type': 'application/json',
+        'X-Priority': 'interactive',
+    };
+    if (cached) {
+        headers['If-None-Match'] = cached.etag;
+        headers['Cache-Control'] = 'only-if-cached';
+    } else if (regenerate) {
+        headers['Cache-Control'] = 'no-cache';
+    }
+    const response = await fetch('/suggest-agents-extended', {
+        method: 'POST',
+        headers,
+        body: JSON.stringify(formData)
+    });
+    
+    if (cached && (response.status === 304 || response.status === 504)) {
+        return { agents: cached.agents, etag: cached.etag };
+    }
+    if (!response.ok) {
+        const errorData = await response.json();
+        throw new Error(errorData.detail || `Server error: ${response.status}`);
+    }
+    return { agents: await response.json(), etag: response.headers.get('ETag') };
+}
+
+// Generate again, bypassing the browser cache and reuse of similar results
+function regenerateSwarm() {
+    forceRegenerate = true;
+    currentAgents = [];
+    document.getElementById('submitBtn').textContent = 'Generate Agent Swarm';
+    document.getElementById('empireForm').requestSubmit();
+}
+
 // Handle form submission
 document.getElementById('empireForm').addEventListener('submit', async function(e) {
     e.preventDefault();
     
     const submitBtn = document.getElementById('submitBtn');
-    const loading = document.getElementById('loading');
+    const formData = collectFormData();
+    const isEdit = currentAgents.length > 0;
+    const regenerate = forceRegenerate;
+    forceRegenerate = false;
     
-    // Disable submit button and show loading
     submitBtn.disabled = true;
-    loading.style.display = 'flex';
+    clearTimeout(draftTimer);
     
+    // A swarm cached for this exact payload is shown at once and only revalidated
+    const cacheKey = await payloadKey(formData);
+    const cached = isEdit || regenerate ? null : await readCachedSwarm(cacheKey);
+    
+    // Hide form and show results, which fill in as agents arrive
+    document.getElementById('empireForm').style.display = 'none';
+    document.getElementById('results').style.display = 'block';
+    if (cached) {
+        currentAgents = cached.agents;
+        displayResults(cached.agents);
+    } else if (!isEdit) {
+        document.getElementById('resultsContent').innerHTML = '';
+    }
+    
+    let socket = null;
     try {
-        const formData = collectFormData();
-        
-        const response = await fetch('/suggest-agents-extended', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-            },
-            body: JSON.stringify(formData)
-        });
-        
-        if (!response.ok) {
-            const errorData = await response.json();
-            throw new Error(errorData.detail || `Server error: ${response.status}`);
+        socket = await connectSwarmSession();
+    } catch (error) {
+        console.warn('WebSocket unavailable, falling back to HTTP:', error);
+    }
+    
+    if (socket) {
+        activeRequestId = (window.crypto && crypto.randomUUID) ? crypto.randomUUID() : String(Date.now());
+        activeCacheKey = cacheKey;
+        activeRevalidation = Boolean(cached);
+        if (cached) {
+            submitBtn.disabled = false;
+        } else {
+            document.getElementById('streamStatus').style.display = 'flex';
+            setStreamStatus('Analyzing your empire...');
         }
-        
-        const agents = await response.json();
-        
-        console.log('Response received from server:');
-        console.log('Type:', typeof agents);
-        console.log('Is Array:', Array.isArray(agents));
-        console.log('Length:', agents.length);
-        console.log('First few agents:', agents.slice(0, 3));
-        
-        // Hide form and show results
-        document.getElementById('empireForm').style.display = 'none';
-        document.getElementById('results').style.display = 'block';
-        
-        displayResults(agents);
-        
+        const message = {
+            type: isEdit ? 'edit' : 'generate',
+            request_id: activeRequestId,
+            empire: formData
+        };
+        if (cached) {
+            // Confirms the cached swarm, or brings the server's newer one; never starts a generation
+            message.if_none_match = cached.etag;
+            message.only_if_cached = true;
+        } else if (regenerate) {
+            message.no_cache = true;
+        }
+        socket.send(JSON.stringify(message));
+        return;
+    }
+    
+    const loading = document.getElementById('loading');
+    loading.style.display = cached ? 'none' : 'flex';
+    try {
+        const result = await generateOverHttp(formData, cached, regenerate);
+        currentAgents = result.agents;
+        if (!cached || result.agents !== cached.agents) {
+            displayResults(currentAgents);
+        }
+        storeCachedSwarm(cacheKey, result.agents, result.etag);
     } catch (error) {
         console.error('Error:', error);
-        
-        // Show results section with error
-        document.getElementById('empireForm').style.display = 'none';
-        document.getElementById('results').style.display = 'block';
-        
         displayError(`Error: ${error.message}`);
     } finally {
         // Re-enable submit button and hide loading